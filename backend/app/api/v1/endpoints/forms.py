@@ -1,13 +1,23 @@
-from fastapi import APIRouter, UploadFile, File, HTTPException, BackgroundTasks
+from fastapi import APIRouter, UploadFile, File, HTTPException, Request, Response, Query
 from typing import List
 from app.db.supabase import supabase
-from app.core.ocr import process_form_background
+from app.services.job_queue import get_job_queue
 import uuid
+import hashlib
+import json
+import asyncio
+from fastapi.responses import StreamingResponse
+from pydantic import BaseModel
+from app.services.form_events import form_events
+from app.core.document_cache import spool_form_document, get_form_text_index
+from app.core.highlighter import render_page_from_file, render_sprite_from_file
+from app.core.pools import run_io, run_cpu, run_process
+from app.core.render_cache import get_render_cache, page_variant, sniff_mime
 
 router = APIRouter()
 
 @router.post("/upload", response_model=dict)
-async def upload_form(background_tasks: BackgroundTasks, file: UploadFile = File(...)):
+async def upload_form(file: UploadFile = File(...)):
     allowed_types = ["application/pdf", "image/jpeg", "image/png", "image/jpg"]
     if file.content_type not in allowed_types:
         raise HTTPException(status_code=400, detail="Only PDF and Image files (JPEG, PNG) are allowed")
@@ -19,9 +29,34 @@ async def upload_form(background_tasks: BackgroundTasks, file: UploadFile = File
         
         # Read file content
         content = await file.read()
+        content_hash = await run_cpu(lambda: hashlib.sha256(content).hexdigest())
+        
+        # Short-circuit byte-identical uploads: reuse the stored file and cloned analysis
+        existing = await run_io(supabase.table("forms").select(
+            "file_path, url, ocr_data, form_schema, field_placements"
+        ).eq("content_hash", content_hash).eq("status", "ready").limit(1).execute)
+        
+        if existing.data:
+            original = existing.data[0]
+            form_data = {
+                "name": file.filename,
+                "file_path": original['file_path'],
+                "url": original['url'],
+                "content_type": file.content_type,
+                "file_size": len(content),
+                "content_hash": content_hash,
+                "status": "ready",
+                "ocr_data": original['ocr_data'],
+                "form_schema": original['form_schema'],
+                "field_placements": original.get('field_placements')
+            }
+            data = await run_io(supabase.table("forms").insert(form_data).execute)
+            print(f"Duplicate upload detected ({content_hash[:12]}), reused existing analysis")
+            return {"message": "Form already processed, reused existing analysis", "form": data.data[0]}
         
         # Upload to Supabase Storage
-        res = supabase.storage.from_("pdf-forms").upload(
+        res = await run_io(
+            supabase.storage.from_("pdf-forms").upload,
             file_name,
             content,
             {"content-type": "application/pdf"}
@@ -37,14 +72,19 @@ async def upload_form(background_tasks: BackgroundTasks, file: UploadFile = File
             "url": public_url,
             "content_type": file.content_type,
             "file_size": len(content),
+            "content_hash": content_hash,
             "status": "uploaded"
         }
         
-        data = supabase.table("forms").insert(form_data).execute()
+        data = await run_io(supabase.table("forms").insert(form_data).execute)
         form_id = data.data[0]['id']
         
-        # Trigger Background OCR
-        background_tasks.add_task(process_form_background, form_id, content, file.content_type)
+        # Queue OCR + analysis; a worker downloads the file from storage
+        await run_io(get_job_queue().enqueue, "process_form", {
+            "form_id": form_id,
+            "file_path": file_name,
+            "content_type": file.content_type
+        })
         
         return {"message": "Form uploaded successfully, processing started", "form": data.data[0]}
 
@@ -54,83 +94,364 @@ async def upload_form(background_tasks: BackgroundTasks, file: UploadFile = File
 @router.get("/{form_id}")
 async def get_form(form_id: str):
     try:
-        data = supabase.table("forms").select("*").eq("id", form_id).single().execute()
+        data = await run_io(supabase.table("forms").select("*").eq("id", form_id).single().execute)
         if not data.data:
             raise HTTPException(status_code=404, detail="Form not found")
         return data.data
     except Exception as e:
          raise HTTPException(status_code=500, detail=str(e))
 
+@router.get("/{form_id}/progress")
+async def get_form_progress(form_id: str, include_text: bool = True):
+    """
+    Per-page processing progress plus the text of every page finished so far.
+    Lets the client show early pages while later ones are still being OCR'd.
+    """
+    try:
+        data = await run_io(supabase.table("forms").select("status, progress").eq("id", form_id).single().execute)
+        if not data.data:
+            raise HTTPException(status_code=404, detail="Form not found")
+        
+        columns = "page_number, source, text" if include_text else "page_number, source"
+        pages = await run_io(supabase.table("form_pages").select(columns).eq("form_id", form_id).order("page_number").execute)
+        
+        return {
+            "status": data.data['status'],
+            "progress": data.data.get('progress'),
+            "pages": pages.data
+        }
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+# The job worker only sets "error" once a form's last attempt has failed
+TERMINAL_STATUSES = ("ready", "error")
+
+def _sse(event: str, data: dict) -> str:
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+@router.get("/{form_id}/events")
+async def form_events_stream(form_id: str):
+    """
+    Server-Sent Events stream of status/progress deltas for a form.
+    Failed attempts that will be retried come as 'retrying' events; the stream ends
+    with a single 'ready' (carrying the heavy form_schema) or 'failed' event.
+    """
+    # Subscribe before reading the initial state so no transition is missed
+    queue = form_events.subscribe(form_id)
+    try:
+        data = await run_io(supabase.table("forms").select("status, progress").eq("id", form_id).single().execute)
+        if not data.data:
+            raise HTTPException(status_code=404, detail="Form not found")
+    except Exception:
+        form_events.unsubscribe(form_id, queue)
+        raise
+    
+    async def event_stream():
+        try:
+            state = {"status": data.data['status'], "progress": data.data.get('progress')}
+            yield _sse("status", state)
+            
+            while state['status'] not in TERMINAL_STATUSES:
+                try:
+                    event = await asyncio.wait_for(queue.get(), timeout=15)
+                    if "retrying" in event:
+                        # A failed attempt that will be retried: not the end of the stream
+                        yield _sse("retrying", event['retrying'])
+                        continue
+                    state = {**state, **event}
+                except asyncio.TimeoutError:
+                    # Processing may run in a separate worker process; fall back to a light status read
+                    res = await run_io(supabase.table("forms").select("status, progress").eq("id", form_id).single().execute)
+                    fresh = {"status": res.data['status'], "progress": res.data.get('progress')}
+                    if fresh == state:
+                        yield ": keep-alive\n\n"
+                        continue
+                    state = fresh
+                
+                if state['status'] not in TERMINAL_STATUSES:
+                    yield _sse("status", state)
+            
+            # Terminal state: send the heavy payload exactly once
+            final = (await run_io(supabase.table("forms").select(
+                "status, form_schema, ocr_data"
+            ).eq("id", form_id).single().execute)).data
+            if final['status'] == "ready":
+                yield _sse("ready", {"status": "ready", "form_schema": final['form_schema']})
+            else:
+                yield _sse("failed", {"status": final['status'], "error": (final.get('ocr_data') or {}).get('error')})
+        finally:
+            form_events.unsubscribe(form_id, queue)
+    
+    return StreamingResponse(
+        event_stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
 @router.get("/", response_model=List[dict])
 async def list_forms():
     try:
         # Select specific fields to keep payload light
-        data = supabase.table("forms").select(
+        data = await run_io(supabase.table("forms").select(
             "id, name, status, created_at, updated_at, file_size"
-        ).order("created_at", desc=True).execute()
+        ).order("created_at", desc=True).execute)
         return data.data
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
+def _etag_matches(if_none_match: str | None, etag: str) -> bool:
+    if not if_none_match:
+        return False
+    candidates = [tag.strip() for tag in if_none_match.split(",")]
+    return "*" in candidates or etag in candidates
+
+async def _render(form_id: str, render_fn, *args):
+    """
+    Run a render in the worker process pool on the form's spooled file.
+    """
+    for attempt in range(2):
+        path, content_type = await run_io(spool_form_document, form_id)
+        try:
+            return await run_process(render_fn, path, content_type, *args)
+        except FileNotFoundError:
+            # Evicted from the document cache (and unspooled) mid-flight: spool again
+            if attempt:
+                raise
+
+IMAGE_FORMATS = ("png", "jpeg", "webp")
+IMMUTABLE_CACHE_CONTROL = "public, max-age=31536000, immutable"
+
 @router.get("/{form_id}/pages/{page_idx}")
-async def get_form_page(form_id: str, page_idx: int):
+async def get_form_page(
+    form_id: str,
+    page_idx: int,
+    request: Request,
+    zoom: float | None = Query(None, gt=0, le=8),
+    width: int | None = Query(None, ge=16, le=4000),
+    image_format: str = Query("png", alias="format"),
+    quality: int = Query(85, ge=1, le=100)
+):
     """
-    Render a specific page of the form as a PNG image.
+    Render a specific page of the form as an image.
+    Pass `width` (pixels) or `zoom` to pick the resolution, plus `format`
+    (png, jpeg, webp) and `quality` for lossy formats.
+    Rendered pages are cached on disk and served with a strong ETag; since uploads
+    are immutable, browsers may cache them indefinitely.
     """
+    if image_format not in IMAGE_FORMATS:
+        raise HTTPException(status_code=400, detail=f"format must be one of {', '.join(IMAGE_FORMATS)}")
+    
     try:
-        # 1. Get Form
-        data = supabase.table("forms").select("file_path").eq("id", form_id).single().execute()
-        if not data.data:
-            raise HTTPException(status_code=404, detail="Form not found")
-            
-        file_path = data.data['file_path']
+        from app.core.highlighter import DEFAULT_ZOOM
         
-        # 2. Download File
-        file_bytes = supabase.storage.from_("pdf-forms").download(file_path)
+        zoom = zoom or DEFAULT_ZOOM
+        cache = get_render_cache()
+        key = cache.key(form_id, page_variant(page_idx, zoom, width, image_format, quality), image_format)
+        etag = cache.etag(key)
+        headers = {
+            "ETag": etag,
+            "Cache-Control": IMMUTABLE_CACHE_CONTROL
+        }
         
-        # 3. Render Page
-        import fitz
-        from app.core.highlighter import highlighter
-        from fastapi import Response
+        if _etag_matches(request.headers.get("if-none-match"), etag):
+            return Response(status_code=304, headers=headers)
         
-        doc = fitz.open(stream=file_bytes, filetype="pdf")
+        image_bytes = await run_io(cache.get, key)
+        if image_bytes is None:
+            # Source is downloaded once per form; workers keep the parsed document open
+            image_bytes, media_type = await _render(
+                form_id, render_page_from_file, page_idx - 1, zoom, width, image_format, quality
+            ) # 1-based to 0-based
+            await run_io(cache.put, key, image_bytes)
+        else:
+            media_type = sniff_mime(image_bytes)
         
-        # Handle images (if we converted them) or try to open as image if pdf fails
-        # For MVP assuming standard PDF or we converted it.
+        return Response(content=image_bytes, media_type=media_type, headers=headers)
         
-        png_bytes = highlighter.render_page(doc, page_idx - 1) # 1-based to 0-based
+    except LookupError:
+        raise HTTPException(status_code=404, detail="Form not found")
+    except Exception as e:
+        print(f"Error rendering page: {e}")
+        raise HTTPException(status_code=500, detail=str(e))
+
+def _sprite_keys(form_id: str, width: int, columns: int, image_format: str, quality: int):
+    cache = get_render_cache()
+    variant = f"sprite_w{width}_c{columns}" + (f"_q{quality}" if image_format != "png" else "")
+    return cache.key(form_id, variant, image_format), cache.key(form_id, variant, "json")
+
+async def _render_sprite(form_id: str, width: int, columns: int, image_format: str, quality: int):
+    """
+    Render the sprite sheet and cache both the image and its layout.
+    """
+    cache = get_render_cache()
+    key, layout_key = _sprite_keys(form_id, width, columns, image_format, quality)
+    image_bytes, media_type, layout = await _render(
+        form_id, render_sprite_from_file, width, columns, image_format, quality
+    )
+    layout_bytes = json.dumps(layout, separators=(",", ":")).encode("utf-8")
+    await run_io(cache.put, key, image_bytes)
+    await run_io(cache.put, layout_key, layout_bytes)
+    return image_bytes, media_type, layout_bytes
+
+@router.get("/{form_id}/thumbnails")
+async def get_form_thumbnails(
+    form_id: str,
+    request: Request,
+    width: int = Query(160, ge=16, le=800),
+    columns: int = Query(5, ge=1, le=50),
+    image_format: str = Query("jpeg", alias="format"),
+    quality: int = Query(75, ge=1, le=100)
+):
+    """
+    All pages as one sprite sheet, in a single round trip.
+    Each page's tile within the image is served by /thumbnails/layout (same parameters).
+    """
+    if image_format not in IMAGE_FORMATS:
+        raise HTTPException(status_code=400, detail=f"format must be one of {', '.join(IMAGE_FORMATS)}")
+    
+    try:
+        cache = get_render_cache()
+        key, _ = _sprite_keys(form_id, width, columns, image_format, quality)
+        etag = cache.etag(key)
+        headers = {
+            "ETag": etag,
+            "Cache-Control": IMMUTABLE_CACHE_CONTROL
+        }
+        
+        if _etag_matches(request.headers.get("if-none-match"), etag):
+            return Response(status_code=304, headers=headers)
         
-        return Response(content=png_bytes, media_type="image/png")
+        image_bytes = await run_io(cache.get, key)
+        if image_bytes is None:
+            image_bytes, media_type, _ = await _render_sprite(form_id, width, columns, image_format, quality)
+        else:
+            media_type = sniff_mime(image_bytes)
         
+        return Response(content=image_bytes, media_type=media_type, headers=headers)
+        
+    except LookupError:
+        raise HTTPException(status_code=404, detail="Form not found")
     except Exception as e:
-        print(f"Error rendering page: {e}")
+        print(f"Error rendering thumbnails: {e}")
+        raise HTTPException(status_code=500, detail=str(e))
+
+@router.get("/{form_id}/thumbnails/layout")
+async def get_form_thumbnail_layout(
+    form_id: str,
+    request: Request,
+    width: int = Query(160, ge=16, le=800),
+    columns: int = Query(5, ge=1, le=50),
+    image_format: str = Query("jpeg", alias="format"),
+    quality: int = Query(75, ge=1, le=100)
+):
+    """
+    JSON list of { page, x, y, width, height }, one per page, giving each page's
+    tile within the /thumbnails sprite sheet rendered with the same parameters.
+    """
+    if image_format not in IMAGE_FORMATS:
+        raise HTTPException(status_code=400, detail=f"format must be one of {', '.join(IMAGE_FORMATS)}")
+    
+    try:
+        cache = get_render_cache()
+        _, layout_key = _sprite_keys(form_id, width, columns, image_format, quality)
+        etag = cache.etag(layout_key)
+        headers = {
+            "ETag": etag,
+            "Cache-Control": IMMUTABLE_CACHE_CONTROL
+        }
+        
+        if _etag_matches(request.headers.get("if-none-match"), etag):
+            return Response(status_code=304, headers=headers)
+        
+        layout_bytes = await run_io(cache.get, layout_key)
+        if layout_bytes is None:
+            _, _, layout_bytes = await _render_sprite(form_id, width, columns, image_format, quality)
+        
+        return Response(content=layout_bytes, media_type="application/json", headers=headers)
+        
+    except LookupError:
+        raise HTTPException(status_code=404, detail="Form not found")
+    except Exception as e:
+        print(f"Error rendering thumbnails: {e}")
         raise HTTPException(status_code=500, detail=str(e))
 
+SEARCH_MODES = ("phrase", "exact", "prefix", "fuzzy")
+
 @router.get("/{form_id}/search")
-async def search_form_text(form_id: str, q: str):
+async def search_form_text(form_id: str, q: str, mode: str = "phrase"):
     """
     Search for text in the form and return coordinates.
+    `mode` is 'phrase' (case-insensitive, default), 'exact' (case-sensitive),
+    'prefix' (last word matches as a prefix, for type-ahead) or 'fuzzy'
+    (tolerates OCR/punctuation differences; results ranked with a score).
     """
+    if mode not in SEARCH_MODES:
+        raise HTTPException(status_code=400, detail=f"mode must be one of {', '.join(SEARCH_MODES)}")
+    
     try:
-        # 1. Get Form
-        data = supabase.table("forms").select("file_path").eq("id", form_id).single().execute()
-        if not data.data:
-            raise HTTPException(status_code=404, detail="Form not found")
-            
-        file_path = data.data['file_path']
+        from app.core.highlighter import highlighter
         
-        # 2. Download File
-        file_bytes = supabase.storage.from_("pdf-forms").download(file_path)
+        # Answered from the prebuilt word index, no page scans
+        index = await run_io(get_form_text_index, form_id)
+        results = highlighter.search_text(index, q, mode)
         
-        # 3. Search
-        import fitz
+        return {"results": results}
+        
+    except LookupError:
+        raise HTTPException(status_code=404, detail="Form not found")
+    except Exception as e:
+        print(f"Error searching text: {e}")
+        raise HTTPException(status_code=500, detail=str(e))
+
+# Upper bound on queries per batch request
+MAX_BATCH_QUERIES = 1000
+
+class BatchSearchRequest(BaseModel):
+    queries: List[str] = []
+    mode: str = "phrase"
+    # Also search every field label of the form's schema
+    schema_labels: bool = False
+
+@router.post("/{form_id}/search")
+async def search_form_text_batch(form_id: str, request: BatchSearchRequest):
+    """
+    Resolve many queries in one request against the form's word index.
+    Returns {"results": {query: [occurrences]}}; with `schema_labels`, also
+    {"fields": {field_id: label}} so callers can map field ids to their query.
+    """
+    if request.mode not in SEARCH_MODES:
+        raise HTTPException(status_code=400, detail=f"mode must be one of {', '.join(SEARCH_MODES)}")
+    
+    queries = [q for q in request.queries if q.strip()]
+    if len(queries) > MAX_BATCH_QUERIES:
+        raise HTTPException(status_code=400, detail=f"At most {MAX_BATCH_QUERIES} queries per request")
+    
+    try:
         from app.core.highlighter import highlighter
         
-        doc = fitz.open(stream=file_bytes, filetype="pdf")
-        results = highlighter.search_text(doc, q)
+        fields = {}
+        if request.schema_labels:
+            form = await run_io(supabase.table("forms").select("form_schema").eq("id", form_id).single().execute)
+            if not form.data:
+                raise HTTPException(status_code=404, detail="Form not found")
+            for field in (form.data.get('form_schema') or {}).get('fields', []):
+                if field.get('label'):
+                    fields[field.get('id')] = field['label']
+                    queries.append(field['label'])
         
-        return {"results": results}
+        # One index load for every query instead of one request per field
+        index = await run_io(get_form_text_index, form_id)
+        response = {"results": highlighter.search_many(index, queries, request.mode)}
+        if request.schema_labels:
+            response["fields"] = fields
+        return response
         
+    except HTTPException:
+        raise
+    except LookupError:
+        raise HTTPException(status_code=404, detail="Form not found")
     except Exception as e:
         print(f"Error searching text: {e}")
         raise HTTPException(status_code=500, detail=str(e))
@@ -1,6 +1,9 @@
 from fastapi import APIRouter, HTTPException
+from fastapi.responses import StreamingResponse
 from app.core.pdf.writer import pdf_writer
 from pydantic import BaseModel
+from typing import List
+import json
 
 router = APIRouter()
 
@@ -8,6 +11,9 @@ class GeneratePDFRequest(BaseModel):
     form_id: str
     session_id: str
 
+class BulkGeneratePDFRequest(BaseModel):
+    items: List[GeneratePDFRequest]
+
 @router.post("/generate")
 async def generate_pdf(request: GeneratePDFRequest):
     try:
@@ -15,3 +21,22 @@ async def generate_pdf(request: GeneratePDFRequest):
         return {"url": url}
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
+
+@router.post("/generate/batch")
+async def generate_pdf_batch(request: BulkGeneratePDFRequest):
+    """
+    Fill many (form_id, session_id) pairs. Results stream back as NDJSON, one line
+    per pair in completion order: {"form_id", "session_id", "url"} or {..., "error"}.
+    """
+    from app.core.config import get_settings
+    max_items = get_settings().PDF_BULK_MAX_ITEMS
+    if len(request.items) > max_items:
+        raise HTTPException(status_code=400, detail=f"At most {max_items} items per request")
+
+    items = [(item.form_id, item.session_id) for item in request.items]
+
+    async def results():
+        async for result in pdf_writer.fill_many(items):
+            yield json.dumps(result) + "\n"
+
+    return StreamingResponse(results(), media_type="application/x-ndjson")
@@ -1,11 +1,47 @@
 from pydantic_settings import BaseSettings
 from functools import lru_cache
+from typing import Literal
 
 class Settings(BaseSettings):
     SUPABASE_URL: str
     SUPABASE_KEY: str
     GOOGLE_API_KEY: str
     NVIDIA_API_KEY: str | None = None
+
+    # Job queue for OCR/analysis work
+    JOB_QUEUE_BACKEND: str = "sqlite"
+    JOB_QUEUE_PATH: str = ".cache/jobs.sqlite3"
+    JOB_MAX_ATTEMPTS: int = 3
+    JOB_VISIBILITY_TIMEOUT: float = 300.0
+    JOB_RETRY_DELAY: float = 10.0
+    JOB_POLL_INTERVAL: float = 1.0
+    JOB_WORKER_CONCURRENCY: int = 2
+    # Run a worker inside the API process (single-process deployments / local dev)
+    RUN_EMBEDDED_WORKER: bool = True
+
+    # Form source files kept in memory for the page render/search endpoints
+    DOCUMENT_CACHE_MAX_BYTES: int = 256 * 1024 * 1024
+
+    # On-disk cache of rendered page images
+    RENDER_CACHE_DIR: str = ".cache/pages"
+    RENDER_CACHE_MAX_BYTES: int = 1024 * 1024 * 1024
+    # Render all pages into the cache as soon as a form is ready
+    PRERENDER_PAGES: bool = False
+
+    # Thread pools bridging blocking calls: Supabase/storage I/O, and PyMuPDF work (0 = one per CPU)
+    IO_THREADS: int = 32
+    CPU_THREADS: int = 0
+
+    # PDF generation: worker processes (0 = one per CPU) and bulk limits
+    PDF_WORKER_PROCESSES: int = 0
+    PDF_BULK_MAX_ITEMS: int = 5000
+    PDF_BULK_MAX_IN_FLIGHT: int = 32
+    # Write field values only and let the viewer draw them (NeedAppearances), skipping
+    # per-widget appearance streams; much faster on large forms, but not every viewer honors it
+    PDF_NEED_APPEARANCES: bool = False
+    # How filled PDFs are written: "full", "incremental" (append changes to the template,
+    # fastest) or "optimized" (garbage=4, deflate, object streams, font subsetting; smallest)
+    PDF_OUTPUT_MODE: Literal["full", "incremental", "optimized"] = "full"
     
     class Config:
         env_file = ".env"
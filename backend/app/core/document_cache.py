@@ -0,0 +1,263 @@
+import hashlib
+import os
+import tempfile
+import threading
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Tuple
+import fitz
+from app.core.text_index import TextIndex
+
+class CachedDocument:
+    def __init__(self, content_hash: str, data: bytes, content_type: str, file_path: str = None):
+        self.content_hash = content_hash
+        self.data = data
+        self.content_type = content_type
+        self.file_path = file_path
+        self.size = len(data)
+        # Word index, loaded or built on first search
+        self.text_index = None
+        # Local copy for worker processes, written on first render
+        self.spool_path = None
+        # Hold this while loading `text_index` or touching `spool_path`
+        self.lock = threading.Lock()
+
+    def close(self):
+        with self.lock:
+            if self.spool_path is not None:
+                try:
+                    os.remove(self.spool_path)
+                except OSError:
+                    pass
+                self.spool_path = None
+
+def open_as_pdf(data: bytes, content_type: str) -> fitz.Document:
+    """
+    Open upload bytes as a PDF document, converting image uploads on the fly.
+    """
+    if 'pdf' in (content_type or 'application/pdf'):
+        try:
+            return fitz.open(stream=data, filetype="pdf")
+        except Exception:
+            pass
+    img_doc = fitz.open(stream=data)
+    pdf_bytes = img_doc.convert_to_pdf()
+    img_doc.close()
+    return fitz.open("pdf", pdf_bytes)
+
+class DocumentCache:
+    """
+    Process-wide LRU of form source files, bounded by total source bytes.
+    Entries are keyed by content hash; form ids are aliases, so deduped forms
+    that share a file also share one entry. Parsing happens in worker processes
+    (see spool_form_document), never here.
+    """
+    def __init__(self, max_bytes: int):
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._entries: "OrderedDict[str, CachedDocument]" = OrderedDict()
+        self._aliases: Dict[str, str] = {}
+        self._bytes = 0
+        self._lock = threading.Lock()
+
+    def _lookup(self, form_id: str):
+        content_hash = self._aliases.get(form_id)
+        if content_hash is None:
+            return None
+        entry = self._entries.get(content_hash)
+        if entry is None:
+            del self._aliases[form_id]
+            return None
+        self._entries.move_to_end(content_hash)
+        return entry
+
+    def get(self, form_id: str, loader: Callable[[str], Tuple[str, bytes, str, str]]) -> CachedDocument:
+        """
+        Return the cached document for a form, calling `loader(form_id)` on a miss.
+        The loader returns (content_hash, bytes, content_type, file_path); content_hash
+        may be None for legacy rows, in which case it is computed here.
+        """
+        with self._lock:
+            entry = self._lookup(form_id)
+            if entry is not None:
+                self.hits += 1
+                return entry
+            self.misses += 1
+
+        # Download outside the lock so other forms aren't blocked
+        content_hash, data, content_type, file_path = loader(form_id)
+        content_hash = content_hash or hashlib.sha256(data).hexdigest()
+
+        evicted = []
+        with self._lock:
+            entry = self._entries.get(content_hash)
+            if entry is None:
+                entry = CachedDocument(content_hash, data, content_type, file_path)
+                self._entries[content_hash] = entry
+                self._bytes += entry.size
+                evicted = self._evict()
+            self._entries.move_to_end(content_hash)
+            self._aliases[form_id] = content_hash
+
+        for old in evicted:
+            old.close()
+        return entry
+
+    def _evict(self):
+        evicted = []
+        # Always keep the most recent entry, even if it alone exceeds the budget
+        while self._bytes > self.max_bytes and len(self._entries) > 1:
+            _, old = self._entries.popitem(last=False)
+            self._bytes -= old.size
+            self.evictions += 1
+            evicted.append(old)
+        if evicted:
+            gone = {old.content_hash for old in evicted}
+            self._aliases = {k: v for k, v in self._aliases.items() if v not in gone}
+        return evicted
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+                "evictions": self.evictions,
+                "entries": len(self._entries),
+                "bytes": self._bytes,
+                "max_bytes": self.max_bytes
+            }
+
+def _load_form_file(form_id: str) -> Tuple[str, bytes, str, str]:
+    from app.db.supabase import supabase
+    data = supabase.table("forms").select("file_path, content_type, content_hash").eq("id", form_id).single().execute()
+    if not data.data:
+        raise LookupError("Form not found")
+    file_path = data.data['file_path']
+    file_bytes = supabase.storage.from_("pdf-forms").download(file_path)
+    return data.data.get('content_hash'), file_bytes, data.data.get('content_type'), file_path
+
+def _text_index_path(file_path: str) -> str:
+    # Stored next to the upload, so deduped forms sharing a file share the index too
+    return f"{file_path}.words.json"
+
+def store_text_index(file_path: str, index_json: bytes):
+    from app.db.supabase import supabase
+    try:
+        supabase.storage.from_("pdf-forms").upload(
+            _text_index_path(file_path),
+            index_json,
+            {"content-type": "application/json", "upsert": "true"}
+        )
+    except Exception as e:
+        print(f"WARNING: Could not persist text index for {file_path}: {e}")
+
+def build_text_index(file_content: bytes, content_type: str) -> bytes:
+    """
+    Serialized word index for a form file, built in the process pool.
+    """
+    doc = open_as_pdf(file_content, content_type)
+    try:
+        return TextIndex.from_document(doc).to_json()
+    finally:
+        doc.close()
+
+def build_text_index_from_file(path: str, content_type: str) -> bytes:
+    """
+    build_text_index for a spooled form file.
+    """
+    return TextIndex.from_document(open_spooled(path, content_type)).to_json()
+
+def _load_text_index(entry: CachedDocument) -> TextIndex:
+    """
+    Called with entry.lock held.
+    """
+    from app.db.supabase import supabase
+    from app.core.pools import call_process
+    if entry.file_path:
+        try:
+            data = supabase.storage.from_("pdf-forms").download(_text_index_path(entry.file_path))
+            return TextIndex.from_json(data)
+        except Exception:
+            pass
+    # Not persisted yet (older form): build it in a worker process and store it.
+    # This runs on an I/O thread, which just waits for the result.
+    index_json = call_process(build_text_index_from_file, _spool(entry), entry.content_type)
+    if entry.file_path:
+        store_text_index(entry.file_path, index_json)
+    return TextIndex.from_json(index_json)
+
+# Global instance
+_document_cache = None
+
+def get_document_cache() -> DocumentCache:
+    global _document_cache
+    if _document_cache is None:
+        from app.core.config import get_settings
+        _document_cache = DocumentCache(get_settings().DOCUMENT_CACHE_MAX_BYTES)
+    return _document_cache
+
+_spool_dir = None
+
+def _spool(entry: CachedDocument) -> str:
+    # Called with entry.lock held
+    global _spool_dir
+    if entry.spool_path is None:
+        if _spool_dir is None:
+            _spool_dir = tempfile.mkdtemp(prefix="form-docs-")
+        path = os.path.join(_spool_dir, f"{entry.content_hash}.bin")
+        with open(path + ".tmp", "wb") as f:
+            f.write(entry.data)
+        os.replace(path + ".tmp", path)
+        entry.spool_path = path
+    return entry.spool_path
+
+def spool_form_document(form_id: str) -> Tuple[str, str]:
+    """
+    Write a form's cached source bytes to a local file once, for worker processes
+    to open themselves.
+    Returns (path, content_type).
+    """
+    entry = get_document_cache().get(form_id, _load_form_file)
+    with entry.lock:
+        return _spool(entry), entry.content_type
+
+# Per-process cache of parsed documents, for work run in worker processes
+_worker_docs: "OrderedDict[str, fitz.Document]" = OrderedDict()
+WORKER_DOC_CACHE_SIZE = 4
+
+def open_spooled(path: str, content_type: str) -> fitz.Document:
+    """
+    Open a spooled file in a worker process, reusing the parsed document across tasks.
+    The file's bytes are read up front, so it can be removed while the document is cached.
+    """
+    doc = _worker_docs.get(path)
+    if doc is not None:
+        _worker_docs.move_to_end(path)
+        return doc
+    with open(path, "rb") as f:
+        doc = open_as_pdf(f.read(), content_type)
+    _worker_docs[path] = doc
+    if len(_worker_docs) > WORKER_DOC_CACHE_SIZE:
+        _worker_docs.popitem(last=False)[1].close()
+    return doc
+
+def index_form_text(form_id: str, index_json: bytes):
+    """
+    Persist a form's word index (see build_text_index) at processing time.
+    """
+    from app.db.supabase import supabase
+    data = supabase.table("forms").select("file_path").eq("id", form_id).single().execute()
+    store_text_index(data.data['file_path'], index_json)
+
+def get_form_text_index(form_id: str) -> TextIndex:
+    """
+    The form's word index, loaded once per cached document.
+    """
+    entry = get_document_cache().get(form_id, _load_form_file)
+    with entry.lock:
+        if entry.text_index is None:
+            entry.text_index = _load_text_index(entry)
+        return entry.text_index
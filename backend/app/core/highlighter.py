@@ -1,88 +1,131 @@
 import fitz
+import math
+from app.core.document_cache import open_spooled
+from app.core.rendering import RenderProfile
+from app.core.text_index import TextIndex
+
+# Zoom used for page previews (2x for clarity)
+DEFAULT_ZOOM = 2.0
 
 class Highlighter:
-    def search_text(self, doc: fitz.Document, query: str):
+    def search_text(self, doc, query: str, mode: str = "phrase"):
         """
         Search for text in the document and return coordinates.
-        Returns a list of occurrences:
+        `doc` is a fitz.Document or a prebuilt TextIndex (preferred: no page scans).
+        In 'fuzzy' mode results are ranked best first and carry a "score" (0..1).
+        Returns a list of occurrences, rects normalized to the rendered page:
         [
             { "page": 1, "rect": [x0, y0, x1, y1], "text": "..." }
         ]
         """
+        index = doc if isinstance(doc, TextIndex) else TextIndex.from_document(doc)
+        
+        if mode == "fuzzy":
+            # Ranked, OCR-tolerant matches with a confidence score
+            results = []
+            for score, run in index.find_fuzzy(query):
+                for hit in index.rects_for(run):
+                    results.append({**hit, "text": query, "score": score})
+            return results
+        
         results = []
+        for run in index.find_phrase(query, mode):
+            for hit in index.rects_for(run):
+                results.append({**hit, "text": query})
         
-        # Simple exact/case-insensitive search
-        for page_idx, page in enumerate(doc):
-            # Page dimensions (Use cropbox as get_pixmap uses it by default)
-            # Cropbox is the visible area. Rect is the media box.
-            # search_for returns coordinates relative to the unrotated page.
-            # But get_pixmap returns the rotated image.
-            # We must transform the coordinates.
-            
-            box = page.cropbox
-            rotation = page.rotation
-            mat = page.rotation_matrix
-            
-            # Rotated Cropbox (to get output image dimensions and offset)
-            # Apply matrix to cropbox to find the new bounding box in the rotated space
-            rot_box = box * mat
-            # rot_box isn't necessarily a valid rect (points might be swapped), so we take valid rect
-            rot_rect = rot_box.pagerect # this might be wrong?
-            # Actually, standard PyMuPDF way:
-            rot_box_rect = fitz.Rect(rot_box)
-            
-            w = rot_box_rect.width
-            h = rot_box_rect.height
-            origin_x = rot_box_rect.x0
-            origin_y = rot_box_rect.y0
-
-            print(f"DEBUG: Page {page_idx+1} Rot: {rotation}, Box: {box} -> RotBox: {rot_box_rect} (W={w}, H={h})")
-            
-            hits = page.search_for(query)
-            
-            # Fallback
-            if not hits and len(query.split()) > 1:
-                words = query.split()
-                candidates = [w for w in words if len(w) > 3]
-                if candidates:
-                    longest = max(candidates, key=len)
-                    hits = page.search_for(longest)
-            
-            for rect in hits:
-                # 1. Transform rect to rotated space
-                r = rect * mat
-                
-                # 2. Normalize relative to the Rotated Cropbox
-                # The image matches rot_box_rect.
-                
-                x0 = (r.x0 - origin_x) / w
-                y0 = (r.y0 - origin_y) / h
-                x1 = (r.x1 - origin_x) / w
-                y1 = (r.y1 - origin_y) / h
-                
-                # Ensure x0 < x1, y0 < y1 (Rotation might flip them)
-                if x0 > x1: x0, x1 = x1, x0
-                if y0 > y1: y0, y1 = y1, y0
-                
-                print(f"DEBUG: Match '{query}' -> Rect: {rect} -> RotRect: {r} -> Norm: {x0:.3f},{y0:.3f}")
-                
-                results.append({
-                    "page": page_idx + 1,
-                    "rect": [x0, y0, x1, y1],
-                    "text": query
-                })
-                
+        # Fallback: on pages without a hit, look for the longest word of a multi-word query
+        words = query.split()
+        if len(words) > 1:
+            candidates = [w for w in words if len(w) > 3]
+            if candidates:
+                longest = max(candidates, key=len)
+                matched_pages = {r["page"] - 1 for r in results}
+                missing_pages = set(range(index.page_count)) - matched_pages
+                for run in index.find_phrase(longest, mode, pages=missing_pages):
+                    for hit in index.rects_for(run):
+                        results.append({**hit, "text": query})
+        
+        results.sort(key=lambda r: r["page"])
         return results
     
-    def render_page(self, doc: fitz.Document, page_idx: int) -> bytes:
+    def search_many(self, doc, queries, mode: str = "phrase"):
+        """
+        Resolve many queries against one document, e.g. every label of a form schema.
+        The word index is built (or taken) once and shared by all queries.
+        Returns { query: [occurrences as in search_text] }.
+        """
+        index = doc if isinstance(doc, TextIndex) else TextIndex.from_document(doc)
+        return {query: self.search_text(index, query, mode) for query in dict.fromkeys(queries)}
+    
+    def render_page(self, doc: fitz.Document, page_idx: int, zoom: float = DEFAULT_ZOOM) -> bytes:
         """
         Render a specific page as a PNG image.
         """
+        return self.render_page_image(doc, page_idx, zoom=zoom)[0]
+
+    def render_page_image(self, doc: fitz.Document, page_idx: int, zoom: float = DEFAULT_ZOOM,
+                          width: int = None, image_format: str = "png", quality: int = 85):
+        """
+        Render a page at a given zoom, or scaled to a target pixel width.
+        Returns (image_bytes, mime_type).
+        """
         if page_idx < 0 or page_idx >= len(doc):
             raise ValueError("Invalid page index")
             
         page = doc[page_idx]
-        pix = page.get_pixmap(matrix=fitz.Matrix(2, 2)) # 2x zoom for clarity
-        return pix.tobytes("png")
+        if width:
+            # page.rect is in rotated (displayed) space, same as the rendered image
+            zoom = width / page.rect.width
+        profile = RenderProfile(dpi=zoom * 72, image_format=image_format, quality=quality)
+        return profile.render(page)
+
+    def render_sprite(self, doc: fitz.Document, width: int, columns: int,
+                      image_format: str = "jpeg", quality: int = 75):
+        """
+        Render every page as a thumbnail into a single sprite sheet (grid, row-major).
+        Returns (image_bytes, mime_type, layout) where layout lists each page's
+        { page, x, y, width, height } in sprite pixels.
+        """
+        thumbs = []
+        for page in doc:
+            zoom = width / page.rect.width
+            thumbs.append(page.get_pixmap(matrix=fitz.Matrix(zoom, zoom), colorspace=fitz.csRGB, alpha=False))
+        
+        columns = max(1, min(columns, len(thumbs)))
+        rows = math.ceil(len(thumbs) / columns)
+        cell_width = max(pix.width for pix in thumbs)
+        cell_height = max(pix.height for pix in thumbs)
+        
+        sheet = fitz.Pixmap(fitz.csRGB, fitz.IRect(0, 0, cell_width * columns, cell_height * rows), False)
+        sheet.clear_with(255)
+        
+        layout = []
+        for i, pix in enumerate(thumbs):
+            x = (i % columns) * cell_width
+            y = (i // columns) * cell_height
+            pix.set_origin(x, y)
+            sheet.copy(pix, pix.irect)
+            layout.append({"page": i + 1, "x": x, "y": y, "width": pix.width, "height": pix.height})
+        
+        image_bytes, mime_type = RenderProfile(image_format=image_format, quality=quality).encode(sheet)
+        return image_bytes, mime_type, layout
 
 highlighter = Highlighter()
+
+def render_page_from_file(path: str, content_type: str, page_idx: int, zoom: float,
+                          width: int, image_format: str, quality: int):
+    """
+    highlighter.render_page_image for a spooled form file, run in the process pool.
+    """
+    doc = open_spooled(path, content_type)
+    return highlighter.render_page_image(
+        doc, page_idx, zoom=zoom, width=width, image_format=image_format, quality=quality
+    )
+
+def render_sprite_from_file(path: str, content_type: str, width: int, columns: int,
+                            image_format: str, quality: int):
+    """
+    highlighter.render_sprite for a spooled form file, run in the process pool.
+    """
+    doc = open_spooled(path, content_type)
+    return highlighter.render_sprite(doc, width, columns, image_format=image_format, quality=quality)
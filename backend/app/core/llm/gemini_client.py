@@ -1,5 +1,6 @@
 import google.generativeai as genai
 from app.core.config import get_settings
+from app.core.resilience import get_upstream
 
 settings = get_settings()
 
@@ -8,10 +9,12 @@ class GeminiClient:
         genai.configure(api_key=settings.GOOGLE_API_KEY)
         # Switching to the stable alias 'gemini-flash-latest' to avoid quota issues with experimental models
         self.model = genai.GenerativeModel('gemini-flash-latest')
+        # Rate limit, retries and circuit breaker for Gemini (GEMINI_* env vars)
+        self.upstream = get_upstream("gemini", settings.GOOGLE_API_KEY, "GEMINI")
 
     async def generate_content(self, prompt: str) -> str:
         try:
-            response = await self.model.generate_content_async(prompt)
+            response = await self.upstream.call(lambda: self.model.generate_content_async(prompt))
             return response.text
         except Exception as e:
             print(f"Gemini Error: {e}")
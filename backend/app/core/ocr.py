@@ -1,81 +1,250 @@
-import requests
+import httpx
 import base64
 import os
+import shutil
 import asyncio
+import tempfile
 from typing import Dict, Any
+from app.core.ocr_cache import OCRCache
+from app.core.resilience import get_upstream
+from app.core.rendering import RenderProfile
+
+def extract_native_text(page, min_chars: int, max_image_ratio: float) -> str | None:
+    """
+    Classify a page by its embedded text layer.
+    Returns the layout-ordered text if the page is born-digital, or None if it
+    looks like a scan and needs vision OCR.
+    """
+    page_dict = page.get_text("dict", sort=True)
+    page_area = abs(page.rect) or 1
+
+    lines = []
+    image_area = 0
+    for block in page_dict.get("blocks", []):
+        if block.get("type") == 1:
+            # Image block: track how much of the page is covered by raster content
+            x0, y0, x1, y1 = block["bbox"]
+            image_area += max(0, x1 - x0) * max(0, y1 - y0)
+            continue
+        for line in block.get("lines", []):
+            line_text = "".join(span.get("text", "") for span in line.get("spans", [])).strip()
+            if line_text:
+                lines.append(line_text)
+        lines.append("")
+
+    text = "\n".join(lines).strip()
+    char_count = len("".join(text.split()))
+
+    if char_count < min_chars:
+        return None
+    if image_area / page_area > max_image_ratio:
+        return None
+    return text
+
+def prepare_page(path: str, page_idx: int, render_profile: RenderProfile,
+                 min_chars: int, max_image_ratio: float):
+    """
+    Text layer or rendered image for one page of a spooled PDF; runs in the process pool.
+    Returns (native_text, None) or (None, (image_bytes, mime_type)).
+    """
+    from app.core.document_cache import open_spooled
+    page = open_spooled(path, "application/pdf")[page_idx]
+    # Born-digital pages already carry their text, skip the vision model
+    native_text = extract_native_text(page, min_chars, max_image_ratio)
+    if native_text is not None:
+        return native_text, None
+    return None, render_profile.render(page)
 
 class OCRService:
     def __init__(self):
         self.api_key = os.environ.get("NVIDIA_API_KEY")
-        self.invoke_url = "https://integrate.api.nvidia.com/v1/chat/completions"
+        self.invoke_url = os.environ.get("NVIDIA_INVOKE_URL", "https://integrate.api.nvidia.com/v1/chat/completions")
+        # Max in-flight requests per upstream URL
+        self.max_concurrency = int(os.environ.get("OCR_MAX_CONCURRENCY", "5"))
+        self.http2 = os.environ.get("OCR_HTTP2", "true").lower() in ("1", "true", "yes")
+        self.timeout = float(os.environ.get("OCR_TIMEOUT", "120"))
+        # Max rendered pages buffered between the rasterizer and the OCR workers
+        self.pipeline_depth = int(os.environ.get("OCR_PIPELINE_DEPTH", "2"))
+        # Pages with at least this many text-layer characters bypass vision OCR
+        self.native_text_min_chars = int(os.environ.get("OCR_NATIVE_TEXT_MIN_CHARS", "50"))
+        # ...unless raster images cover more than this fraction of the page (scan with a thin text layer)
+        self.native_text_max_image_ratio = float(os.environ.get("OCR_NATIVE_TEXT_MAX_IMAGE_RATIO", "0.5"))
+        self.render_profile = RenderProfile.from_env()
+        self.model = "meta/llama-3.2-90b-vision-instruct"
+        self.prompt = "Extract all text from this document. Preserve the structure as much as possible."
+        self.generation_params = {
+            "max_tokens": 1024,
+            "temperature": 0.2,
+            "top_p": 0.7
+        }
+        self._client = None
+        self._semaphores = {}
+        # Rate limit, retries and circuit breaker for NVIDIA NIM (NVIDIA_* env vars)
+        self.upstream = get_upstream("nvidia-nim", self.api_key, "NVIDIA")
+        # Persistent result cache so re-uploads of known pages skip the upstream
+        self.cache = None
+        if os.environ.get("OCR_CACHE_ENABLED", "true").lower() in ("1", "true", "yes"):
+            self.cache = OCRCache(
+                os.environ.get("OCR_CACHE_PATH", ".cache/ocr_cache.sqlite3"),
+                int(os.environ.get("OCR_CACHE_MAX_BYTES", str(256 * 1024 * 1024)))
+            )
         if not self.api_key:
             print("WARNING: NVIDIA_API_KEY not found in environment variables.")
 
-    def process_document(self, file_content: bytes, content_type: str) -> Dict[str, Any]:
+    def _get_client(self) -> httpx.AsyncClient:
+        """
+        Shared keep-alive client. Created lazily so it binds to the running event loop.
+        """
+        if self._client is None or self._client.is_closed:
+            limits = httpx.Limits(
+                max_connections=self.max_concurrency,
+                max_keepalive_connections=self.max_concurrency,
+            )
+            self._client = httpx.AsyncClient(http2=self.http2, limits=limits, timeout=self.timeout)
+        return self._client
+
+    def _get_semaphore(self, url: str) -> asyncio.Semaphore:
+        if url not in self._semaphores:
+            self._semaphores[url] = asyncio.Semaphore(self.max_concurrency)
+        return self._semaphores[url]
+
+    async def aclose(self):
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
+
+    async def process_document(self, file_content: bytes, content_type: str,
+                               completed_pages: Dict[int, str] = None, progress=None) -> Dict[str, Any]:
         """
         Process PDF or Image content bytes and return structured OCR data.
         Uses NVIDIA NIM meta/llama-3.2-90b-vision-instruct model.
+        `completed_pages` ({page_idx: text}) are reused instead of re-OCR'd, and
+        `progress` (a FormProgress) is notified as each page finishes.
         """
+        completed_pages = completed_pages or {}
         if not self.api_key:
              raise ValueError("NVIDIA_API_KEY is not set")
 
         try:    
             full_text = ""
+            failed_pages = []
             
             if content_type == "application/pdf":
                 import fitz # PyMuPDF
+                from app.core.pools import run_process
                 doc = fitz.open(stream=file_content, filetype="pdf")
+                page_count = len(doc)
+                doc.close()
+                
+                # Pages are prepared in worker processes, which open this copy once each
+                work_dir = tempfile.mkdtemp(prefix="ocr-")
+                source_path = os.path.join(work_dir, "source.pdf")
+                with open(source_path, "wb") as f:
+                    f.write(file_content)
                 
-                print(f"DEBUG: Processing PDF with {len(doc)} pages")
+                print(f"DEBUG: Processing PDF with {page_count} pages")
+                if progress:
+                    await progress.start(page_count)
                 
-                # Helper function for parallel execution
-                def process_page(args):
-                    i, page_bytes = args
+                async def process_page(i, b64_img, mime_type):
                     print(f"DEBUG: Sending Page {i+1} to API...")
-                    b64_img = base64.b64encode(page_bytes).decode('utf-8')
                     try:
-                        text = self._perform_ocr_request(b64_img, "image/png")
+                        text = await self._perform_ocr_request(b64_img, mime_type)
                         print(f"DEBUG: Page {i+1} completed.")
+                        if progress:
+                            await progress.page_done(i, text, "ocr")
                         return i, text
                     except Exception as e:
                         print(f"ERROR: Page {i+1} failed: {e}")
+                        failed_pages.append(i + 1)
                         return i, f"[Error processing page {i+1}]"
 
-                # Prepare page images
-                page_tasks = []
-                for i, page in enumerate(doc):
-                    # 2x zoom for better OCR resolution
-                    pix = page.get_pixmap(matrix=fitz.Matrix(2, 2))
-                    png_bytes = pix.tobytes("png")
-                    page_tasks.append((i, png_bytes))
-                
-                # Execute in parallel
-                from concurrent.futures import ThreadPoolExecutor
+                # Bounded producer/consumer pipeline: page N+1 renders while page N is OCR'd.
+                # The queue caps how many rendered pages wait in memory at any time.
+                page_queue = asyncio.Queue(maxsize=self.pipeline_depth)
+                num_workers = max(1, min(self.max_concurrency, page_count))
                 results = []
-                with ThreadPoolExecutor(max_workers=5) as executor:
-                    results = list(executor.map(process_page, page_tasks))
+
+                async def producer():
+                    try:
+                        for i in range(page_count):
+                            if i in completed_pages:
+                                # Finished by an earlier, interrupted run
+                                results.append((i, completed_pages[i]))
+                                continue
+                            native_text, rendered = await run_process(
+                                prepare_page, source_path, i, self.render_profile,
+                                self.native_text_min_chars, self.native_text_max_image_ratio
+                            )
+                            if native_text is not None:
+                                print(f"DEBUG: Page {i+1} has a usable text layer, skipping OCR.")
+                                results.append((i, native_text))
+                                if progress:
+                                    await progress.page_done(i, native_text, "text_layer")
+                                continue
+                            await page_queue.put((i, rendered))
+                    finally:
+                        for _ in range(num_workers):
+                            await page_queue.put(None)
+
+                async def consumer():
+                    while True:
+                        item = await page_queue.get()
+                        if item is None:
+                            return
+                        i, (image_bytes, mime_type) = item
+                        b64_img = base64.b64encode(image_bytes).decode('utf-8')
+                        # Drop the raw image before waiting on the network
+                        del item, image_bytes
+                        results.append(await process_page(i, b64_img, mime_type))
+
+                try:
+                    await asyncio.gather(producer(), *(consumer() for _ in range(num_workers)))
+                finally:
+                    shutil.rmtree(work_dir, ignore_errors=True)
                 
                 # Sort by page index to maintain order
-                results.sort(key=lambda x: x[0])
+                results = sorted(results, key=lambda x: x[0])
                 
                 for i, text in results:
                     full_text += f"\n--- Page {i+1} ---\n{text}"
                     
             else:
                 # Standard Image
+                if progress:
+                    await progress.start(1)
                 b64_content = base64.b64encode(file_content).decode('utf-8')
-                full_text = self._perform_ocr_request(b64_content, content_type)
+                full_text = await self._perform_ocr_request(b64_content, content_type)
+                if progress:
+                    await progress.page_done(0, full_text, "ocr")
             
-            return {"text": full_text}
+            result = {"text": full_text}
+            if failed_pages:
+                # Surface degraded pages instead of only embedding placeholders in the text
+                result["failed_pages"] = sorted(failed_pages)
+            return result
 
         except Exception as e:
             print(f"OCR Error: {e}")
             raise e
 
-    def _perform_ocr_request(self, b64_image: str, content_type: str) -> str:
+    async def _perform_ocr_request(self, b64_image: str, content_type: str) -> str:
         """
         Helper to send a single image to NVIDIA API
         """
+        cache_key = None
+        if self.cache is not None:
+            cache_key = self.cache.make_key(b64_image, {
+                "model": self.model,
+                "prompt": self.prompt,
+                "content_type": content_type,
+                **self.generation_params
+            })
+            cached = await asyncio.to_thread(self.cache.get, cache_key)
+            if cached is not None:
+                print("DEBUG: OCR cache hit")
+                return cached
+
         headers = {
             "Authorization": f"Bearer {self.api_key}",
             "Accept": "application/json"
@@ -84,7 +253,7 @@ class OCRService:
         content_blocks = [
             {
                 "type": "text",
-                "text": "Extract all text from this document. Preserve the structure as much as possible."
+                "text": self.prompt
             },
             {
                 "type": "image_url",
@@ -95,34 +264,43 @@ class OCRService:
         ]
 
         payload = {
-            "model": "meta/llama-3.2-90b-vision-instruct",
+            "model": self.model,
             "messages": [
                 {
                     "role": "user",
                     "content": content_blocks
                 }
             ],
-            "max_tokens": 1024,
-            "temperature": 0.2,
-            "top_p": 0.7,
+            **self.generation_params,
             "stream": False
         }
         
         # print(f"DEBUG: Sending request to {self.invoke_url}")
         
-        response = requests.post(self.invoke_url, headers=headers, json=payload)
-        
-        if response.status_code != 200:
-            print(f"DEBUG: API Error Status: {response.status_code}")
-            try:
-                print(f"DEBUG: API Error Body: {response.json()}")
-            except:
-                print(f"DEBUG: API Error Body: {response.text}")
-        
-        response.raise_for_status()
+        client = self._get_client()
+
+        async def send():
+            async with self._get_semaphore(self.invoke_url):
+                response = await client.post(self.invoke_url, headers=headers, json=payload)
+            
+            if response.status_code != 200:
+                print(f"DEBUG: API Error Status: {response.status_code}")
+                try:
+                    print(f"DEBUG: API Error Body: {response.json()}")
+                except:
+                    print(f"DEBUG: API Error Body: {response.text}")
+            
+            response.raise_for_status()
+            return response
         
+        response = await self.upstream.call(send)
         response_json = response.json()
-        return response_json['choices'][0]['message']['content']
+        text = response_json['choices'][0]['message']['content']
+
+        if cache_key is not None:
+            await asyncio.to_thread(self.cache.put, cache_key, text)
+
+        return text
 
 
 
@@ -140,18 +318,32 @@ async def process_form_background(form_id: str, file_content: bytes, content_typ
     Background task to process form OCR and update database.
     """
     from app.db.supabase import supabase
+    from app.services.form_events import form_events
+    from app.core.pools import run_io, run_process
     
     try:
         print(f"Starting OCR for form {form_id} with type {content_type}")
         
         # Update status to processing
-        supabase.table("forms").update({"status": "processing"}).eq("id", form_id).execute()
+        await run_io(supabase.table("forms").update({"status": "processing"}).eq("id", form_id).execute)
+        form_events.publish(form_id, {"status": "processing"})
         
         ocr_service = get_ocr_service()
         
-        # Requests is synchronous, so run in executor to avoid blocking event loop
-        loop = asyncio.get_event_loop()
-        ocr_data = await loop.run_in_executor(None, ocr_service.process_document, file_content, content_type)
+        # Resume from pages persisted by a previous attempt, and persist new ones as they finish
+        from app.services.form_progress import FormProgress
+        progress = FormProgress(form_id)
+        completed_pages = await progress.load_completed_pages()
+        if completed_pages:
+            print(f"Resuming form {form_id}: {len(completed_pages)} pages already done")
+        
+        try:
+            ocr_data = await ocr_service.process_document(
+                file_content, content_type, completed_pages=completed_pages, progress=progress
+            )
+        finally:
+            # Also after a failure, so the retry resumes from every finished page
+            await progress.flush()
         
         # Run Analysis
         from app.core.form_parser.analyzer import analyzer
@@ -159,19 +351,62 @@ async def process_form_background(form_id: str, file_content: bytes, content_typ
         
         # Add raw text to schema for convenience
         schema['raw_text'] = ocr_data.get("text", "")
+        
+        # Map fields and compile the fill template once, so PDF generation only sets values
+        from app.core.pdf.placement import build_form_template, store_form_template
+        try:
+            field_placements, template_bytes = await run_process(build_form_template, file_content, content_type, schema)
+            form_row = await run_io(supabase.table("forms").select("file_path").eq("id", form_id).single().execute)
+            await run_io(store_form_template, form_row.data['file_path'], field_placements, template_bytes)
+        except Exception as e:
+            # Generation falls back to mapping on demand
+            print(f"WARNING: Field mapping failed for form {form_id}: {e}")
+            field_placements = None
 
         # Update database with result
-        supabase.table("forms").update({
+        await run_io(supabase.table("forms").update({
             "status": "ready", 
             "ocr_data": ocr_data, # Store the raw text
-            "form_schema": schema
-        }).eq("id", form_id).execute()
+            "form_schema": schema,
+            "field_placements": field_placements
+        }).eq("id", form_id).execute)
+        form_events.publish(form_id, {"status": "ready"})
+        
+        # Build the search word index once and store it next to the upload
+        from app.core.document_cache import build_text_index, index_form_text
+        try:
+            index_json = await run_process(build_text_index, file_content, content_type)
+            await run_io(index_form_text, form_id, index_json)
+        except Exception as e:
+            print(f"WARNING: Text indexing failed for form {form_id}: {e}")
+        
+        from app.core.config import get_settings
+        if get_settings().PRERENDER_PAGES:
+            # Warm the page render cache so the viewer's first load is instant
+            from app.core.render_cache import prerender_form
+            try:
+                await prerender_form(form_id, file_content, content_type)
+            except Exception as e:
+                print(f"WARNING: Pre-rendering failed for form {form_id}: {e}")
         
         print(f"OCR completed for form {form_id} (Analysis skipped)")
         
     except Exception as e:
         print(f"Error processing form {form_id}: {e}")
-        supabase.table("forms").update({
-            "status": "error", 
-            "ocr_data": {"error": str(e)}
-        }).eq("id", form_id).execute()
+        # The form stays "processing": the job worker retries, and marks it failed
+        # (mark_form_failed) only once the last attempt has failed
+        raise
+
+async def mark_form_failed(form_id: str, error: str):
+    """
+    Record that processing a form failed for good, and tell its watchers.
+    """
+    from app.db.supabase import supabase
+    from app.services.form_events import form_events
+    from app.core.pools import run_io
+
+    await run_io(supabase.table("forms").update({
+        "status": "error", 
+        "ocr_data": {"error": error}
+    }).eq("id", form_id).execute)
+    form_events.publish(form_id, {"status": "error", "error": error})
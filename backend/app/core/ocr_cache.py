@@ -0,0 +1,107 @@
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from typing import Any, Dict, Optional
+
+class OCRCache:
+    """
+    Content-addressed, on-disk cache for OCR results.
+    Entries are keyed by a hash of the page image plus the request parameters,
+    stored in SQLite and evicted least-recently-used once the byte budget is exceeded.
+    """
+
+    def __init__(self, path: str, max_bytes: int):
+        self.path = path
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._lock = threading.Lock()
+
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            """
+            create table if not exists ocr_cache (
+                key text primary key,
+                value text not null,
+                size integer not null,
+                last_access real not null
+            )
+            """
+        )
+        self._conn.execute("create index if not exists ocr_cache_last_access on ocr_cache(last_access)")
+        self._conn.commit()
+
+    @staticmethod
+    def make_key(image_data: str, params: Dict[str, Any]) -> str:
+        """
+        Hash the page image together with model, prompt and generation params.
+        """
+        digest = hashlib.sha256()
+        digest.update(json.dumps(params, sort_keys=True).encode("utf-8"))
+        digest.update(b"\0")
+        digest.update(image_data.encode("utf-8"))
+        return digest.hexdigest()
+
+    def get(self, key: str) -> Optional[str]:
+        with self._lock:
+            row = self._conn.execute("select value from ocr_cache where key = ?", (key,)).fetchone()
+            if row is None:
+                self.misses += 1
+                return None
+            self._conn.execute("update ocr_cache set last_access = ? where key = ?", (time.time(), key))
+            self._conn.commit()
+            self.hits += 1
+            return row[0]
+
+    def put(self, key: str, value: str):
+        size = len(value.encode("utf-8"))
+        if size > self.max_bytes:
+            return
+        with self._lock:
+            self._conn.execute(
+                "insert or replace into ocr_cache (key, value, size, last_access) values (?, ?, ?, ?)",
+                (key, value, size, time.time())
+            )
+            self._evict()
+            self._conn.commit()
+
+    def _evict(self):
+        total = self._conn.execute("select coalesce(sum(size), 0) from ocr_cache").fetchone()[0]
+        if total <= self.max_bytes:
+            return
+        rows = self._conn.execute("select key, size from ocr_cache order by last_access asc").fetchall()
+        for key, size in rows:
+            if total <= self.max_bytes:
+                break
+            self._conn.execute("delete from ocr_cache where key = ?", (key,))
+            total -= size
+            self.evictions += 1
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            entries, total = self._conn.execute(
+                "select count(*), coalesce(sum(size), 0) from ocr_cache"
+            ).fetchone()
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+            "evictions": self.evictions,
+            "entries": entries,
+            "bytes": total,
+            "max_bytes": self.max_bytes
+        }
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
@@ -0,0 +1,71 @@
+from typing import Tuple
+import numpy as np
+
+def linear_sum_assignment(cost: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Minimum-cost one-to-one assignment of rows to columns (Hungarian algorithm).
+    Accepts rectangular matrices; returns (row_indices, col_indices) like
+    scipy.optimize.linear_sum_assignment, which is used when available.
+    """
+    cost = np.asarray(cost, dtype=float)
+    if cost.size == 0:
+        return np.empty(0, dtype=int), np.empty(0, dtype=int)
+    try:
+        from scipy.optimize import linear_sum_assignment as scipy_assignment
+        return scipy_assignment(cost)
+    except ImportError:
+        pass
+
+    # The algorithm below needs rows <= columns
+    if cost.shape[0] > cost.shape[1]:
+        cols, rows = _hungarian(cost.T)
+        order = np.argsort(rows)
+        return rows[order], cols[order]
+    return _hungarian(cost)
+
+def _hungarian(cost: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    # Shortest augmenting path with potentials, O(n^2 m); inner loop vectorized
+    n, m = cost.shape
+    u = np.zeros(n + 1)
+    v = np.zeros(m + 1)
+    # p[j]: row (1-based) assigned to column j; column 0 is the virtual start
+    p = np.zeros(m + 1, dtype=int)
+    way = np.zeros(m + 1, dtype=int)
+
+    for i in range(1, n + 1):
+        p[0] = i
+        j0 = 0
+        minv = np.full(m + 1, np.inf)
+        used = np.zeros(m + 1, dtype=bool)
+        while True:
+            used[j0] = True
+            i0 = p[j0]
+            free = ~used
+            free[0] = False
+            reduced = cost[i0 - 1] - u[i0] - v[1:]
+            better = free[1:] & (reduced < minv[1:])
+            minv[1:][better] = reduced[better]
+            way[1:][better] = j0
+
+            free_cols = np.flatnonzero(free)
+            j1 = free_cols[np.argmin(minv[free_cols])]
+            delta = minv[j1]
+
+            used_cols = np.flatnonzero(used)
+            u[p[used_cols]] += delta
+            v[used_cols] -= delta
+            minv[free_cols] -= delta
+
+            j0 = j1
+            if p[j0] == 0:
+                break
+        # Flip the augmenting path
+        while j0:
+            j1 = way[j0]
+            p[j0] = p[j1]
+            j0 = j1
+
+    cols = np.flatnonzero(p[1:])
+    rows = p[1:][cols] - 1
+    order = np.argsort(rows)
+    return rows[order], cols[order]
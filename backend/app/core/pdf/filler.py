@@ -0,0 +1,149 @@
+import os
+import tempfile
+import fitz  # PyMuPDF
+from typing import Any, Dict
+
+# Field types whose value is plain text, so NeedAppearances mode can write it directly
+VALUE_ONLY_TYPES = (fitz.PDF_WIDGET_TYPE_TEXT, fitz.PDF_WIDGET_TYPE_COMBOBOX, fitz.PDF_WIDGET_TYPE_LISTBOX)
+
+# How filled PDFs are written (PDF_OUTPUT_MODE):
+# - full: the whole document, as is
+# - incremental: the template's bytes with the changed objects appended (fastest to write)
+# - optimized: garbage-collected, deflated, object streams, subset fonts (smallest)
+OUTPUT_MODES = ("full", "incremental", "optimized")
+
+def fill_document(template_bytes: bytes, schema: Dict[str, Any], placements: Dict[str, Any],
+                  form_data: Dict[str, Any], need_appearances: bool = False,
+                  output_mode: str = "full") -> bytes:
+    """
+    Apply a session's answers to a form's compiled template (see placement.compile_template):
+    every placed field is already a widget, so this only sets values.
+    With `need_appearances`, text values are written without rendering appearance
+    streams and the viewer is asked to draw them. `output_mode` is one of OUTPUT_MODES.
+    Pure CPU work on bytes (no database or storage access), so it can run in a
+    worker process. Returns the filled PDF bytes.
+    """
+    if output_mode not in OUTPUT_MODES:
+        raise ValueError(f"PDF output mode must be one of {', '.join(OUTPUT_MODES)}")
+
+    if output_mode == "incremental":
+        # PyMuPDF only saves incrementally into the file a document was opened from
+        with tempfile.TemporaryDirectory(prefix="pdf-fill-") as work_dir:
+            path = os.path.join(work_dir, "filled.pdf")
+            with open(path, "wb") as f:
+                f.write(template_bytes)
+            doc = fitz.open(path)
+            try:
+                _fill(doc, schema, placements, form_data, need_appearances)
+                doc.save(path, incremental=True, encryption=fitz.PDF_ENCRYPT_KEEP)
+            finally:
+                doc.close()
+            with open(path, "rb") as f:
+                return f.read()
+
+    doc = fitz.open(stream=template_bytes, filetype="pdf")
+    try:
+        _fill(doc, schema, placements, form_data, need_appearances)
+        if output_mode == "optimized":
+            try:
+                doc.subset_fonts()
+            except Exception as e:
+                print(f"WARNING: Font subsetting failed: {e}")
+            return doc.tobytes(garbage=4, deflate=True, use_objstms=1)
+        return doc.tobytes()
+    finally:
+        doc.close()
+
+# Per-process cache of template files written by the bulk generator
+_template_cache: Dict[str, bytes] = {}
+TEMPLATE_CACHE_SIZE = 4
+
+def fill_document_from_file(template_path: str, schema: Dict[str, Any], placements: Dict[str, Any],
+                            form_data: Dict[str, Any], need_appearances: bool = False,
+                            output_mode: str = "full") -> bytes:
+    """
+    fill_document for a template on local disk; each worker process reads a
+    template once instead of receiving its bytes with every task.
+    """
+    template_bytes = _template_cache.get(template_path)
+    if template_bytes is None:
+        with open(template_path, "rb") as f:
+            template_bytes = f.read()
+        if len(_template_cache) >= TEMPLATE_CACHE_SIZE:
+            _template_cache.pop(next(iter(_template_cache)))
+        _template_cache[template_path] = template_bytes
+    return fill_document(template_bytes, schema, placements, form_data, need_appearances, output_mode)
+
+def _as_text(value) -> str:
+    if isinstance(value, list):
+        return ", ".join(map(str, value))
+    return str(value)
+
+def _render_widgets(page: fitz.Page, values: Dict[int, str]):
+    """
+    Set widget values by xref and render their appearance streams.
+    load_widget() scans the page's widget list, so busy pages take one linear walk instead.
+    """
+    if len(values) * 2 > len(page.annot_xrefs()):
+        widget = page.first_widget
+        while widget:
+            if widget.xref in values:
+                widget.field_value = values[widget.xref]
+                widget.update()
+            widget = widget.next
+        return
+    for xref, value in values.items():
+        widget = page.load_widget(xref)
+        widget.field_value = value
+        widget.update()
+
+def _fill(doc: fitz.Document, schema: Dict[str, Any], placements: Dict[str, Any],
+          form_data: Dict[str, Any], need_appearances: bool = False):
+    # Answered widgets grouped by page, straight from the xrefs recorded at compile time
+    by_page = {}
+    handled_fields = set()
+    for p in placements['fields']:
+        if p['field_id'] not in form_data or not p.get('xrefs'):
+            continue
+        value = _as_text(form_data[p['field_id']])
+        for page_idx, widget_xref, field_xref, field_type in p['xrefs']:
+            by_page.setdefault(page_idx, []).append((widget_xref, field_xref, field_type, value))
+        handled_fields.add(p['field_id'])
+
+    for page_idx, widgets in by_page.items():
+        to_render = {}
+        for widget_xref, field_xref, field_type, value in widgets:
+            if need_appearances and field_type in VALUE_ONLY_TYPES:
+                doc.xref_set_key(field_xref, "V", fitz.get_pdf_str(value))
+            else:
+                to_render[widget_xref] = value
+        if to_render:
+            _render_widgets(doc[page_idx], to_render)
+    if need_appearances and by_page:
+        doc.need_appearances(True)
+
+    # Remaining answers go to the summary page
+    unmapped_fields = [
+        (field_id, _as_text(value)) for field_id, value in form_data.items()
+        if field_id not in handled_fields
+    ]
+
+    # Append Summary Page for Unmapped items
+    if unmapped_fields:
+        page = doc.new_page()
+        page.insert_text((50, 50), "Additional / Unmapped Data", fontsize=16)
+
+        labels = {f['id']: f.get('label') or f['id'] for f in schema.get('fields', [])}
+        y = 100
+        for field_id, value in unmapped_fields:
+            text = f"{labels.get(field_id, field_id)}: {value}"
+
+            try:
+                page.insert_text((50, y), str(text), fontsize=12)
+            except Exception:
+                pass
+            y += 20
+
+            if y > 800:
+                page = doc.new_page()
+                y = 50
@@ -0,0 +1,168 @@
+import re
+from typing import Dict, List, Tuple
+import fitz
+from app.core.text_index import normalize_token, tokenize
+
+# Four or more underscores or dots mark a blank to write on
+LEADER_PATTERN = re.compile(r"_{4,}|\.{4,}")
+
+# Side of a spatial grid bucket, in PDF points
+GRID_SIZE = 64
+
+# Drawn boxes in this size range are treated as table cells / input boxes
+CELL_MIN_WIDTH = 20
+CELL_MIN_HEIGHT = 8
+CELL_MAX_HEIGHT = 80
+
+def _sub_rect(x0: float, y0: float, x1: float, y1: float, text: str, start: int, end: int) -> fitz.Rect:
+    # Words only carry a bbox; estimate a substring's extent by character share
+    char_width = (x1 - x0) / max(len(text), 1)
+    return fitz.Rect(x0 + char_width * start, y0, x0 + char_width * end, y1)
+
+class SpatialGrid:
+    """
+    Uniform bucket grid over rects; region queries touch only nearby buckets.
+    """
+    def __init__(self, size: float = GRID_SIZE):
+        self.size = size
+        self.rects: List[fitz.Rect] = []
+        self._buckets: Dict[Tuple[int, int], List[int]] = {}
+
+    def _keys(self, rect: fitz.Rect):
+        for gx in range(int(rect.x0 // self.size), int(rect.x1 // self.size) + 1):
+            for gy in range(int(rect.y0 // self.size), int(rect.y1 // self.size) + 1):
+                yield gx, gy
+
+    def insert(self, rect: fitz.Rect) -> int:
+        idx = len(self.rects)
+        self.rects.append(rect)
+        for key in self._keys(rect):
+            self._buckets.setdefault(key, []).append(idx)
+        return idx
+
+    def query(self, roi: fitz.Rect) -> List[int]:
+        """
+        Indexes of rects touching the region (degenerate rects such as rules included).
+        """
+        seen = set()
+        found = []
+        for key in self._keys(roi):
+            for idx in self._buckets.get(key, ()):
+                if idx in seen:
+                    continue
+                seen.add(idx)
+                rect = self.rects[idx]
+                if (rect.x0 <= roi.x1 and rect.x1 >= roi.x0 and
+                        rect.y0 <= roi.y1 and rect.y1 >= roi.y0):
+                    found.append(idx)
+        return sorted(found)
+
+class PageLayout:
+    """
+    Words, blank candidates (leader runs, drawn rules, empty cells) and grids
+    over both for one page, all in unrotated page coordinates.
+    """
+    def __init__(self, page_idx: int, rect: fitz.Rect):
+        self.page_idx = page_idx
+        self.rect = rect
+        # Each word: (rect, text, token)
+        self.words: List[Tuple[fitz.Rect, str, str]] = []
+        self._positions: Dict[str, List[int]] = {}
+        self._word_grid = SpatialGrid()
+        # Each candidate: (rect, kind) with kind 'leader', 'rule' or 'cell'
+        self.candidates: List[Tuple[fitz.Rect, str]] = []
+        self._candidate_grid = SpatialGrid()
+
+    def add_word(self, rect: fitz.Rect, text: str):
+        token = normalize_token(text)
+        if token:
+            self._positions.setdefault(token, []).append(len(self.words))
+        self.words.append((rect, text, token))
+        self._word_grid.insert(rect)
+
+    def add_candidate(self, rect: fitz.Rect, kind: str):
+        self.candidates.append((rect, kind))
+        self._candidate_grid.insert(rect)
+
+    def words_in(self, roi: fitz.Rect) -> List[Tuple[fitz.Rect, str, str]]:
+        return [self.words[idx] for idx in self._word_grid.query(roi)]
+
+    def candidates_in(self, roi: fitz.Rect) -> List[int]:
+        """
+        Indexes into `candidates` of the blanks touching a region, via the grid
+        instead of a page scan.
+        """
+        return self._candidate_grid.query(roi)
+
+    def find_label(self, label: str) -> List[fitz.Rect]:
+        """
+        Rects of every occurrence of the label's words in reading order,
+        limited to the first line of the match and excluding attached leaders.
+        """
+        tokens = tokenize(label)
+        if not tokens:
+            return []
+        hits = []
+        for start in self._positions.get(tokens[0], []):
+            run = range(start, start + len(tokens))
+            if run.stop > len(self.words):
+                continue
+            if any(self.words[pos][2] != token for pos, token in zip(run, tokens)):
+                continue
+            first_rect = self.words[start][0]
+            rect = fitz.Rect(first_rect)
+            for pos in run:
+                word_rect, text, _ = self.words[pos]
+                # Same line only, like page.search_for's first quad
+                if abs(word_rect.y1 - first_rect.y1) > first_rect.height / 2:
+                    break
+                leader = LEADER_PATTERN.search(text)
+                if leader and leader.start() > 0:
+                    word_rect = _sub_rect(*word_rect, text, 0, leader.start())
+                rect |= word_rect
+            hits.append(rect)
+        return hits
+
+class LayoutIndex:
+    """
+    Per-document layout built in one pass: word boxes, leader runs ('____', '....'),
+    horizontal rules and empty table cells, with a spatial grid per page.
+    Replaces per-field page.search_for() scans in the coordinate mapper.
+    """
+    def __init__(self, pages: List[PageLayout]):
+        self.pages = pages
+
+    @classmethod
+    def from_document(cls, doc: fitz.Document) -> "LayoutIndex":
+        return cls([cls._build_page(page_idx, page) for page_idx, page in enumerate(doc)])
+
+    @staticmethod
+    def _build_page(page_idx: int, page: fitz.Page) -> PageLayout:
+        layout = PageLayout(page_idx, page.rect)
+        text_len = 0
+        for x0, y0, x1, y1, text, *_ in page.get_text("words", sort=True):
+            text_len += len(text)
+            layout.add_word(fitz.Rect(x0, y0, x1, y1), text)
+            for leader in LEADER_PATTERN.finditer(text):
+                layout.add_candidate(_sub_rect(x0, y0, x1, y1, text, leader.start(), leader.end()), "leader")
+
+        if text_len < 10:
+            print(f"WARNING: Page {page_idx} has very little text ({text_len} chars). It might be an image/scan. Visual mapping will likely fail.")
+
+        for drawing in page.get_drawings():
+            for item in drawing["items"]:
+                if item[0] == "l":
+                    p1, p2 = item[1], item[2]
+                    # Horizontal rules are blanks to write on, unless text already sits on them
+                    if abs(p1.y - p2.y) < 1 and abs(p2.x - p1.x) >= CELL_MIN_WIDTH:
+                        y = (p1.y + p2.y) / 2
+                        rule = fitz.Rect(min(p1.x, p2.x), y - 1, max(p1.x, p2.x), y)
+                        if not layout.words_in(fitz.Rect(rule.x0, y - 4, rule.x1, y)):
+                            layout.add_candidate(rule, "rule")
+                elif item[0] == "re":
+                    rect = fitz.Rect(item[1])
+                    if rect.width >= CELL_MIN_WIDTH and CELL_MIN_HEIGHT <= rect.height <= CELL_MAX_HEIGHT:
+                        # Only empty boxes are somewhere to write
+                        if not layout.words_in(rect + (1, 1, -1, -1)):
+                            layout.add_candidate(rect, "cell")
+        return layout
@@ -1,102 +1,176 @@
+import heapq
 import fitz
+import numpy as np
+from app.core.pdf.assignment import linear_sum_assignment
+from app.core.pdf.layout import LayoutIndex
+
+# Cost of a label/blank pair that must never be matched
+UNASSIGNABLE_COST = 1e9
+
+# Minimum label/widget-name score to consider a match
+MATCH_THRESHOLD = 0.3
+
+# Best-scoring widgets kept per field for the assignment
+MAX_WIDGETS_PER_FIELD = 8
+
+# Widget name indexes by name tuple, oldest dropped first
+WIDGET_INDEX_CACHE_SIZE = 32
+_widget_index_cache = {}
 
 class CoordinateMapper:
-    def get_field_coordinates(self, doc, schema):
+    def get_field_coordinates(self, doc, schema, layout: LayoutIndex = None):
         """
         Scan the PDF document to find coordinates for fields defined in the schema.
+        Labels are matched to blanks by a global assignment, so two labels never claim
+        the same blank, every occurrence of a label is considered, and each field is
+        placed on one page only (where its best blank is).
         Returns a dictionary: { field_id: { page_idx, rect: fitz.Rect } }
         """
-        results = {}
         fields = schema.get('fields', [])
         
-        # Pre-scan pages for text to avoid repeated IO
-        # For small-medium PDFs this is fine.
+        # One pass over the document; every label is then resolved from the index
+        if layout is None:
+            layout = LayoutIndex.from_document(doc)
         
+        # Every label occurrence, grouped by page: [(field_id, label_rect)]
+        occurrences = {}
         for field in fields:
             label = field.get('label')
             field_id = field.get('id')
             
             if not label:
                 continue
-                
-            match = self._find_field_location(doc, label)
-            if match:
-                results[field_id] = match
+            
+            for page in layout.pages:
+                for rect in page.find_label(label):
+                    occurrences.setdefault(page.page_idx, []).append((field_id, rect))
+        
+        # (field_id, (page_idx, candidate_idx)) -> cost, over accepted occurrences only
+        pairs = {}
+        first_seen = {}
+        for page_idx in sorted(occurrences):
+            page = layout.pages[page_idx]
+            accepted = self._accepted(occurrences[page_idx])
+            for field_id, rect in accepted:
+                first_seen.setdefault(field_id, (page_idx, rect))
+            for field_id, candidate_idx, cost in self._page_costs(page, accepted):
+                key = (field_id, (page_idx, candidate_idx))
+                pairs[key] = min(cost, pairs.get(key, UNASSIGNABLE_COST))
+        
+        # Fields compete across pages only through repeated labels; solve each
+        # connected group of fields/blanks separately
+        assigned = {}
+        for rows, cols in _connected_groups(pairs):
+            cost = np.full((len(rows), len(cols)), UNASSIGNABLE_COST)
+            row_pos = {row: i for i, row in enumerate(rows)}
+            col_pos = {col: j for j, col in enumerate(cols)}
+            for (row, col), pair_cost in pairs.items():
+                if row in row_pos and col in col_pos:
+                    cost[row_pos[row], col_pos[col]] = pair_cost
+            for i, j in zip(*linear_sum_assignment(cost)):
+                if cost[i, j] < UNASSIGNABLE_COST:
+                    page_idx, candidate_idx = cols[j]
+                    candidate = layout.pages[page_idx].candidates[candidate_idx]
+                    assigned[rows[i]] = {"page_idx": page_idx, **self._target_for(*candidate)}
+        
+        results = {}
+        for field_id, (page_idx, label_rect) in first_seen.items():
+            if field_id in assigned:
+                results[field_id] = assigned[field_id]
+                continue
+            # Fallback: Right of Label (Simple)
+            # If no blank was assigned, just designate the space to the right
+            # Estimated width = 200
+            target_rect = fitz.Rect(label_rect.x1 + 10, label_rect.y0, label_rect.x1 + 210, label_rect.y1)
+            results[field_id] = {"page_idx": page_idx, "rect": target_rect, "method": "fallback_right"}
                 
         return results
 
-    def _find_field_location(self, doc, label):
+    def _accepted(self, page_occurrences):
         """
-        Finds the best writing location for a given label.
-        Strategy:
-        1. Search for Label.
-        2. Look for "______" or "....." to the right or below.
-        3. If no line found, default to 'Right of Label'.
+        Drop occurrences inside another field's longer match on the same page
+        ('Name' in "Father's Name"): those are not labels.
         """
+        if len(page_occurrences) < 2:
+            return page_occurrences
+        labels = np.array([tuple(rect) for _, rect in page_occurrences])
+        inner = self._contained(labels)
+        return [occurrence for occurrence, is_inner in zip(page_occurrences, inner) if not is_inner]
+
+    def _page_costs(self, page, page_occurrences):
+        """
+        Admissible label occurrence x blank candidate pairs on one page.
+        Each label is only paired with the candidates its region of interest touches
+        (right of the label start, from just above to ~3 lines below), found via the
+        page's candidate grid. Yields (field_id, candidate_idx, cost).
+        """
+        if not page.candidates or not page_occurrences:
+            return
         
-        # 1. Search for Label
-        for page_idx, page in enumerate(doc):
-            # Debug: Check if page has text
-            text_len = len(page.get_text())
-            if text_len < 10:
-                print(f"WARNING: Page {page_idx} has very little text ({text_len} chars). It might be an image/scan. Visual mapping will likely fail.")
-                
-            label_instances = page.search_for(label)
-            
-            if not label_instances:
-                continue
-                
-            # Use the first instance for now (simplification)
-            # In complex forms, we might need to verify context
-            label_rect = label_instances[0]
-            
-            # 2. Look for Lines (____ or ....)
-            # We search a "Region of Interest" (ROI) around the label
-            roi = fitz.Rect(label_rect.x0, label_rect.y0 - 10, page.rect.width, label_rect.y1 + 50)
-            
-            # Search for patterns
-            underscores = page.search_for("____", clip=roi)
-            dots = page.search_for("....", clip=roi)
-            lines = underscores + dots
-            
-            best_candidate = None
-            min_dist = float('inf')
-            
-            # Heuristic: Find closest line
-            for line in lines:
-                # Calculate distance from label end
-                
-                # Case A: Same line (Right)
-                if abs(line.y1 - label_rect.y1) < 10 and line.x0 > label_rect.x0:
-                     dist = line.x0 - label_rect.x1
-                     if dist < min_dist:
-                         min_dist = dist
-                         best_candidate = line
-                
-                # Case B: Next line (Below)
-                elif line.y0 > label_rect.y0:
-                     # Calculate visual distance
-                     dist = ((line.x0 - label_rect.x0)**2 + (line.y0 - label_rect.y1)**2)**0.5
-                     # Penalty for vertical distance to prefer same-line
-                     dist = dist * 1.5 
-                     
-                     if dist < min_dist:
-                         min_dist = dist
-                         best_candidate = line
-            
-            if best_candidate:
-                # We found a line! Return its rect.
-                # Adjust slightly upwards to write ON the line
-                target_rect = fitz.Rect(best_candidate.x0, best_candidate.y0 - 5, best_candidate.x1, best_candidate.y1)
-                return {"page_idx": page_idx, "rect": target_rect, "method": "visual_line"}
-            
-            # 3. Fallback: Right of Label (Simple)
-            # If no line detected, just designate the space to the right
-            # Estimated width = 200
-            target_rect = fitz.Rect(label_rect.x1 + 10, label_rect.y0, label_rect.x1 + 210, label_rect.y1)
-            return {"page_idx": page_idx, "rect": target_rect, "method": "fallback_right"}
-            
-        return None
+        rows, cols = [], []
+        for row, (_, rect) in enumerate(page_occurrences):
+            nearby = page.candidates_in(fitz.Rect(rect.x0, rect.y0 - 10, page.rect.width, rect.y1 + 50))
+            rows.extend([row] * len(nearby))
+            cols.extend(nearby)
+        if not rows:
+            return
+        
+        rows, cols = np.array(rows), np.array(cols)
+        labels = np.array([tuple(rect) for _, rect in page_occurrences])[rows]
+        candidates = np.array([tuple(rect) for rect, _ in page.candidates])[cols]
+        cost = self._pair_costs(labels, candidates)
+        
+        admissible = cost < UNASSIGNABLE_COST
+        for r, c, pair_cost in zip(rows[admissible], cols[admissible], cost[admissible]):
+            yield page_occurrences[r][0], int(c), float(pair_cost)
+
+    @staticmethod
+    def _contained(labels: np.ndarray) -> np.ndarray:
+        # labels: (k, 4) rects; True where a rect lies within a different, larger one
+        x0, y0, x1, y1 = (labels[:, i] for i in range(4))
+        inside = (
+            (x0[:, None] >= x0[None, :] - 0.5) & (x1[:, None] <= x1[None, :] + 0.5) &
+            (y0[:, None] >= y0[None, :] - 0.5) & (y1[:, None] <= y1[None, :] + 0.5)
+        )
+        widths = x1 - x0
+        larger = widths[None, :] > widths[:, None] + 0.5
+        return (inside & larger).any(axis=1)
+
+    @staticmethod
+    def _pair_costs(labels: np.ndarray, candidates: np.ndarray) -> np.ndarray:
+        """
+        Placement cost of labels[i] -> candidates[i], both (n, 4), for candidates
+        already within the label's region of interest.
+        Same-line blanks to the right cost their gap; blanks below cost 1.5x their
+        distance; anything else is unassignable.
+        """
+        lx0, ly0, lx1, ly1 = labels.T
+        cx0, cy0, cx1, cy1 = candidates.T
+        label_mid_y = (ly0 + ly1) / 2
+        
+        same_line = ((np.abs(cy1 - ly1) < 10) | ((cy0 <= label_mid_y) & (label_mid_y <= cy1))) & (cx0 > lx0)
+        below = ~same_line & (cy0 > ly0)
+        
+        # Penalty for vertical distance to prefer same-line
+        cost = np.where(
+            same_line,
+            np.maximum(cx0 - lx1, 0),
+            1.5 * np.hypot(cx0 - lx0, cy0 - ly1)
+        )
+        return np.where(same_line | below, cost, UNASSIGNABLE_COST)
+
+    def _target_for(self, rect, kind):
+        """
+        Widget rect for a blank candidate.
+        """
+        if kind == "cell":
+            # Write inside the box, clear of its border
+            return {"rect": fitz.Rect(rect.x0 + 2, rect.y0 + 1, rect.x1 - 2, rect.y1 - 1), "method": "table_cell"}
+        if kind == "rule":
+            # Text sits on the rule
+            return {"rect": fitz.Rect(rect.x0, rect.y1 - 14, rect.x1, rect.y1), "method": "visual_line"}
+        # Adjust slightly upwards to write ON the leader
+        return {"rect": fitz.Rect(rect.x0, rect.y0 - 5, rect.x1, rect.y1), "method": "visual_line"}
 
     def _normalize_pdf_field_name(self, pdf_field_name):
         """
@@ -147,7 +221,8 @@ class CoordinateMapper:
             return 0.0
         
         # Count exact word matches
-        exact_matches = sum(1 for word in label_words if word in pdf_field_words)
+        pdf_word_set = set(pdf_field_words)
+        exact_matches = sum(1 for word in label_words if word in pdf_word_set)
         
         # Count partial matches (word contains or is contained in another word)
         partial_matches = 0
@@ -172,77 +247,148 @@ class CoordinateMapper:
         
         return score
     
+    def _split_words(self, text):
+        return [w for w in text.replace('_', ' ').replace('-', ' ').split() if w]
+
+    def _widget_index(self, widget_names) -> "WidgetNameIndex":
+        """
+        Name index for a document's widgets; cached, since every fill of the same
+        template sees the same widget names.
+        """
+        key = tuple(widget_names)
+        index = _widget_index_cache.get(key)
+        if index is None:
+            index = WidgetNameIndex(
+                key, [self._split_words(self._normalize_pdf_field_name(name)) for name in key]
+            )
+            if len(_widget_index_cache) >= WIDGET_INDEX_CACHE_SIZE:
+                _widget_index_cache.pop(next(iter(_widget_index_cache)))
+            _widget_index_cache[key] = index
+        return index
+
     def map_acroform_fields(self, doc, schema):
         """
         Maps extracted schema field IDs to PDF Form (AcroForm) widget names.
+        Only widgets sharing a word (or word fragment) with a label are scored, and
+        fields and widgets are then paired one-to-one to maximize the total score.
         Returns { field_id: widget_name }
         """
-        mapping = {}
         fields = schema.get('fields', [])
         
-        # Collect all PDF widget names
-        pdf_fields = []
-        for page in doc:
-            for widget in page.widgets():
-                if widget.field_name:
-                    pdf_fields.append(widget.field_name)
-        
-        print(f"DEBUG: Found PDF Form Fields: {pdf_fields}")
-        
-        # Track which PDF fields have been mapped to prevent duplicates
-        used_pdf_fields = set()
+        # Collect all PDF widget names (radio groups repeat a name)
+        widget_names = dict.fromkeys(
+            widget.field_name for page in doc for widget in page.widgets() if widget.field_name
+        )
+        if not widget_names:
+            return {}
+        index = self._widget_index(widget_names)
         
+        # Admissible (field, widget) pairs and their scores
+        field_ids = []
+        pairs = {}
         for field in fields:
-            label = field.get('label', '')
-            field_id = field.get('id')
-            
-            if not label:
-                print(f"DEBUG: Skipping field {field_id} - no label")
-                continue
-            
-            # Normalize label and split into words
-            normalized_label = self._normalize_label(label)
-            label_words = [w for w in normalized_label.replace('_', ' ').replace('-', ' ').split() if w]
-            
+            label_words = self._split_words(self._normalize_label(field.get('label', '')))
             if not label_words:
-                print(f"DEBUG: Skipping field {field_id} - empty label after normalization")
                 continue
-            
-            print(f"DEBUG: Matching schema field '{field_id}' with label '{label}' (normalized: '{normalized_label}', words: {label_words})")
-            
-            best_match = None
-            best_score = 0.0
-            match_threshold = 0.3  # Minimum score to consider a match
-            
-            for pdf_field in pdf_fields:
-                # Skip if already mapped
-                if pdf_field in used_pdf_fields:
-                    continue
-                
-                # Normalize PDF field name (remove type suffixes)
-                normalized_pdf = self._normalize_pdf_field_name(pdf_field)
-                pdf_words = [w for w in normalized_pdf.replace('_', ' ').replace('-', ' ').split() if w]
-                
-                if not pdf_words:
-                    continue
-                
-                # Calculate match score
-                score = self._calculate_match_score(label_words, pdf_words)
-                
-                print(f"  Comparing with PDF field '{pdf_field}' (normalized: '{normalized_pdf}', words: {pdf_words}) -> score: {score:.2f}")
-                
-                if score > best_score and score >= match_threshold:
-                    best_score = score
-                    best_match = pdf_field
-            
-            if best_match:
-                mapping[field_id] = best_match
-                used_pdf_fields.add(best_match)
-                print(f"✓ MATCHED: '{field_id}' ('{label}') -> '{best_match}' (score: {best_score:.2f})")
-            else:
-                print(f"✗ NO MATCH: '{field_id}' ('{label}') - best score was {best_score:.2f} (below threshold {match_threshold})")
-                
-        print(f"DEBUG: Total mappings created: {len(mapping)}")
+            row = len(field_ids)
+            field_ids.append(field.get('id'))
+            scored = []
+            for widget_idx in index.candidates(label_words):
+                score = self._calculate_match_score(label_words, index.words[widget_idx])
+                if score >= MATCH_THRESHOLD:
+                    scored.append((score, widget_idx))
+            # A field's weak alternatives only bloat the assignment
+            for score, widget_idx in heapq.nlargest(MAX_WIDGETS_PER_FIELD, scored):
+                pairs[(row, widget_idx)] = score
+        
+        mapping = {}
+        # Solve each group of fields/widgets that compete with each other separately;
+        # most groups are a single pair, which keeps the matrices tiny
+        for rows, cols in _connected_groups(pairs):
+            # One free "no widget" column per field: leaving a field unmatched costs nothing,
+            # so the solver maximizes the total score rather than the number of matches.
+            # Scores are squared so one strong match outweighs several weak ones, as in
+            # the old best-match-first pass
+            cost = np.full((len(rows), len(cols) + len(rows)), UNASSIGNABLE_COST)
+            cost[:, len(cols):] = 0
+            row_pos = {row: i for i, row in enumerate(rows)}
+            col_pos = {col: j for j, col in enumerate(cols)}
+            for (row, col), score in pairs.items():
+                if row in row_pos and col in col_pos:
+                    cost[row_pos[row], col_pos[col]] = -score * score
+            for i, j in zip(*linear_sum_assignment(cost)):
+                if j < len(cols) and cost[i, j] < UNASSIGNABLE_COST:
+                    mapping[field_ids[rows[i]]] = index.names[cols[j]]
+        
         return mapping
 
+class WidgetNameIndex:
+    """
+    Inverted index over normalized widget names. Label words are resolved against
+    the distinct widget words once (exactly, or as a substring either way, with
+    trigrams narrowing the substring checks for words of 3+ characters) and map
+    to widgets via postings.
+    """
+    def __init__(self, names, words):
+        self.names = names
+        self.words = words
+        self._postings = {}
+        for idx, name_words in enumerate(words):
+            for word in name_words:
+                self._postings.setdefault(word, set()).add(idx)
+        self._trigrams = {}
+        self._short_words = []
+        for word in self._postings:
+            if len(word) < 3:
+                self._short_words.append(word)
+            for i in range(len(word) - 2):
+                self._trigrams.setdefault(word[i:i + 3], set()).add(word)
+
+    def _related_words(self, word):
+        # Widget words equal to, containing, or contained in `word`
+        related = {word} if word in self._postings else set()
+        related.update(short for short in self._short_words if short in word)
+        if len(word) < 3:
+            # Too short for a trigram ("id" in "userid"): scan the distinct words instead
+            related.update(other for other in self._postings if word in other)
+        for i in range(len(word) - 2):
+            for other in self._trigrams.get(word[i:i + 3], ()):
+                if word in other or other in word:
+                    related.add(other)
+        return related
+
+    def candidates(self, label_words):
+        found = set()
+        for word in set(label_words):
+            for related in self._related_words(word):
+                found |= self._postings[related]
+        return sorted(found)
+
+def _connected_groups(pairs):
+    """
+    Split bipartite (row, col) pairs into connected components.
+    Returns [(rows, cols)], each sorted.
+    """
+    parent = {}
+
+    def find(node):
+        root = node
+        while parent[root] != root:
+            root = parent[root]
+        while parent[node] != root:
+            parent[node], node = root, parent[node]
+        return root
+
+    for row, col in pairs:
+        row_node, col_node = ("r", row), ("c", col)
+        parent.setdefault(row_node, row_node)
+        parent.setdefault(col_node, col_node)
+        parent[find(row_node)] = find(col_node)
+
+    groups = {}
+    for node in parent:
+        rows, cols = groups.setdefault(find(node), (set(), set()))
+        (rows if node[0] == "r" else cols).add(node[1])
+    return [(sorted(rows), sorted(cols)) for rows, cols in groups.values()]
+
 mapper = CoordinateMapper()
@@ -0,0 +1,145 @@
+import hashlib
+from typing import Any, Dict, Tuple
+import fitz
+from app.core.pdf.layout import LayoutIndex
+from app.core.pdf.mapper import mapper
+
+# Bump when the mapping heuristics or the template layout change so stored data is rebuilt
+PLACEMENT_VERSION = 3
+
+def compute_field_placements(doc: fitz.Document, schema: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Decide once where every schema field goes in the document.
+    Returns {"version": ..., "fields": [{field_id, page_idx, rect, widget, method}]}:
+    AcroForm fields carry their widget name, the rest a visual rect to add a widget at
+    (see compile_template). Stored tables also carry the compiled "template" path,
+    its "template_hash" and each field's widget "xrefs" in it.
+    """
+    acro_map = mapper.map_acroform_fields(doc, schema)
+
+    widget_locations = {}
+    if acro_map:
+        wanted = set(acro_map.values())
+        for page in doc:
+            for widget in page.widgets():
+                if widget.field_name in wanted and widget.field_name not in widget_locations:
+                    widget_locations[widget.field_name] = (page.number, widget.rect)
+
+    visual_schema = {"fields": [f for f in schema.get('fields', []) if f.get('id') not in acro_map]}
+    field_map = mapper.get_field_coordinates(doc, visual_schema, LayoutIndex.from_document(doc))
+
+    fields = []
+    for field_id, widget_name in acro_map.items():
+        page_idx, rect = widget_locations.get(widget_name, (None, None))
+        fields.append({
+            "field_id": field_id,
+            "page_idx": page_idx,
+            "rect": list(rect) if rect is not None else None,
+            "widget": widget_name,
+            "method": "acroform"
+        })
+    for field_id, match in field_map.items():
+        fields.append({
+            "field_id": field_id,
+            "page_idx": match['page_idx'],
+            "rect": list(match['rect']),
+            "widget": None,
+            "method": match['method']
+        })
+    return {"version": PLACEMENT_VERSION, "fields": fields}
+
+def compile_template(doc: fitz.Document, placements: Dict[str, Any]) -> bytes:
+    """
+    Add an empty text widget for every visually placed field, so filling a copy
+    only has to set values. Compiled fields get their widget name in `placements`;
+    ones that can't be added keep widget=None and go to the summary page.
+    Returns the normalized PDF bytes.
+    """
+    for p in placements['fields']:
+        if p['widget'] or p['page_idx'] is None:
+            continue
+        try:
+            widget = fitz.Widget()
+            widget.field_type = fitz.PDF_WIDGET_TYPE_TEXT
+            widget.rect = fitz.Rect(p['rect'])
+            widget.field_name = p['field_id']
+            widget.field_value = ""
+            widget.text_color = [0, 0, 1] # Blue
+            widget.text_fontsize = 10
+            doc[p['page_idx']].add_widget(widget)
+            p['widget'] = p['field_id']
+        except Exception as e:
+            print(f"Error adding widget for {p['field_id']}: {e}")
+    # Built once per form, so it's worth compacting
+    template_bytes = doc.tobytes(garbage=3, deflate=True)
+    _record_widget_xrefs(template_bytes, placements)
+    return template_bytes
+
+def _record_widget_xrefs(template_bytes: bytes, placements: Dict[str, Any]):
+    """
+    Give every placed field the xrefs of its widgets in the compiled template,
+    as [page_idx, widget_xref, field_xref, field_type] entries, so a fill loads
+    exactly the widgets it sets instead of walking every page.
+    """
+    template = fitz.open(stream=template_bytes, filetype="pdf")
+    try:
+        by_name = {}
+        for page in template:
+            for widget in page.widgets():
+                # The value lives on the field: the widget itself, or its parent for kids
+                field_xref = widget.xref
+                if template.xref_get_key(widget.xref, "T")[0] == "null":
+                    kind, parent = template.xref_get_key(widget.xref, "Parent")
+                    if kind == "xref":
+                        field_xref = int(parent.split()[0])
+                by_name.setdefault(widget.field_name, []).append(
+                    [page.number, widget.xref, field_xref, widget.field_type]
+                )
+        for p in placements['fields']:
+            if p['widget']:
+                p['xrefs'] = by_name.get(p['widget'], [])
+    finally:
+        template.close()
+
+def is_current(placements: Dict[str, Any]) -> bool:
+    return (bool(placements) and placements.get("version") == PLACEMENT_VERSION
+            and bool(placements.get("template")) and bool(placements.get("template_hash")))
+
+def build_form_template(file_content: bytes, content_type: str, schema: Dict[str, Any]) -> Tuple[Dict[str, Any], bytes]:
+    """
+    Placement table and compiled template for an uploaded file, computed at processing time.
+    Image uploads come out as PDF. Returns (placements, template_bytes).
+    """
+    from app.core.document_cache import open_as_pdf
+    doc = open_as_pdf(file_content, content_type)
+    try:
+        placements = compute_field_placements(doc, schema)
+        return placements, compile_template(doc, placements)
+    finally:
+        doc.close()
+
+def template_path(file_path: str) -> str:
+    # Next to the upload (deduped forms share it). Reprocessing overwrites it, so
+    # readers identify the content by template_digest, not by path
+    return f"{file_path}.template.v{PLACEMENT_VERSION}.pdf"
+
+def template_digest(template_bytes: bytes) -> str:
+    return hashlib.sha256(template_bytes).hexdigest()
+
+def store_form_template(file_path: str, placements: Dict[str, Any], template_bytes: bytes):
+    """
+    Upload a compiled template and record its path and content hash in `placements`.
+    On failure the placements stay incomplete, and the template is rebuilt on the next fill.
+    """
+    from app.db.supabase import supabase
+    path = template_path(file_path)
+    try:
+        supabase.storage.from_("pdf-forms").upload(
+            path,
+            template_bytes,
+            {"content-type": "application/pdf", "upsert": "true"}
+        )
+        placements['template'] = path
+        placements['template_hash'] = template_digest(template_bytes)
+    except Exception as e:
+        print(f"WARNING: Could not store compiled template for {file_path}: {e}")
@@ -1,152 +1,201 @@
-import fitz  # PyMuPDF
-from app.db.supabase import supabase
+import asyncio
 import os
+import tempfile
 import uuid
-from app.core.pdf.mapper import mapper
+from collections import OrderedDict
+from typing import Any, AsyncIterator, Dict, List, Tuple
+from app.db.supabase import supabase
+from app.core.config import get_settings
+from app.core.pdf.filler import fill_document, fill_document_from_file
+from app.core.pdf.placement import build_form_template, is_current, store_form_template, template_digest
+from app.core.pools import run_cpu, run_io, run_process
+
+# Compiled templates kept in memory, by content hash
+TEMPLATE_CACHE_SIZE = 16
+
+# Bulk fills: session ids per fetch (they go in the query string), and
+# forms whose templates are loaded (or built) at once
+SESSION_FETCH_CHUNK = 200
+BULK_TEMPLATE_LOADS = 4
 
 class PDFWriter:
+    def __init__(self):
+        # Keyed by template_hash: the storage path is overwritten when a form is reprocessed
+        self._templates: "OrderedDict[str, bytes]" = OrderedDict()
+
     async def fill_pdf(self, form_id: str, session_id: str) -> str:
         """
         Fill the PDF with data from the session.
         Returns the public URL of the filled PDF.
         """
         # 1. Fetch Form and Session Data
-        form_res = supabase.table("forms").select("*").eq("id", form_id).single().execute()
-        session_res = supabase.table("sessions").select("form_data").eq("id", session_id).single().execute()
-        
-        if not form_res.data or not session_res.data:
+        form = await run_io(self._load_form, form_id)
+        session_res = await run_io(supabase.table("sessions").select("form_data").eq("id", session_id).single().execute)
+
+        if not session_res.data:
             raise ValueError("Form or Session not found")
-            
-        form = form_res.data
+
         form_data = session_res.data['form_data']
-        schema = form['form_schema']
-        
-        # 2. Download Original PDF
-        file_path = form['file_path']
-        original_pdf_bytes = supabase.storage.from_("pdf-forms").download(file_path)
-        
-        # 3. Fill PDF using PyMuPDF
-        content_type = form.get('content_type', 'application/pdf')
-        
-        if 'pdf' in content_type:
-             try:
-                 doc = fitz.open(stream=original_pdf_bytes, filetype="pdf")
-             except Exception:
-                 # Fallback if content_type was wrong
-                 img_doc = fitz.open(stream=original_pdf_bytes)
-                 pdf_bytes = img_doc.convert_to_pdf()
-                 doc = fitz.open("pdf", pdf_bytes)
-                 img_doc.close()
-        else:
-             img_doc = fitz.open(stream=original_pdf_bytes)
-             pdf_bytes = img_doc.convert_to_pdf()
-             doc = fitz.open("pdf", pdf_bytes)
-             img_doc.close()
-        
-        
-        
-        # 3.5. Try AcroForm Filling First
-        print("Checking for Fillable Form Fields (AcroForm)...")
-        acro_map = mapper.map_acroform_fields(doc, schema)
-        print(f"Mapped {len(acro_map)} fields to widgets.")
-        
-        # Track which fields are handled by AcroForm
-        handled_fields = set()
-        
-        if acro_map:
-            for page in doc:
-                for widget in page.widgets():
-                    if widget.field_name in acro_map.values():
-                        # Find which field_id maps to this widget
-                        # Reverse lookup (inefficiet but fine for small forms)
-                        field_id = next((k for k, v in acro_map.items() if v == widget.field_name), None)
-                        
-                        if field_id and field_id in form_data:
-                            val = form_data[field_id]
-                            if isinstance(val, list): val = ", ".join(map(str, val))
-                            
-                            print(f"Filling Widget: {widget.field_name} with {val}")
-                            widget.field_value = str(val)
-                            widget.update() # Commit change
-                            handled_fields.add(field_id)
-
-        # 4. Map Coordinates (Visual Fallback)
-        print("Mapping visual coordinates for remaining fields...")
-        field_map = mapper.get_field_coordinates(doc, schema)
-
-        # 5. Fill Data
-        # Track unmapped fields to put on summary page
-        unmapped_fields = []
-
-        for field_id, value in form_data.items():
-            if field_id in handled_fields:
-                continue
-
-            # Handle non-string values
-            if isinstance(value, list):
-                value = ", ".join(map(str, value))
-            
-            # Check if we have a visual map
-            mapping = field_map.get(field_id)
-            
-            if mapping:
-                # Write to specific location
+
+        # 2. Compiled template: built at processing time, or on demand for older forms
+        placements, template_bytes = await self._load_template(form_id, form)
+
+        # 3. Fill PDF using PyMuPDF, in a worker process so the event loop stays free
+        settings = get_settings()
+        output_bytes = await run_process(
+            fill_document, template_bytes, form['form_schema'], placements, form_data,
+            settings.PDF_NEED_APPEARANCES, settings.PDF_OUTPUT_MODE
+        )
+
+        # 4. Save and Upload
+        return await run_io(self._upload, output_bytes)
+
+    async def fill_many(self, items: List[Tuple[str, str]]) -> AsyncIterator[Dict[str, Any]]:
+        """
+        Fill many (form_id, session_id) pairs, yielding one result per pair as it finishes:
+        {"form_id", "session_id", "url"} or {"form_id", "session_id", "error"}.
+        Each form's compiled template is loaded once, and its fills start as soon as it
+        is ready; fills run in the PDF process pool.
+        """
+        settings = get_settings()
+        in_flight = asyncio.Semaphore(settings.PDF_BULK_MAX_IN_FLIGHT)
+        template_loads = asyncio.Semaphore(BULK_TEMPLATE_LOADS)
+        results: "asyncio.Queue[Dict[str, Any]]" = asyncio.Queue()
+        tasks: List[asyncio.Task] = []
+
+        by_form: Dict[str, List[str]] = {}
+        for form_id, session_id in items:
+            by_form.setdefault(form_id, []).append(session_id)
+
+        # Answers in chunks, so each request's id list stays well inside URL length limits
+        session_ids = list(dict.fromkeys(session_id for _, session_id in items))
+        sessions_for: Dict[str, asyncio.Task] = {}
+        for start in range(0, len(session_ids), SESSION_FETCH_CHUNK):
+            chunk = session_ids[start:start + SESSION_FETCH_CHUNK]
+            fetch = asyncio.create_task(run_io(self._load_sessions, chunk))
+            tasks.append(fetch)
+            for session_id in chunk:
+                sessions_for[session_id] = fetch
+
+        async def fill_one(form_id, session_id, template_path, form, placements):
+            result = {"form_id": form_id, "session_id": session_id}
+            async with in_flight:
                 try:
-                    page_idx = mapping['page_idx']
-                    rect = mapping['rect']
-                    page = doc[page_idx]
-                    
-                    # Insert Widget (Auto-Convert to Fillable)
-                    # We create a new form field at this location
-                    widget = fitz.Widget()
-                    widget.rect = rect
-                    widget.field_name = field_id
-                    widget.field_value = str(value)
-                    widget.text_color = [0, 0, 1] # Blue
-                    widget.text_fontsize = 10
-                    page.add_widget(widget)
-                    
-                    print(f" injected Widget {field_id} at {rect} on page {page_idx}")
-                    continue # Success
+                    form_data = (await sessions_for[session_id]).get(session_id)
+                    if form_data is None:
+                        raise ValueError("Form or Session not found")
+                    output_bytes = await run_process(
+                        fill_document_from_file, template_path, form['form_schema'],
+                        placements, form_data,
+                        settings.PDF_NEED_APPEARANCES, settings.PDF_OUTPUT_MODE
+                    )
+                    result["url"] = await run_io(self._upload, output_bytes)
                 except Exception as e:
-                    print(f"Error filling {field_id}: {e}")
-            
-            unmapped_fields.append((field_id, value))
-
-        # 6. Append Summary Page for Unmapped items
-        if unmapped_fields:
-            page = doc.new_page()
-            page.insert_text((50, 50), "Additional / Unmapped Data", fontsize=16)
-            
-            y = 100
-            for field_id, value in unmapped_fields:
-                 # Find label
-                label = next((f['label'] for f in schema['fields'] if f['id'] == field_id), field_id)
-                text = f"{label}: {value}"
-                
-                try:
-                    page.insert_text((50, y), str(text), fontsize=12)
-                except Exception:
-                    pass
-                y += 20
-                
-                if y > 800:
-                    page = doc.new_page()
-                    y = 50
-                
-        # 4. Save and Upload
+                    result["error"] = str(e)
+            results.put_nowait(result)
+
+        async def start_form(form_id, form_sessions):
+            try:
+                async with template_loads:
+                    form = await run_io(self._load_form, form_id)
+                    placements, template_bytes = await self._load_template(form_id, form)
+                # Workers read the template from disk once, not with every task
+                template_path = os.path.join(template_dir, f"{uuid.uuid4()}.bin")
+                with open(template_path, "wb") as f:
+                    f.write(template_bytes)
+            except Exception as e:
+                for session_id in form_sessions:
+                    results.put_nowait({"form_id": form_id, "session_id": session_id, "error": str(e)})
+                return
+
+            for session_id in form_sessions:
+                tasks.append(asyncio.create_task(
+                    fill_one(form_id, session_id, template_path, form, placements)
+                ))
+
+        template_dir = tempfile.mkdtemp(prefix="pdf-templates-")
+        try:
+            for form_id, form_sessions in by_form.items():
+                tasks.append(asyncio.create_task(start_form(form_id, form_sessions)))
+
+            for _ in range(len(items)):
+                yield await results.get()
+        finally:
+            # Client went away or we're done: stop what's left and drop the templates
+            for task in tasks:
+                task.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
+            for name in os.listdir(template_dir):
+                os.remove(os.path.join(template_dir, name))
+            os.rmdir(template_dir)
+
+    def _load_sessions(self, session_ids: List[str]) -> Dict[str, Any]:
+        sessions_res = supabase.table("sessions").select("id, form_data").in_("id", session_ids).execute()
+        return {row['id']: row['form_data'] for row in (sessions_res.data or [])}
+
+    def _load_form(self, form_id: str):
+        form_res = supabase.table("forms").select("*").eq("id", form_id).single().execute()
+        if not form_res.data:
+            raise ValueError("Form or Session not found")
+        form = form_res.data
+        form['content_type'] = form.get('content_type') or 'application/pdf'
+        return form
+
+    async def _load_template(self, form_id: str, form: Dict[str, Any]) -> Tuple[Dict[str, Any], bytes]:
+        """
+        The form's placements and compiled template bytes.
+        """
+        placements = form.get('field_placements')
+        if is_current(placements):
+            path, digest = placements['template'], placements['template_hash']
+            template_bytes = self._templates.get(digest)
+            if template_bytes is not None:
+                self._templates.move_to_end(digest)
+                return placements, template_bytes
+            try:
+                template_bytes = await run_io(supabase.storage.from_("pdf-forms").download, path)
+            except Exception as e:
+                print(f"WARNING: Could not load compiled template {path}: {e}")
+            else:
+                if await run_cpu(template_digest, template_bytes) == digest:
+                    self._cache_template(digest, template_bytes)
+                    return placements, template_bytes
+                # Overwritten by a build whose placements (and xrefs) this row doesn't have
+                print(f"WARNING: Compiled template {path} does not match the form's placements")
+
+        print("No compiled template for this form, building it now...")
+        original_bytes = await run_io(supabase.storage.from_("pdf-forms").download, form['file_path'])
+        placements, template_bytes = await run_process(
+            build_form_template, original_bytes, form['content_type'], form['form_schema']
+        )
+        await run_io(self._store_template, form_id, form['file_path'], placements, template_bytes)
+        if placements.get('template_hash'):
+            self._cache_template(placements['template_hash'], template_bytes)
+        return placements, template_bytes
+
+    def _cache_template(self, digest: str, template_bytes: bytes):
+        self._templates[digest] = template_bytes
+        self._templates.move_to_end(digest)
+        while len(self._templates) > TEMPLATE_CACHE_SIZE:
+            self._templates.popitem(last=False)
+
+    def _store_template(self, form_id: str, file_path: str, placements: Dict[str, Any], template_bytes: bytes):
+        store_form_template(file_path, placements, template_bytes)
+        try:
+            supabase.table("forms").update({"field_placements": placements}).eq("id", form_id).execute()
+        except Exception as e:
+            print(f"WARNING: Could not store field placements for form {form_id}: {e}")
+
+    def _upload(self, output_bytes: bytes) -> str:
         output_filename = f"filled_{uuid.uuid4()}.pdf"
-        output_bytes = doc.tobytes()
-        
+
         supabase.storage.from_("pdf-forms").upload(
             output_filename,
             output_bytes,
             {"content-type": "application/pdf"}
         )
-        
-        # 5. Get URL
-        public_url = supabase.storage.from_("pdf-forms").get_public_url(output_filename)
-        
-        return public_url
+
+        # Get URL
+        return supabase.storage.from_("pdf-forms").get_public_url(output_filename)
 
 pdf_writer = PDFWriter()
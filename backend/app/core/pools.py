@@ -0,0 +1,104 @@
+import asyncio
+import functools
+import multiprocessing
+import os
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+# Executors that keep blocking work off the event loop:
+# - io: synchronous Supabase/PostgREST and storage calls (bounded bridge)
+# - cpu: CPU work that releases the GIL (e.g. hashing large uploads)
+# - process: all PyMuPDF work (renders, OCR page prep, index builds, fills); MuPDF holds the GIL
+_io_pool = None
+_cpu_pool = None
+_process_pool = None
+
+def get_io_pool() -> ThreadPoolExecutor:
+    global _io_pool
+    if _io_pool is None:
+        from app.core.config import get_settings
+        _io_pool = ThreadPoolExecutor(max_workers=get_settings().IO_THREADS, thread_name_prefix="io")
+    return _io_pool
+
+def get_cpu_pool() -> ThreadPoolExecutor:
+    global _cpu_pool
+    if _cpu_pool is None:
+        from app.core.config import get_settings
+        workers = get_settings().CPU_THREADS or os.cpu_count() or 1
+        _cpu_pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="cpu")
+    return _cpu_pool
+
+def get_process_pool() -> ProcessPoolExecutor:
+    global _process_pool
+    if _process_pool is None:
+        from app.core.config import get_settings
+        workers = get_settings().PDF_WORKER_PROCESSES or os.cpu_count() or 1
+        # Spawn rather than fork: the API process has live threads and sockets
+        _process_pool = ProcessPoolExecutor(
+            max_workers=workers, mp_context=multiprocessing.get_context("spawn")
+        )
+    return _process_pool
+
+async def run_io(fn, *args, **kwargs):
+    """
+    Run a blocking I/O call (e.g. `query.execute`) on the bounded I/O pool.
+    """
+    return await asyncio.get_running_loop().run_in_executor(
+        get_io_pool(), functools.partial(fn, *args, **kwargs)
+    )
+
+async def run_cpu(fn, *args, **kwargs):
+    """
+    Run CPU work that releases the GIL on the CPU pool, so it can't starve I/O threads.
+    """
+    return await asyncio.get_running_loop().run_in_executor(
+        get_cpu_pool(), functools.partial(fn, *args, **kwargs)
+    )
+
+def _discard_process_pool(pool: ProcessPoolExecutor):
+    # A worker died (e.g. a MuPDF crash) and the executor is unusable; the next caller builds a new one.
+    # Compared by identity, so a late failure can't throw away a pool that was already rebuilt.
+    global _process_pool
+    if _process_pool is pool:
+        _process_pool = None
+    pool.shutdown(wait=False, cancel_futures=True)
+
+async def run_process(fn, *args):
+    """
+    Run a picklable, self-contained function in the worker process pool.
+    If the pool is broken it is rebuilt and the call retried once.
+    """
+    for attempt in range(2):
+        pool = get_process_pool()
+        try:
+            return await asyncio.get_running_loop().run_in_executor(pool, fn, *args)
+        except BrokenProcessPool:
+            print("WARNING: A worker process died, restarting the process pool")
+            _discard_process_pool(pool)
+            if attempt:
+                raise
+
+def call_process(fn, *args):
+    """
+    Blocking run_process, for code already on an I/O thread.
+    """
+    for attempt in range(2):
+        pool = get_process_pool()
+        try:
+            return pool.submit(fn, *args).result()
+        except BrokenProcessPool:
+            print("WARNING: A worker process died, restarting the process pool")
+            _discard_process_pool(pool)
+            if attempt:
+                raise
+
+def shutdown_pools():
+    global _io_pool, _cpu_pool, _process_pool
+    if _process_pool is not None:
+        _process_pool.shutdown(wait=False, cancel_futures=True)
+        _process_pool = None
+    for pool in (_cpu_pool, _io_pool):
+        if pool is not None:
+            pool.shutdown(wait=False, cancel_futures=True)
+    _io_pool = None
+    _cpu_pool = None
@@ -0,0 +1,202 @@
+import hashlib
+import os
+import re
+import threading
+import time
+import uuid
+from typing import Any, Dict, List, Optional, Tuple
+
+# Bump when rendering output changes so clients and disk entries are invalidated
+RENDER_VERSION = "1"
+
+# The API and the job worker write to the same directory, each keeping its own
+# byte count; re-read the real size at least this often (seconds)
+SIZE_RESYNC_INTERVAL = 60
+
+# Pages rendered per process pool task when pre-rendering a form
+PRERENDER_BATCH = 8
+
+def page_variant(page_number: int, zoom: float = None, width: int = None,
+                 image_format: str = "png", quality: int = None) -> str:
+    """
+    Cache variant name for one rendered page, e.g. 'p3_z2' or 'p3_w160_q70'.
+    """
+    size = f"w{width}" if width else f"z{zoom:g}"
+    # Quality only affects lossy formats
+    suffix = f"_q{quality}" if quality and image_format != "png" else ""
+    return f"p{page_number}_{size}{suffix}"
+
+def sniff_mime(data: bytes) -> str:
+    if data.startswith(b"\x89PNG"):
+        return "image/png"
+    if data.startswith(b"\xff\xd8"):
+        return "image/jpeg"
+    if data[:4] == b"RIFF" and data[8:12] == b"WEBP":
+        return "image/webp"
+    return "application/octet-stream"
+
+class PageRenderCache:
+    """
+    On-disk cache of rendered page images.
+    Form files never change after upload, so an entry for (form, variant, format)
+    is immutable and its ETag can be derived from the key alone.
+    """
+    def __init__(self, directory: str, max_bytes: int):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._lock = threading.Lock()
+        os.makedirs(directory, exist_ok=True)
+        self._bytes = self._disk_bytes()
+        self._synced_at = time.monotonic()
+
+    def _files(self):
+        for root, _, names in os.walk(self.directory):
+            for name in names:
+                if not name.endswith(".tmp"):
+                    yield os.path.join(root, name)
+
+    def _disk_bytes(self) -> int:
+        total = 0
+        for path in self._files():
+            try:
+                total += os.path.getsize(path)
+            except FileNotFoundError:
+                continue
+        return total
+
+    @staticmethod
+    def key(form_id: str, variant: str, image_format: str) -> str:
+        # form_id becomes a directory name, never let it escape the cache dir
+        if not re.fullmatch(r"[A-Za-z0-9_-]+", form_id):
+            raise LookupError("Form not found")
+        return f"{form_id}/{variant}.{image_format}"
+
+    @staticmethod
+    def etag(key: str) -> str:
+        digest = hashlib.sha256(f"{RENDER_VERSION}:{key}".encode("utf-8")).hexdigest()[:32]
+        return f'"{digest}"'
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.directory, key)
+
+    def get(self, key: str) -> Optional[bytes]:
+        path = self._path(key)
+        try:
+            with open(path, "rb") as f:
+                data = f.read()
+        except FileNotFoundError:
+            self.misses += 1
+            return None
+        # Touch so eviction is least-recently-used rather than oldest-written
+        try:
+            os.utime(path)
+        except OSError:
+            pass
+        self.hits += 1
+        return data
+
+    def put(self, key: str, data: bytes):
+        path = self._path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        # Write atomically so concurrent readers never see a partial image
+        tmp_path = f"{path}.{uuid.uuid4().hex}.tmp"
+        with open(tmp_path, "wb") as f:
+            f.write(data)
+        with self._lock:
+            previous = os.path.getsize(path) if os.path.exists(path) else 0
+            os.replace(tmp_path, path)
+            self._bytes += len(data) - previous
+            if time.monotonic() - self._synced_at > SIZE_RESYNC_INTERVAL:
+                self._bytes = self._disk_bytes()
+                self._synced_at = time.monotonic()
+            if self._bytes > self.max_bytes:
+                self._evict()
+
+    def _evict(self):
+        # Drop least recently used files until we are 10% under budget
+        target = self.max_bytes * 0.9
+        entries = []
+        for path in self._files():
+            try:
+                stat = os.stat(path)
+            except FileNotFoundError:
+                continue
+            entries.append((stat.st_mtime, stat.st_size, path))
+        entries.sort()
+        self._bytes = sum(size for _, size, _ in entries)
+        self._synced_at = time.monotonic()
+        for _, size, path in entries:
+            if self._bytes <= target:
+                break
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                continue
+            self._bytes -= size
+            self.evictions += 1
+
+    def stats(self) -> Dict[str, Any]:
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+            "evictions": self.evictions,
+            "bytes": self._bytes,
+            "max_bytes": self.max_bytes
+        }
+
+# Global instance
+_render_cache = None
+
+def get_render_cache() -> PageRenderCache:
+    global _render_cache
+    if _render_cache is None:
+        from app.core.config import get_settings
+        settings = get_settings()
+        _render_cache = PageRenderCache(settings.RENDER_CACHE_DIR, settings.RENDER_CACHE_MAX_BYTES)
+    return _render_cache
+
+def render_pages(file_content: bytes, content_type: str, page_indexes: List[int]) -> Tuple[int, List[Tuple[int, bytes]]]:
+    """
+    Render pages at the default viewer zoom, run in the process pool.
+    Returns (page_count, [(page_idx, png)]) for the indexes that exist.
+    """
+    from app.core.document_cache import open_as_pdf
+    from app.core.highlighter import highlighter
+
+    doc = open_as_pdf(file_content, content_type)
+    try:
+        return len(doc), [(idx, highlighter.render_page(doc, idx)) for idx in page_indexes if idx < len(doc)]
+    finally:
+        doc.close()
+
+async def prerender_form(form_id: str, file_content: bytes, content_type: str):
+    """
+    Render every page at the default viewer zoom so the first view is served from disk.
+    Pool workers only render; images are written through this process's cache,
+    which is the one keeping count of its size.
+    """
+    from app.core.highlighter import DEFAULT_ZOOM
+    from app.core.pools import run_io, run_process
+
+    cache = get_render_cache()
+
+    def key(page_idx: int) -> str:
+        return cache.key(form_id, page_variant(page_idx + 1, zoom=DEFAULT_ZOOM), "png")
+
+    start = 0
+    page_count = None
+    while page_count is None or start < page_count:
+        batch = range(start, start + PRERENDER_BATCH)
+        missing = [idx for idx in batch if not os.path.exists(cache._path(key(idx)))]
+        start = batch.stop
+        if page_count is not None and not missing:
+            continue
+        # The first batch also tells us how many pages there are
+        page_count, images = await run_process(render_pages, file_content, content_type, missing)
+        for page_idx, image in images:
+            await run_io(cache.put, key(page_idx), image)
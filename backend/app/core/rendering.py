@@ -0,0 +1,66 @@
+import os
+
+class RenderProfile:
+    """
+    How a PDF page is rasterized and encoded, for OCR payloads and page previews.
+    """
+    def __init__(self, dpi: int = 144, grayscale: bool = False, image_format: str = "png",
+                 quality: int = 85, max_dimension: int = 0):
+        self.dpi = dpi
+        self.grayscale = grayscale
+        self.image_format = image_format.lower()
+        self.quality = quality
+        # Longest side in pixels (0 = no cap); keeps large-format pages from blowing up the payload
+        self.max_dimension = max_dimension
+
+    @classmethod
+    def from_env(cls) -> "RenderProfile":
+        """
+        OCR payload profile from OCR_RENDER_* environment variables.
+        """
+        return cls(
+            dpi=int(os.environ.get("OCR_RENDER_DPI", "144")),
+            grayscale=os.environ.get("OCR_RENDER_GRAYSCALE", "false").lower() in ("1", "true", "yes"),
+            image_format=os.environ.get("OCR_RENDER_FORMAT", "png"),
+            quality=int(os.environ.get("OCR_RENDER_QUALITY", "85")),
+            max_dimension=int(os.environ.get("OCR_RENDER_MAX_DIM", "0"))
+        )
+
+    def zoom_for(self, page) -> float:
+        zoom = self.dpi / 72
+        if self.max_dimension:
+            longest_side = max(page.rect.width, page.rect.height) or 1
+            zoom = min(zoom, self.max_dimension / longest_side)
+        return zoom
+
+    def render(self, page):
+        """
+        Rasterize a page. Returns (image_bytes, mime_type).
+        """
+        import fitz # PyMuPDF
+        zoom = self.zoom_for(page)
+        colorspace = fitz.csGRAY if self.grayscale else fitz.csRGB
+        pix = page.get_pixmap(matrix=fitz.Matrix(zoom, zoom), colorspace=colorspace, alpha=False)
+        return self.encode(pix)
+
+    def encode(self, pix):
+        """
+        Encode a pixmap in this profile's format. Returns (image_bytes, mime_type).
+        """
+        if self.image_format in ("jpg", "jpeg"):
+            return pix.tobytes("jpg", jpg_quality=self.quality), "image/jpeg"
+
+        if self.image_format == "webp":
+            try:
+                from PIL import Image
+                import io
+                mode = "L" if pix.n == 1 else "RGB"
+                img = Image.frombytes(mode, (pix.width, pix.height), pix.samples)
+                buffer = io.BytesIO()
+                img.save(buffer, format="WEBP", quality=self.quality)
+                return buffer.getvalue(), "image/webp"
+            except ImportError:
+                print("WARNING: Pillow is not installed, falling back to JPEG for WebP render profile.")
+                return pix.tobytes("jpg", jpg_quality=self.quality), "image/jpeg"
+
+        return pix.tobytes("png"), "image/png"
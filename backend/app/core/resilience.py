@@ -0,0 +1,243 @@
+import asyncio
+import hashlib
+import httpx
+import os
+import random
+import time
+from email.utils import parsedate_to_datetime
+from typing import Any, Awaitable, Callable, Dict, Optional
+
+# Status codes worth retrying: throttling and transient upstream failures
+RETRYABLE_STATUS_CODES = {408, 429, 500, 502, 503, 504}
+
+class CircuitOpenError(Exception):
+    """
+    Raised when an upstream's circuit breaker is open and calls are being shed.
+    """
+    def __init__(self, name: str, retry_in: float):
+        super().__init__(f"Circuit for {name} is open, retry in {retry_in:.1f}s")
+        self.name = name
+        self.retry_in = retry_in
+
+class TokenBucket:
+    """
+    Async token bucket. `rate` tokens are added per second up to `capacity`.
+    """
+    def __init__(self, rate: float, capacity: float):
+        self.rate = rate
+        self.capacity = capacity
+        self._tokens = capacity
+        self._updated = time.monotonic()
+        self._lock = asyncio.Lock()
+
+    def _refill(self):
+        now = time.monotonic()
+        self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    async def acquire(self) -> float:
+        """
+        Wait for a token. Returns the time spent waiting.
+        """
+        if self.rate <= 0:
+            return 0.0
+        waited = 0.0
+        async with self._lock:
+            while True:
+                self._refill()
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return waited
+                delay = (1 - self._tokens) / self.rate
+                waited += delay
+                await asyncio.sleep(delay)
+
+class CircuitBreaker:
+    """
+    Classic closed -> open -> half-open breaker.
+    Opens after `failure_threshold` consecutive failures and lets a single
+    probe through once `reset_timeout` seconds have passed.
+    """
+    def __init__(self, failure_threshold: int, reset_timeout: float):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.state = "closed"
+        self._failures = 0
+        self._opened_at = 0.0
+        self._probe_in_flight = False
+
+    def before_call(self, name: str):
+        if self.state == "open":
+            elapsed = time.monotonic() - self._opened_at
+            if elapsed < self.reset_timeout:
+                raise CircuitOpenError(name, self.reset_timeout - elapsed)
+            self.state = "half_open"
+        if self.state == "half_open":
+            if self._probe_in_flight:
+                raise CircuitOpenError(name, self.reset_timeout)
+            self._probe_in_flight = True
+
+    def record_success(self):
+        self.state = "closed"
+        self._failures = 0
+        self._probe_in_flight = False
+
+    def release_probe(self):
+        """
+        The call was cancelled before a verdict: free the probe slot so the next call can probe.
+        """
+        self._probe_in_flight = False
+
+    def record_failure(self):
+        self._probe_in_flight = False
+        self._failures += 1
+        if self.state == "half_open" or self._failures >= self.failure_threshold:
+            self.state = "open"
+            self._opened_at = time.monotonic()
+
+def _status_code(exc: Exception) -> Optional[int]:
+    """
+    Best-effort HTTP status extraction from httpx and google-api-core errors.
+    """
+    response = getattr(exc, "response", None)
+    status = getattr(response, "status_code", None)
+    if status is None:
+        status = getattr(exc, "code", None)
+    return status if isinstance(status, int) else None
+
+def _retry_after(exc: Exception) -> Optional[float]:
+    """
+    Seconds to wait according to the upstream's Retry-After header, if any.
+    """
+    response = getattr(exc, "response", None)
+    headers = getattr(response, "headers", None)
+    if not headers:
+        return None
+    value = headers.get("Retry-After")
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+    except (TypeError, ValueError):
+        return None
+
+def _is_retryable(exc: Exception) -> bool:
+    status = _status_code(exc)
+    if status is not None:
+        return status in RETRYABLE_STATUS_CODES
+    # No status: network errors and timeouts are transient
+    return isinstance(exc, (httpx.TransportError, asyncio.TimeoutError, ConnectionError))
+
+class Upstream:
+    """
+    Resilience wrapper for one upstream API key: rate limit, retries with
+    exponential backoff + jitter (honouring Retry-After), circuit breaker and metrics.
+    """
+    def __init__(self, name: str, rate: float = 0.0, burst: float = 1.0, max_retries: int = 3,
+                 base_delay: float = 0.5, max_delay: float = 30.0,
+                 failure_threshold: int = 5, reset_timeout: float = 30.0):
+        self.name = name
+        self.bucket = TokenBucket(rate, max(burst, 1.0))
+        self.breaker = CircuitBreaker(failure_threshold, reset_timeout)
+        self.max_retries = max_retries
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.metrics = {
+            "calls": 0,
+            "successes": 0,
+            "failures": 0,
+            "retries": 0,
+            "throttled": 0,
+            "circuit_rejections": 0,
+            "rate_limit_wait_seconds": 0.0
+        }
+
+    @classmethod
+    def from_env(cls, name: str, prefix: str) -> "Upstream":
+        """
+        Build an upstream from `<PREFIX>_*` environment variables.
+        """
+        env = lambda key, default: os.environ.get(f"{prefix}_{key}", default)
+        return cls(
+            name,
+            rate=float(env("RATE_LIMIT_RPS", "0")),
+            burst=float(env("RATE_LIMIT_BURST", "5")),
+            max_retries=int(env("MAX_RETRIES", "3")),
+            base_delay=float(env("BACKOFF_BASE", "0.5")),
+            max_delay=float(env("BACKOFF_MAX", "30")),
+            failure_threshold=int(env("BREAKER_THRESHOLD", "5")),
+            reset_timeout=float(env("BREAKER_RESET", "30"))
+        )
+
+    def _backoff(self, attempt: int, exc: Exception) -> float:
+        retry_after = _retry_after(exc)
+        if retry_after is not None:
+            return min(retry_after, self.max_delay)
+        # Full jitter
+        return random.uniform(0, min(self.max_delay, self.base_delay * (2 ** attempt)))
+
+    async def call(self, fn: Callable[[], Awaitable[Any]]) -> Any:
+        """
+        Run `fn` (a zero-argument coroutine factory) under this upstream's policies.
+        """
+        attempt = 0
+        while True:
+            try:
+                self.breaker.before_call(self.name)
+            except CircuitOpenError:
+                self.metrics["circuit_rejections"] += 1
+                raise
+
+            try:
+                self.metrics["rate_limit_wait_seconds"] += await self.bucket.acquire()
+                self.metrics["calls"] += 1
+                result = await fn()
+            except BaseException as e:
+                if not isinstance(e, Exception):
+                    # Cancelled (client went away, timeout): says nothing about upstream health,
+                    # but a half-open probe must not stay "in flight" forever
+                    self.breaker.release_probe()
+                    raise
+                retryable = _is_retryable(e)
+                if _status_code(e) == 429:
+                    self.metrics["throttled"] += 1
+                if retryable:
+                    self.breaker.record_failure()
+                else:
+                    # Client errors say nothing about upstream health
+                    self.breaker.record_success()
+
+                if not retryable or attempt >= self.max_retries:
+                    self.metrics["failures"] += 1
+                    raise
+
+                delay = self._backoff(attempt, e)
+                attempt += 1
+                self.metrics["retries"] += 1
+                print(f"WARNING: {self.name} call failed ({e}), retry {attempt}/{self.max_retries} in {delay:.2f}s")
+                await asyncio.sleep(delay)
+                continue
+
+            self.breaker.record_success()
+            self.metrics["successes"] += 1
+            return result
+
+    def snapshot(self) -> Dict[str, Any]:
+        return {**self.metrics, "circuit": self.breaker.state}
+
+# One Upstream per (service, API key) so separate keys get separate rate limits
+_upstreams: Dict[str, Upstream] = {}
+
+def get_upstream(name: str, api_key: Optional[str], prefix: str) -> Upstream:
+    key_id = hashlib.sha256((api_key or "").encode("utf-8")).hexdigest()[:8]
+    registry_key = f"{name}:{key_id}"
+    if registry_key not in _upstreams:
+        _upstreams[registry_key] = Upstream.from_env(registry_key, prefix)
+    return _upstreams[registry_key]
+
+def upstream_metrics() -> Dict[str, Dict[str, Any]]:
+    return {name: upstream.snapshot() for name, upstream in _upstreams.items()}
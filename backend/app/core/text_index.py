@@ -0,0 +1,265 @@
+import bisect
+import json
+import string
+from typing import Dict, List
+import fitz
+
+INDEX_VERSION = 1
+
+_PUNCTUATION = string.punctuation + "“”‘’«»…–—"
+
+def normalize_token(text: str) -> str:
+    """
+    Lowercase and strip surrounding punctuation ('Name:' -> 'name').
+    """
+    return text.strip(_PUNCTUATION).lower()
+
+def tokenize(query: str) -> List[str]:
+    return [t for t in (normalize_token(w) for w in query.split()) if t]
+
+def bigrams(token: str) -> set:
+    padded = f"${token}$"
+    return {padded[i:i + 2] for i in range(len(padded) - 1)}
+
+def bounded_levenshtein(a: str, b: str, max_dist: int) -> int:
+    """
+    Edit distance (adjacent transpositions count as one edit), giving up and
+    returning max_dist + 1 as soon as the result must exceed max_dist.
+    """
+    if abs(len(a) - len(b)) > max_dist:
+        return max_dist + 1
+    if len(a) > len(b):
+        a, b = b, a
+    before = None
+    previous = list(range(len(b) + 1))
+    for i, ca in enumerate(a, 1):
+        current = [i] + [0] * len(b)
+        row_min = i
+        for j, cb in enumerate(b, 1):
+            current[j] = min(
+                previous[j] + 1,
+                current[j - 1] + 1,
+                previous[j - 1] + (ca != cb)
+            )
+            if before is not None and j > 1 and ca == b[j - 2] and a[i - 2] == cb:
+                current[j] = min(current[j], before[j - 2] + 1)
+            row_min = min(row_min, current[j])
+        if row_min > max_dist:
+            return max_dist + 1
+        before, previous = previous, current
+    return previous[-1]
+
+class TextIndex:
+    """
+    Word-level positional index of a document.
+    Built once from page.get_text("words"); every word's rect is stored already
+    normalized (0..1) in rotated page space, i.e. matching the rendered page image.
+    """
+    def __init__(self, words: List[list], page_count: int):
+        # Each word: [page_idx, x0, y0, x1, y1, text, line_key]
+        self.words = words
+        self.page_count = page_count
+        self._positions: Dict[str, List[int]] = {}
+        for pos, word in enumerate(words):
+            token = normalize_token(word[5])
+            if token:
+                self._positions.setdefault(token, []).append(pos)
+        self._sorted_tokens = sorted(self._positions)
+        # bigram -> tokens and length -> tokens, built on the first fuzzy query
+        self._bigrams = None
+        self._lengths = None
+
+    @classmethod
+    def from_document(cls, doc: fitz.Document) -> "TextIndex":
+        words = []
+        for page_idx, page in enumerate(doc):
+            # Rotation math done once per page: words come back in unrotated space,
+            # the rendered image is the rotated cropbox
+            mat = page.rotation_matrix
+            rot_box = fitz.Rect(page.cropbox * mat)
+            w = rot_box.width or 1
+            h = rot_box.height or 1
+
+            for x0, y0, x1, y1, text, block_no, line_no, _ in page.get_text("words", sort=True):
+                r = fitz.Rect(x0, y0, x1, y1) * mat
+                nx0 = (r.x0 - rot_box.x0) / w
+                ny0 = (r.y0 - rot_box.y0) / h
+                nx1 = (r.x1 - rot_box.x0) / w
+                ny1 = (r.y1 - rot_box.y0) / h
+                # Rotation might flip them
+                if nx0 > nx1: nx0, nx1 = nx1, nx0
+                if ny0 > ny1: ny0, ny1 = ny1, ny0
+                words.append([
+                    page_idx,
+                    round(nx0, 5), round(ny0, 5), round(nx1, 5), round(ny1, 5),
+                    text,
+                    block_no * 10000 + line_no
+                ])
+        return cls(words, len(doc))
+
+    def to_json(self) -> bytes:
+        return json.dumps({
+            "version": INDEX_VERSION,
+            "page_count": self.page_count,
+            "words": self.words
+        }, separators=(",", ":")).encode("utf-8")
+
+    @classmethod
+    def from_json(cls, data: bytes) -> "TextIndex":
+        payload = json.loads(data)
+        if payload.get("version") != INDEX_VERSION:
+            raise ValueError("Unsupported text index version")
+        return cls(payload["words"], payload["page_count"])
+
+    def _candidates(self, token: str, prefix: bool) -> List[int]:
+        if not prefix:
+            return self._positions.get(token, [])
+        positions = []
+        start = bisect.bisect_left(self._sorted_tokens, token)
+        for candidate in self._sorted_tokens[start:]:
+            if not candidate.startswith(token):
+                break
+            positions.extend(self._positions[candidate])
+        return sorted(positions)
+
+    def find_phrase(self, query: str, mode: str = "phrase", pages=None) -> List[List[int]]:
+        """
+        Return word-position runs matching the query.
+        mode: 'phrase' (case-insensitive), 'exact' (case-sensitive) or
+        'prefix' (last query word matches as a prefix, for type-ahead).
+        """
+        tokens = tokenize(query)
+        if not tokens:
+            return []
+        raw = [w.strip(_PUNCTUATION) for w in query.split() if normalize_token(w)]
+
+        matches = []
+        first_prefix = mode == "prefix" and len(tokens) == 1
+        for start in self._candidates(tokens[0], first_prefix):
+            page_idx = self.words[start][0]
+            if pages is not None and page_idx not in pages:
+                continue
+            end = start + len(tokens)
+            if end > len(self.words):
+                continue
+            run = list(range(start, end))
+            ok = True
+            for offset, pos in enumerate(run):
+                word = self.words[pos]
+                if word[0] != page_idx:
+                    ok = False
+                    break
+                token = normalize_token(word[5])
+                is_last = offset == len(tokens) - 1
+                if mode == "prefix" and is_last:
+                    ok = token.startswith(tokens[offset])
+                elif mode == "exact":
+                    ok = word[5].strip(_PUNCTUATION) == raw[offset]
+                else:
+                    ok = token == tokens[offset]
+                if not ok:
+                    break
+            if ok:
+                matches.append(run)
+        return matches
+
+    def rects_for(self, run: List[int]) -> List[dict]:
+        """
+        Merge a run of words into one rect per text line.
+        """
+        results = []
+        current_line = None
+        for pos in run:
+            page_idx, x0, y0, x1, y1, _, line_key = self.words[pos]
+            if current_line == (page_idx, line_key):
+                rect = results[-1]["rect"]
+                rect[0] = min(rect[0], x0)
+                rect[1] = min(rect[1], y0)
+                rect[2] = max(rect[2], x1)
+                rect[3] = max(rect[3], y1)
+            else:
+                results.append({"page": page_idx + 1, "rect": [x0, y0, x1, y1]})
+                current_line = (page_idx, line_key)
+        return results
+
+    def _fuzzy_tokens(self, token: str, min_similarity: float) -> Dict[str, float]:
+        """
+        Vocabulary tokens similar to `token`: bigram candidates, then bounded edit distance.
+        Returns { vocab_token: similarity (0..1) }.
+        """
+        if self._bigrams is None:
+            self._bigrams = {}
+            self._lengths = {}
+            for vocab in self._positions:
+                for gram in bigrams(vocab):
+                    self._bigrams.setdefault(gram, []).append(vocab)
+                self._lengths.setdefault(len(vocab), []).append(vocab)
+
+        # Allow roughly one edit per three characters
+        max_dist = max(1, len(token) // 3)
+
+        # An edit destroys at most 2 of the query's bigrams and a transposition 3,
+        # so anything within max_dist still shares this many of them
+        query_grams = bigrams(token)
+        min_shared = len(query_grams) - 3 * max_dist
+        if min_shared > 0:
+            shared = {}
+            for gram in query_grams:
+                for vocab in self._bigrams.get(gram, ()):
+                    shared[vocab] = shared.get(vocab, 0) + 1
+            candidates = [vocab for vocab, count in shared.items() if count >= min_shared]
+        else:
+            # Too short (or too repetitive) for the bound to say anything ('0f' for 'of'):
+            # compare every word of a reachable length
+            candidates = [
+                vocab
+                for length in range(len(token) - max_dist, len(token) + max_dist + 1)
+                for vocab in self._lengths.get(length, ())
+            ]
+
+        similar = {}
+        for vocab in candidates:
+            dist = bounded_levenshtein(token, vocab, max_dist)
+            if dist > max_dist:
+                continue
+            similarity = 1 - dist / max(len(token), len(vocab))
+            if similarity >= min_similarity:
+                similar[vocab] = similarity
+        return similar
+
+    def find_fuzzy(self, query: str, min_score: float = 0.7, limit: int = 50) -> List[tuple]:
+        """
+        OCR-tolerant phrase search. Returns [(score, run)] best first, where a run
+        is the word positions of the match and score is the mean word similarity.
+        """
+        tokens = tokenize(query)
+        if not tokens:
+            return []
+
+        per_token = [self._fuzzy_tokens(token, min_score / 2) for token in tokens]
+
+        # Any matching query word anchors a candidate phrase start
+        starts = set()
+        for offset, similar in enumerate(per_token):
+            for vocab in similar:
+                for pos in self._positions[vocab]:
+                    start = pos - offset
+                    if 0 <= start and start + len(tokens) <= len(self.words):
+                        starts.add(start)
+
+        scored = []
+        for start in starts:
+            page_idx = self.words[start][0]
+            total = 0.0
+            for offset, similar in enumerate(per_token):
+                word = self.words[start + offset]
+                if word[0] != page_idx:
+                    total = 0.0
+                    break
+                total += similar.get(normalize_token(word[5]), 0.0)
+            score = total / len(tokens)
+            if score >= min_score:
+                scored.append((round(score, 3), list(range(start, start + len(tokens)))))
+
+        scored.sort(key=lambda item: (-item[0], item[1][0]))
+        return scored[:limit]
@@ -12,10 +12,30 @@ create table if not exists forms (
     status text default 'uploaded', -- uploaded, processing, ready, error
     ocr_data jsonb, -- Stores Doctr/Gemini output
     form_schema jsonb, -- Stores extracted fields and questions
+    content_hash text, -- SHA-256 of the uploaded file, used to dedupe identical uploads
+    progress jsonb, -- {pages_done, pages_total, eta_seconds} while processing
+    field_placements jsonb, -- {version, template, fields: [{field_id, page_idx, rect, widget, method, xrefs}]}
     created_at timestamp with time zone default timezone('utc'::text, now()) not null,
     updated_at timestamp with time zone default timezone('utc'::text, now()) not null
 );
 
+-- Existing deployments: add the dedupe column and its lookup index
+alter table forms add column if not exists content_hash text;
+create index if not exists forms_content_hash_idx on forms (content_hash);
+alter table forms add column if not exists progress jsonb;
+-- Where each schema field goes in the PDF (widget name or rect) and the compiled template, computed after analysis
+alter table forms add column if not exists field_placements jsonb;
+
+-- Per-page OCR results, written as each page finishes (partial results + resume)
+create table if not exists form_pages (
+    form_id uuid references forms(id) on delete cascade not null,
+    page_number integer not null, -- 1-based
+    text text not null,
+    source text, -- ocr, text_layer
+    created_at timestamp with time zone default timezone('utc'::text, now()) not null,
+    primary key (form_id, page_number)
+);
+
 -- Sessions table (for chat instances)
 create table if not exists sessions (
     id uuid primary key default uuid_generate_v4(),
@@ -2,6 +2,7 @@ from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
 from dotenv import load_dotenv
 import os
+import asyncio
 from app.api.v1.endpoints import forms, chat, pdf
 
 load_dotenv()
@@ -21,12 +22,34 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["ETag"],
 )
 
 app.include_router(forms.router, prefix="/api/v1/forms", tags=["forms"])
 app.include_router(chat.router, prefix="/api/v1/chat", tags=["chat"])
 app.include_router(pdf.router, prefix="/api/v1/pdf", tags=["pdf"])
 
+embedded_worker = None
+
+@app.on_event("startup")
+async def startup():
+    global embedded_worker
+    from app.core.config import get_settings
+    if get_settings().RUN_EMBEDDED_WORKER:
+        from app.worker import Worker
+        embedded_worker = Worker()
+        asyncio.create_task(embedded_worker.run())
+
+@app.on_event("shutdown")
+async def shutdown():
+    if embedded_worker is not None:
+        embedded_worker.stop()
+    # Close the shared keep-alive OCR client
+    from app.core.ocr import get_ocr_service
+    await get_ocr_service().aclose()
+    from app.core.pools import shutdown_pools
+    shutdown_pools()
+
 @app.get("/")
 async def root():
     return {"message": "Welcome to PDF Form Assistant API", "status": "running"}
@@ -34,3 +57,20 @@ async def root():
 @app.get("/health")
 async def health_check():
     return {"status": "ok"}
+
+@app.get("/health/upstreams")
+async def upstream_health():
+    from app.core.resilience import upstream_metrics
+    return upstream_metrics()
+
+@app.get("/health/caches")
+async def cache_health():
+    from app.core.document_cache import get_document_cache
+    from app.core.render_cache import get_render_cache
+    from app.core.ocr import get_ocr_service
+    ocr_cache = get_ocr_service().cache
+    return {
+        "documents": get_document_cache().stats(),
+        "pages": get_render_cache().stats(),
+        "ocr": ocr_cache.stats() if ocr_cache else None
+    }
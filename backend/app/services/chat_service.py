@@ -1,5 +1,6 @@
 from app.db.supabase import supabase
 from app.core.llm.gemini_client import gemini_client
+from app.core.pools import run_io
 import uuid
 from typing import Dict, Any, List, Optional
 
@@ -12,7 +13,7 @@ class ChatService:
         Initialize a new chat session for a form.
         """
         # Fetch form schema
-        form = supabase.table("forms").select("form_schema").eq("id", form_id).single().execute()
+        form = await run_io(supabase.table("forms").select("form_schema").eq("id", form_id).single().execute)
         if not form.data:
             raise ValueError("Form not found or has no schema")
             
@@ -30,7 +31,7 @@ class ChatService:
             "form_data": {}
         }
         
-        res = supabase.table("sessions").insert(session_data).execute()
+        res = await run_io(supabase.table("sessions").insert(session_data).execute)
         session = res.data[0]
         
         # Initial greeting is the first question
@@ -43,24 +44,24 @@ class ChatService:
         }
 
     async def _save_message(self, session_id: str, role: str, content: str):
-        supabase.table("messages").insert({
+        await run_io(supabase.table("messages").insert({
             "session_id": session_id,
             "role": role,
             "content": content
-        }).execute()
+        }).execute)
 
     async def process_message(self, session_id: str, user_message: str) -> Dict[str, Any]:
         """
         Process user input, validate it, update state, and return next response.
         """
         # Get session state
-        session_res = supabase.table("sessions").select("*").eq("id", session_id).single().execute()
+        session_res = await run_io(supabase.table("sessions").select("*").eq("id", session_id).single().execute)
         if not session_res.data:
             raise ValueError("Session not found")
         session = session_res.data
         
         # Get form schema
-        form_res = supabase.table("forms").select("form_schema").eq("id", session['form_id']).single().execute()
+        form_res = await run_io(supabase.table("forms").select("form_schema").eq("id", session['form_id']).single().execute)
         schema = form_res.data['form_schema']
         fields = {f['id']: f for f in schema['fields']}
         field_ids = [f['id'] for f in schema['fields']]
@@ -119,11 +120,11 @@ class ChatService:
                 next_status = "completed"
                 
             # Update Session
-            supabase.table("sessions").update({
+            await run_io(supabase.table("sessions").update({
                 "form_data": current_data,
                 "current_field_id": next_field_id,
                 "status": next_status
-            }).eq("id", session_id).execute()
+            }).eq("id", session_id).execute)
             
             # Save Assistant Message
             await self._save_message(session_id, "assistant", next_question)
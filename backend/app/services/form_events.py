@@ -0,0 +1,33 @@
+import asyncio
+from typing import Any, Dict, Set
+
+class FormEventBroker:
+    """
+    In-process pub/sub for form status changes.
+    Processing code publishes small deltas; SSE handlers subscribe per form.
+    """
+    def __init__(self, max_queue_size: int = 100):
+        self.max_queue_size = max_queue_size
+        self._subscribers: Dict[str, Set[asyncio.Queue]] = {}
+
+    def subscribe(self, form_id: str) -> asyncio.Queue:
+        queue = asyncio.Queue(maxsize=self.max_queue_size)
+        self._subscribers.setdefault(form_id, set()).add(queue)
+        return queue
+
+    def unsubscribe(self, form_id: str, queue: asyncio.Queue):
+        subscribers = self._subscribers.get(form_id)
+        if subscribers is None:
+            return
+        subscribers.discard(queue)
+        if not subscribers:
+            del self._subscribers[form_id]
+
+    def publish(self, form_id: str, event: Dict[str, Any]):
+        for queue in self._subscribers.get(form_id, ()):
+            if queue.full():
+                # Slow consumer: drop the oldest delta, the latest state matters most
+                queue.get_nowait()
+            queue.put_nowait(event)
+
+form_events = FormEventBroker()
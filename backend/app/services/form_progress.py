@@ -0,0 +1,115 @@
+import asyncio
+import time
+from typing import Dict, Optional
+from app.core.pools import run_io
+from app.services.form_events import form_events
+
+# Finished pages and forms.progress are written at most this often (seconds);
+# pages finishing in between go out in one batched upsert
+FLUSH_INTERVAL = 1.0
+
+class FormProgress:
+    """
+    Tracks per-page OCR progress for one form and persists it as pages finish.
+    Completed pages are upserted into `form_pages` so a crashed run can resume,
+    and `forms.progress` carries pages done/total and an ETA for polling clients.
+    Watchers get an event per page; database writes are batched in the background
+    (see FLUSH_INTERVAL), so call `flush()` once the run ends.
+    """
+    def __init__(self, form_id: str):
+        self.form_id = form_id
+        self.pages_total = 0
+        self.pages_done = 0
+        self._resumed = 0
+        self._started_at = time.monotonic()
+        self._pending = []
+        self._flusher = None
+        self._flush_now = asyncio.Event()
+
+    async def load_completed_pages(self) -> Dict[int, str]:
+        """
+        Pages finished by a previous (interrupted) run, keyed by 0-based index.
+        """
+        from app.db.supabase import supabase
+        res = await run_io(
+            supabase.table("form_pages").select("page_number, text").eq("form_id", self.form_id).execute
+        )
+        completed = {row['page_number'] - 1: row['text'] for row in (res.data or [])}
+        self._resumed = len(completed)
+        self.pages_done = len(completed)
+        return completed
+
+    def eta_seconds(self) -> Optional[float]:
+        done_this_run = self.pages_done - self._resumed
+        if done_this_run <= 0 or not self.pages_total:
+            return None
+        per_page = (time.monotonic() - self._started_at) / done_this_run
+        return round(per_page * (self.pages_total - self.pages_done), 1)
+
+    def snapshot(self) -> Dict:
+        return {
+            "pages_done": self.pages_done,
+            "pages_total": self.pages_total,
+            "eta_seconds": self.eta_seconds()
+        }
+
+    async def _save_progress(self):
+        from app.db.supabase import supabase
+        form_events.publish(self.form_id, {"status": "processing", "progress": self.snapshot()})
+        await run_io(
+            supabase.table("forms").update({"progress": self.snapshot()}).eq("id", self.form_id).execute
+        )
+
+    async def start(self, pages_total: int):
+        self.pages_total = pages_total
+        self._started_at = time.monotonic()
+        try:
+            await self._save_progress()
+        except Exception as e:
+            print(f"WARNING: Could not save progress for form {self.form_id}: {e}")
+
+    async def page_done(self, page_idx: int, text: str, source: str):
+        self.pages_done += 1
+        self._pending.append({
+            "form_id": self.form_id,
+            "page_number": page_idx + 1,
+            "text": text,
+            "source": source
+        })
+        form_events.publish(self.form_id, {"status": "processing", "progress": self.snapshot()})
+        if self._flusher is None or self._flusher.done():
+            self._flusher = asyncio.create_task(self._flush_later())
+
+    async def _flush_later(self):
+        try:
+            await asyncio.wait_for(self._flush_now.wait(), FLUSH_INTERVAL)
+        except asyncio.TimeoutError:
+            pass
+        await self._write_pending()
+
+    async def _write_pending(self):
+        from app.db.supabase import supabase
+        rows, self._pending = self._pending, []
+        if not rows:
+            return
+        try:
+            await run_io(
+                supabase.table("form_pages").upsert(rows, on_conflict="form_id,page_number").execute
+            )
+            await run_io(
+                supabase.table("forms").update({"progress": self.snapshot()}).eq("id", self.form_id).execute
+            )
+        except Exception as e:
+            # Progress is best-effort, never fail the OCR run because of it
+            pages = ", ".join(str(row["page_number"]) for row in rows)
+            print(f"WARNING: Could not save pages {pages} for form {self.form_id}: {e}")
+
+    async def flush(self):
+        """
+        Write every finished page that is still buffered.
+        """
+        self._flush_now.set()
+        if self._flusher is not None:
+            await self._flusher
+        self._flush_now.clear()
+        await self._write_pending()
@@ -0,0 +1,176 @@
+import json
+import os
+import sqlite3
+import threading
+import time
+import uuid
+from typing import Any, Dict, Optional
+from app.core.config import get_settings
+
+class Job:
+    def __init__(self, id: str, kind: str, payload: Dict[str, Any], priority: int, attempts: int, max_attempts: int,
+                 exhausted: bool = False, last_error: Optional[str] = None):
+        self.id = id
+        self.kind = kind
+        self.payload = payload
+        self.priority = priority
+        self.attempts = attempts
+        self.max_attempts = max_attempts
+        # Its last attempt's lease expired (worker killed mid-job): don't run it again,
+        # only give up on it, then nack
+        self.exhausted = exhausted
+        self.last_error = last_error
+
+class JobQueue:
+    """
+    Interface for durable job queues.
+    A dequeued job is leased for `visibility_timeout` seconds; if it is not acked
+    (or its lease extended) in time, it becomes visible again for another worker.
+    If that was its last attempt it is handed out once more with `exhausted` set,
+    for the worker to run its failure handling and nack it.
+    """
+    def enqueue(self, kind: str, payload: Dict[str, Any], priority: int = 0, max_attempts: Optional[int] = None) -> str:
+        raise NotImplementedError
+
+    def dequeue(self, visibility_timeout: float) -> Optional[Job]:
+        raise NotImplementedError
+
+    def extend(self, job_id: str, visibility_timeout: float):
+        raise NotImplementedError
+
+    def ack(self, job_id: str):
+        raise NotImplementedError
+
+    def nack(self, job_id: str, error: str, retry_delay: float = 0.0):
+        raise NotImplementedError
+
+class SQLiteJobQueue(JobQueue):
+    """
+    Default backend: a local SQLite file shared by the API and worker processes on one host.
+    """
+    def __init__(self, path: str, default_max_attempts: int = 3):
+        self.path = path
+        self.default_max_attempts = default_max_attempts
+        self._lock = threading.Lock()
+
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+        # Autocommit mode; transactions are opened explicitly where needed
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None, timeout=30)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            """
+            create table if not exists jobs (
+                id text primary key,
+                kind text not null,
+                payload text not null,
+                priority integer not null default 0,
+                status text not null default 'queued', -- queued, running, done, failed
+                attempts integer not null default 0,
+                max_attempts integer not null,
+                visible_at real not null,
+                last_error text,
+                created_at real not null,
+                updated_at real not null
+            )
+            """
+        )
+        self._conn.execute("create index if not exists jobs_ready on jobs(status, visible_at, priority)")
+
+    def enqueue(self, kind: str, payload: Dict[str, Any], priority: int = 0, max_attempts: Optional[int] = None) -> str:
+        job_id = str(uuid.uuid4())
+        now = time.time()
+        with self._lock:
+            self._conn.execute(
+                """
+                insert into jobs (id, kind, payload, priority, status, attempts, max_attempts, visible_at, created_at, updated_at)
+                values (?, ?, ?, ?, 'queued', 0, ?, ?, ?, ?)
+                """,
+                (job_id, kind, json.dumps(payload), priority, max_attempts or self.default_max_attempts, now, now, now)
+            )
+        return job_id
+
+    def dequeue(self, visibility_timeout: float) -> Optional[Job]:
+        now = time.time()
+        with self._lock:
+            # BEGIN IMMEDIATE takes the write lock so two workers can't lease the same job
+            self._conn.execute("begin immediate")
+            try:
+                # 'running' rows whose lease expired belong to a crashed/stalled worker
+                row = self._conn.execute(
+                    """
+                    select id, kind, payload, priority, attempts, max_attempts, last_error from jobs
+                    where status in ('queued', 'running') and visible_at <= ?
+                    order by priority desc, created_at asc
+                    limit 1
+                    """,
+                    (now,)
+                ).fetchone()
+                if row is None:
+                    self._conn.execute("commit")
+                    return None
+
+                job_id, kind, payload, priority, attempts, max_attempts, last_error = row
+                if attempts >= max_attempts:
+                    # Lease the job once more so a worker runs its failure handling
+                    last_error = last_error or "lease expired"
+                    self._conn.execute(
+                        "update jobs set status = 'running', visible_at = ?, last_error = ?, updated_at = ? where id = ?",
+                        (now + visibility_timeout, last_error, now, job_id)
+                    )
+                    self._conn.execute("commit")
+                    return Job(job_id, kind, json.loads(payload), priority, attempts, max_attempts,
+                               exhausted=True, last_error=last_error)
+
+                self._conn.execute(
+                    "update jobs set status = 'running', attempts = attempts + 1, visible_at = ?, updated_at = ? where id = ?",
+                    (now + visibility_timeout, now, job_id)
+                )
+                self._conn.execute("commit")
+                return Job(job_id, kind, json.loads(payload), priority, attempts + 1, max_attempts)
+            except Exception:
+                self._conn.execute("rollback")
+                raise
+
+    def extend(self, job_id: str, visibility_timeout: float):
+        now = time.time()
+        with self._lock:
+            self._conn.execute(
+                "update jobs set visible_at = ?, updated_at = ? where id = ? and status = 'running'",
+                (now + visibility_timeout, now, job_id)
+            )
+
+    def ack(self, job_id: str):
+        with self._lock:
+            self._conn.execute(
+                "update jobs set status = 'done', updated_at = ? where id = ?",
+                (time.time(), job_id)
+            )
+
+    def nack(self, job_id: str, error: str, retry_delay: float = 0.0):
+        now = time.time()
+        with self._lock:
+            self._conn.execute(
+                """
+                update jobs set
+                    status = case when attempts >= max_attempts then 'failed' else 'queued' end,
+                    visible_at = ?, last_error = ?, updated_at = ?
+                where id = ?
+                """,
+                (now + retry_delay, error, now, job_id)
+            )
+
+# Global instance
+_job_queue = None
+
+def get_job_queue() -> JobQueue:
+    global _job_queue
+    if _job_queue is None:
+        settings = get_settings()
+        if settings.JOB_QUEUE_BACKEND == "sqlite":
+            _job_queue = SQLiteJobQueue(settings.JOB_QUEUE_PATH, settings.JOB_MAX_ATTEMPTS)
+        else:
+            raise ValueError(f"Unknown JOB_QUEUE_BACKEND: {settings.JOB_QUEUE_BACKEND}")
+    return _job_queue
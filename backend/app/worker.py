@@ -0,0 +1,133 @@
+import asyncio
+import traceback
+from dotenv import load_dotenv
+from app.core.config import get_settings
+from app.services.job_queue import get_job_queue
+
+# Standalone OCR/analysis worker. Run alongside (or instead of) the embedded worker:
+#   python -m app.worker
+
+async def handle_process_form(payload: dict):
+    """
+    Download the stored upload and run OCR + schema analysis for it.
+    """
+    from app.db.supabase import supabase
+    from app.core.ocr import process_form_background
+    from app.core.pools import run_io
+
+    file_bytes = await run_io(
+        supabase.storage.from_("pdf-forms").download, payload['file_path']
+    )
+    await process_form_background(payload['form_id'], file_bytes, payload.get('content_type', 'application/pdf'))
+
+async def handle_process_form_failed(payload: dict, error: str):
+    """
+    Last attempt failed: only now is the form shown as failed.
+    """
+    from app.core.ocr import mark_form_failed
+    await mark_form_failed(payload['form_id'], error)
+
+HANDLERS = {
+    "process_form": handle_process_form,
+}
+
+async def handle_process_form_retry(payload: dict, error: str, attempt: int, max_attempts: int, delay: float):
+    """
+    An attempt failed but will be retried: let watchers know without ending their stream.
+    """
+    from app.services.form_events import form_events
+    form_events.publish(payload['form_id'], {"retrying": {
+        "attempt": attempt, "max_attempts": max_attempts, "retry_in": delay, "error": error
+    }})
+
+# Called once a job has used up its attempts
+FAILURE_HANDLERS = {
+    "process_form": handle_process_form_failed,
+}
+
+# Called when a failed attempt is about to be retried
+RETRY_HANDLERS = {
+    "process_form": handle_process_form_retry,
+}
+
+class Worker:
+    def __init__(self, concurrency: int = None):
+        self.settings = get_settings()
+        self.queue = get_job_queue()
+        self.concurrency = concurrency or self.settings.JOB_WORKER_CONCURRENCY
+        self._stopping = asyncio.Event()
+
+    async def _heartbeat(self, job_id: str):
+        # Keep the lease alive while a long OCR job is running
+        timeout = self.settings.JOB_VISIBILITY_TIMEOUT
+        while True:
+            await asyncio.sleep(timeout / 3)
+            await asyncio.to_thread(self.queue.extend, job_id, timeout)
+
+    async def _run_job(self, job):
+        handler = HANDLERS.get(job.kind)
+        if handler is None:
+            print(f"ERROR: No handler for job kind '{job.kind}'")
+            await asyncio.to_thread(self.queue.nack, job.id, f"unknown job kind {job.kind}")
+            return
+
+        if job.exhausted:
+            # The worker running its last attempt died; the handler never got to fail it
+            print(f"Worker: job {job.id} lost its last attempt: {job.last_error}")
+            await self._give_up(job, job.last_error)
+            await asyncio.to_thread(self.queue.nack, job.id, job.last_error)
+            return
+
+        print(f"Worker: running job {job.id} ({job.kind}), attempt {job.attempts}/{job.max_attempts}")
+        heartbeat = asyncio.create_task(self._heartbeat(job.id))
+        try:
+            await handler(job.payload)
+        except Exception as e:
+            traceback.print_exc()
+            # Exponential delay between attempts
+            delay = self.settings.JOB_RETRY_DELAY * (2 ** (job.attempts - 1))
+            await asyncio.to_thread(self.queue.nack, job.id, str(e), delay)
+            if job.attempts >= job.max_attempts:
+                print(f"Worker: job {job.id} failed after {job.attempts} attempts: {e}")
+                await self._give_up(job, str(e))
+            else:
+                print(f"Worker: job {job.id} failed, retrying in {delay:.0f}s: {e}")
+                on_retry = RETRY_HANDLERS.get(job.kind)
+                if on_retry is not None:
+                    await on_retry(job.payload, str(e), job.attempts, job.max_attempts, delay)
+        else:
+            await asyncio.to_thread(self.queue.ack, job.id)
+            print(f"Worker: job {job.id} done")
+        finally:
+            heartbeat.cancel()
+
+    async def _give_up(self, job, error: str):
+        on_failure = FAILURE_HANDLERS.get(job.kind)
+        if on_failure is None:
+            return
+        try:
+            await on_failure(job.payload, error)
+        except Exception as e:
+            print(f"ERROR: Failure handler for job {job.id} failed: {e}")
+
+    async def _loop(self):
+        while not self._stopping.is_set():
+            job = await asyncio.to_thread(self.queue.dequeue, self.settings.JOB_VISIBILITY_TIMEOUT)
+            if job is None:
+                try:
+                    await asyncio.wait_for(self._stopping.wait(), timeout=self.settings.JOB_POLL_INTERVAL)
+                except asyncio.TimeoutError:
+                    pass
+                continue
+            await self._run_job(job)
+
+    async def run(self):
+        print(f"Worker: started with concurrency {self.concurrency}")
+        await asyncio.gather(*(self._loop() for _ in range(self.concurrency)))
+
+    def stop(self):
+        self._stopping.set()
+
+if __name__ == "__main__":
+    load_dotenv()
+    asyncio.run(Worker().run())
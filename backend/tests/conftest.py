@@ -0,0 +1,10 @@
+import os
+import sys
+
+# Tests import the backend as `app`, the same way uvicorn and the worker do
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+# Settings requires these; nothing under test talks to the real services
+os.environ.setdefault("SUPABASE_URL", "http://localhost")
+os.environ.setdefault("SUPABASE_KEY", "test")
+os.environ.setdefault("GOOGLE_API_KEY", "test")
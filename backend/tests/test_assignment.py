@@ -0,0 +1,70 @@
+import itertools
+import fitz
+import numpy as np
+import pytest
+from app.core.pdf.assignment import _hungarian, linear_sum_assignment
+from app.core.pdf.mapper import UNASSIGNABLE_COST, mapper
+
+def brute_force_cost(cost: np.ndarray) -> float:
+    n, m = cost.shape
+    if n > m:
+        return brute_force_cost(cost.T)
+    return min(
+        sum(cost[i, j] for i, j in enumerate(cols))
+        for cols in itertools.permutations(range(m), n)
+    )
+
+@pytest.mark.parametrize("seed", range(40))
+def test_hungarian_matches_brute_force(seed):
+    rng = np.random.default_rng(seed)
+    n = int(rng.integers(1, 6))
+    m = int(rng.integers(n, 7))
+    # Small integers make ties common; some pairs are forbidden like in the mapper
+    cost = rng.integers(0, 10, size=(n, m)).astype(float)
+    cost[rng.random((n, m)) < 0.2] = UNASSIGNABLE_COST
+
+    rows, cols = _hungarian(cost)
+    assert list(rows) == list(range(n))
+    assert len(set(cols)) == n
+    assert cost[rows, cols].sum() == pytest.approx(brute_force_cost(cost))
+
+@pytest.mark.parametrize("shape", [(1, 1), (3, 5), (5, 3), (6, 1), (1, 6)])
+def test_linear_sum_assignment_rectangular(shape):
+    rng = np.random.default_rng(sum(shape))
+    cost = rng.random(shape)
+
+    rows, cols = linear_sum_assignment(cost)
+    assert len(rows) == min(shape)
+    assert list(rows) == sorted(rows)
+    assert len(set(rows)) == len(set(cols)) == min(shape)
+    assert cost[rows, cols].sum() == pytest.approx(brute_force_cost(cost))
+
+def test_linear_sum_assignment_empty():
+    rows, cols = linear_sum_assignment(np.zeros((0, 3)))
+    assert len(rows) == len(cols) == 0
+
+def test_repeated_label_is_placed_on_one_page():
+    doc = fitz.open()
+    page = doc.new_page()
+    page.insert_text((50, 100), "Name: ________________")
+    page = doc.new_page()
+    page.insert_text((50, 100), "Name: ________________")
+    schema = {"fields": [{"id": "name", "label": "Name"}]}
+
+    coordinates = mapper.get_field_coordinates(doc, schema)
+    assert coordinates["name"]["page_idx"] == 0
+    assert coordinates["name"]["method"] != "fallback_right"
+
+def test_fallback_ignores_labels_nested_in_longer_labels():
+    doc = fitz.open()
+    page = doc.new_page()
+    page.insert_text((50, 100), "Father's Name")
+    page = doc.new_page()
+    page.insert_text((50, 100), "Name")
+    schema = {"fields": [{"id": "father", "label": "Father's Name"}, {"id": "name", "label": "Name"}]}
+
+    coordinates = mapper.get_field_coordinates(doc, schema)
+    # "Name" inside "Father's Name" is not a label; the stand-alone one on page 2 is
+    assert coordinates["father"]["page_idx"] == 0
+    assert coordinates["name"]["page_idx"] == 1
+    assert coordinates["name"]["method"] == "fallback_right"
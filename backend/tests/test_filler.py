@@ -0,0 +1,100 @@
+import fitz
+import pytest
+from app.core.pdf.filler import fill_document
+from app.core.pdf.placement import build_form_template
+
+SCHEMA = {"fields": [
+    {"id": "name", "label": "Full Name"},
+    {"id": "city", "label": "City"},
+    {"id": "notes", "label": "Notes"},
+]}
+ANSWERS = {"name": "Ada Lovelace", "city": "London", "notes": "Not on the form"}
+
+@pytest.fixture(scope="module")
+def template():
+    doc = fitz.open()
+    page = doc.new_page()
+    page.insert_text((50, 60), "City: ____________________")
+    widget = fitz.Widget()
+    widget.field_type = fitz.PDF_WIDGET_TYPE_TEXT
+    widget.field_name = "Full Name"
+    widget.rect = fitz.Rect(50, 100, 300, 120)
+    page.add_widget(widget)
+    return build_form_template(doc.tobytes(), "application/pdf", SCHEMA)
+
+def filled_values(pdf_bytes: bytes):
+    doc = fitz.open(stream=pdf_bytes, filetype="pdf")
+    values = {widget.field_name: widget.field_value for page in doc for widget in page.widgets()}
+    return doc, values
+
+def need_appearances(doc: fitz.Document) -> str:
+    return doc.xref_get_key(doc.pdf_catalog(), "AcroForm/NeedAppearances")[1]
+
+def test_fills_placed_fields_and_summarizes_the_rest(template):
+    placements, template_bytes = template
+    doc, values = filled_values(fill_document(template_bytes, SCHEMA, placements, ANSWERS))
+
+    assert values["Full Name"] == "Ada Lovelace"
+    assert values["city"] == "London"
+    # Unplaced answers go to an appended summary page
+    assert doc.page_count == 2
+    assert "Not on the form" in doc[1].get_text()
+    assert need_appearances(doc) != "true"
+
+def test_need_appearances_writes_values_for_the_viewer(template):
+    placements, template_bytes = template
+    output = fill_document(template_bytes, SCHEMA, placements, ANSWERS, need_appearances=True)
+    doc, values = filled_values(output)
+
+    assert values["Full Name"] == "Ada Lovelace"
+    assert values["city"] == "London"
+    assert need_appearances(doc) == "true"
+
+def test_template_is_left_untouched(template):
+    placements, template_bytes = template
+    before = bytes(template_bytes)
+    fill_document(template_bytes, SCHEMA, placements, ANSWERS)
+
+    assert template_bytes == before
+    _, values = filled_values(template_bytes)
+    assert not any(values.values())
+
+@pytest.mark.parametrize("viewer_appearances", [False, True])
+@pytest.mark.parametrize("output_mode", ["full", "incremental", "optimized"])
+def test_output_modes_produce_the_same_fill(template, output_mode, viewer_appearances):
+    placements, template_bytes = template
+    output = fill_document(template_bytes, SCHEMA, placements, ANSWERS, viewer_appearances, output_mode)
+    doc, values = filled_values(output)
+
+    assert values["Full Name"] == "Ada Lovelace"
+    assert values["city"] == "London"
+    assert doc.page_count == 2
+    assert (need_appearances(doc) == "true") == viewer_appearances
+
+def test_incremental_output_appends_to_the_template(template):
+    placements, template_bytes = template
+    output = fill_document(template_bytes, SCHEMA, placements, ANSWERS, output_mode="incremental")
+
+    assert output.startswith(template_bytes)
+    assert len(output) > len(template_bytes)
+
+def test_optimized_output_is_smallest(template):
+    placements, template_bytes = template
+    sizes = {
+        mode: len(fill_document(template_bytes, SCHEMA, placements, ANSWERS, output_mode=mode))
+        for mode in ("full", "incremental", "optimized")
+    }
+    assert sizes["optimized"] == min(sizes.values())
+
+def test_unknown_output_mode_is_rejected(template):
+    placements, template_bytes = template
+    with pytest.raises(ValueError):
+        fill_document(template_bytes, SCHEMA, placements, ANSWERS, output_mode="fast")
+
+def test_summary_page_tolerates_fields_without_a_label(template):
+    placements, template_bytes = template
+    schema = {"fields": SCHEMA["fields"] + [{"id": "extra"}]}
+    output = fill_document(template_bytes, schema, placements, {**ANSWERS, "extra": "Unlabelled answer"})
+    doc, _ = filled_values(output)
+
+    assert "extra: Unlabelled answer" in doc[1].get_text()
@@ -0,0 +1,93 @@
+import random
+import pytest
+from app.core.text_index import TextIndex, bounded_levenshtein
+
+def edit_distance(a: str, b: str) -> int:
+    # Full table, no early exit: the reference the bounded version must agree with
+    d = [[0] * (len(b) + 1) for _ in range(len(a) + 1)]
+    for i in range(len(a) + 1):
+        d[i][0] = i
+    for j in range(len(b) + 1):
+        d[0][j] = j
+    for i in range(1, len(a) + 1):
+        for j in range(1, len(b) + 1):
+            d[i][j] = min(d[i - 1][j] + 1, d[i][j - 1] + 1, d[i - 1][j - 1] + (a[i - 1] != b[j - 1]))
+            if i > 1 and j > 1 and a[i - 1] == b[j - 2] and a[i - 2] == b[j - 1]:
+                d[i][j] = min(d[i][j], d[i - 2][j - 2] + 1)
+    return d[-1][-1]
+
+def random_word(rng: random.Random, max_len: int = 9) -> str:
+    return "".join(rng.choice("abcde") for _ in range(rng.randint(1, max_len)))
+
+def index_of(*lines) -> TextIndex:
+    words = []
+    for page_idx, line in enumerate(lines):
+        for i, text in enumerate(line.split()):
+            words.append([page_idx, i / 10, 0.1, (i + 1) / 10, 0.2, text, 0])
+    return TextIndex(words, len(lines))
+
+@pytest.mark.parametrize("seed", range(20))
+def test_bounded_levenshtein_agrees_with_full_edit_distance(seed):
+    rng = random.Random(seed)
+    for _ in range(200):
+        a, b = random_word(rng), random_word(rng)
+        max_dist = rng.randint(0, 4)
+        dist = edit_distance(a, b)
+        bounded = bounded_levenshtein(a, b, max_dist)
+        if dist <= max_dist:
+            assert bounded == dist, (a, b, max_dist)
+        else:
+            assert bounded > max_dist, (a, b, max_dist)
+
+@pytest.mark.parametrize("seed", range(10))
+def test_fuzzy_tokens_find_every_word_a_full_scan_finds(seed):
+    rng = random.Random(seed)
+    vocab = {random_word(rng) for _ in range(200)}
+    index = index_of(" ".join(sorted(vocab)))
+
+    for _ in range(50):
+        token = random_word(rng)
+        max_dist = max(1, len(token) // 3)
+        expected = {}
+        for word in vocab:
+            dist = edit_distance(token, word)
+            if dist <= max_dist:
+                expected[word] = 1 - dist / max(len(token), len(word))
+        expected = {word: sim for word, sim in expected.items() if sim >= 0.3}
+
+        assert index._fuzzy_tokens(token, 0.3) == pytest.approx(expected), token
+
+def test_fuzzy_tokens_keep_matches_that_share_no_trigram():
+    index = index_of("acbd axcdyf 0f")
+
+    assert "acbd" in index._fuzzy_tokens("abcd", 0.3)
+    assert "axcdyf" in index._fuzzy_tokens("abcdef", 0.3)
+    assert "0f" in index._fuzzy_tokens("of", 0.3)
+
+def test_exact_match_scores_one_and_ranks_first():
+    index = index_of("Dale of Brith here", "Date of Birth here")
+
+    results = index.find_fuzzy("Date of Birth")
+
+    assert results[0] == (1.0, [4, 5, 6])
+    score, run = results[1]
+    assert run == [0, 1, 2]
+    assert 0.7 <= score < 1.0
+
+def test_fuzzy_score_is_the_mean_word_similarity():
+    index = index_of("Nane Surname")
+
+    # 'nane' is one edit from 'name' (0.75), 'surname' matches exactly
+    assert index.find_fuzzy("Name Surname") == [(0.875, [0, 1])]
+
+def test_fuzzy_results_respect_min_score_and_limit():
+    index = index_of("name nane nome xyzw name")
+
+    assert [run for _, run in index.find_fuzzy("name", min_score=1.0)] == [[0], [4]]
+    assert len(index.find_fuzzy("name", min_score=0.7)) == 4
+    assert index.find_fuzzy("name", min_score=0.7, limit=2) == [(1.0, [0]), (1.0, [4])]
+
+def test_fuzzy_phrase_does_not_span_pages():
+    index = index_of("Date of", "Birth")
+
+    assert index.find_fuzzy("Date of Birth", min_score=0.5) == []
@@ -0,0 +1,170 @@
+import asyncio
+import time
+import pytest
+import app.worker as worker_module
+from app.services.job_queue import SQLiteJobQueue
+
+@pytest.fixture
+def queue(tmp_path):
+    return SQLiteJobQueue(str(tmp_path / "jobs.sqlite3"), default_max_attempts=2)
+
+def job_row(queue, job_id):
+    return queue._conn.execute(
+        "select status, attempts, last_error from jobs where id = ?", (job_id,)
+    ).fetchone()
+
+def test_dequeue_leases_a_job(queue):
+    job_id = queue.enqueue("process_form", {"form_id": "f1"})
+
+    job = queue.dequeue(visibility_timeout=60)
+    assert job.id == job_id
+    assert job.payload == {"form_id": "f1"}
+    assert job.attempts == 1
+    # Leased: invisible to other workers until acked or the lease runs out
+    assert queue.dequeue(visibility_timeout=60) is None
+
+    queue.ack(job_id)
+    assert job_row(queue, job_id)[0] == "done"
+
+def test_expired_lease_makes_the_job_visible_again(queue):
+    job_id = queue.enqueue("process_form", {})
+    queue.dequeue(visibility_timeout=0.05)
+    time.sleep(0.1)
+
+    job = queue.dequeue(visibility_timeout=60)
+    assert job.id == job_id
+    assert job.attempts == 2
+
+def test_extend_keeps_the_lease(queue):
+    job_id = queue.enqueue("process_form", {})
+    queue.dequeue(visibility_timeout=0.05)
+    queue.extend(job_id, 60)
+    time.sleep(0.1)
+
+    assert queue.dequeue(visibility_timeout=60) is None
+
+def test_priority_then_age(queue):
+    low = queue.enqueue("process_form", {"n": 1})
+    high = queue.enqueue("process_form", {"n": 2}, priority=5)
+    later_low = queue.enqueue("process_form", {"n": 3})
+
+    order = [queue.dequeue(60).id for _ in range(3)]
+    assert order == [high, low, later_low]
+
+def test_nack_retries_until_max_attempts(queue):
+    job_id = queue.enqueue("process_form", {})
+
+    queue.dequeue(60)
+    queue.nack(job_id, "first")
+    assert job_row(queue, job_id) == ("queued", 1, "first")
+
+    queue.dequeue(60)
+    queue.nack(job_id, "second")
+    assert job_row(queue, job_id) == ("failed", 2, "second")
+    assert queue.dequeue(60) is None
+
+def test_nack_delay_hides_the_job(queue):
+    queue.enqueue("process_form", {})
+    job = queue.dequeue(60)
+    queue.nack(job.id, "later", retry_delay=60)
+
+    assert queue.dequeue(60) is None
+
+def test_expired_lease_on_last_attempt_is_handed_out_to_give_up(queue):
+    job_id = queue.enqueue("process_form", {}, max_attempts=1)
+    queue.dequeue(visibility_timeout=0.05)
+    time.sleep(0.1)
+
+    job = queue.dequeue(60)
+    assert job.id == job_id
+    assert job.exhausted
+    assert job.attempts == 1
+    assert job.last_error == "lease expired"
+
+    queue.nack(job.id, job.last_error)
+    assert job_row(queue, job_id) == ("failed", 1, "lease expired")
+    assert queue.dequeue(60) is None
+
+@pytest.fixture
+def worker(queue, monkeypatch):
+    monkeypatch.setattr(worker_module, "get_job_queue", lambda: queue)
+    worker = worker_module.Worker(concurrency=1)
+    worker.settings = worker.settings.model_copy(update={"JOB_RETRY_DELAY": 0.0})
+    return worker
+
+def test_worker_retries_then_gives_up(queue, worker, monkeypatch):
+    events = []
+
+    async def handler(payload):
+        events.append(("run", payload["n"]))
+        raise RuntimeError("upstream down")
+
+    async def on_retry(payload, error, attempt, max_attempts, delay):
+        events.append(("retry", attempt, max_attempts, error))
+
+    async def on_failure(payload, error):
+        events.append(("failed", error))
+
+    monkeypatch.setitem(worker_module.HANDLERS, "test", handler)
+    monkeypatch.setitem(worker_module.RETRY_HANDLERS, "test", on_retry)
+    monkeypatch.setitem(worker_module.FAILURE_HANDLERS, "test", on_failure)
+    job_id = queue.enqueue("test", {"n": 1})
+
+    async def drain():
+        while (job := queue.dequeue(60)) is not None:
+            await worker._run_job(job)
+
+    asyncio.run(drain())
+    # Only the last attempt marks the job failed
+    assert events == [
+        ("run", 1), ("retry", 1, 2, "upstream down"),
+        ("run", 1), ("failed", "upstream down"),
+    ]
+    assert job_row(queue, job_id)[0] == "failed"
+
+def test_worker_acks_after_a_retried_success(queue, worker, monkeypatch):
+    attempts = []
+
+    async def handler(payload):
+        attempts.append(1)
+        if len(attempts) == 1:
+            raise RuntimeError("transient")
+
+    async def on_failure(payload, error):
+        raise AssertionError("must not give up")
+
+    monkeypatch.setitem(worker_module.HANDLERS, "test", handler)
+    monkeypatch.setitem(worker_module.FAILURE_HANDLERS, "test", on_failure)
+    job_id = queue.enqueue("test", {})
+
+    async def drain():
+        while (job := queue.dequeue(60)) is not None:
+            await worker._run_job(job)
+
+    asyncio.run(drain())
+    assert len(attempts) == 2
+    assert job_row(queue, job_id)[0] == "done"
+
+def test_worker_gives_up_on_a_job_whose_worker_died(queue, worker, monkeypatch):
+    events = []
+
+    async def handler(payload):
+        raise AssertionError("an exhausted job must not run again")
+
+    async def on_failure(payload, error):
+        events.append(("failed", payload["form_id"], error))
+
+    monkeypatch.setitem(worker_module.HANDLERS, "test", handler)
+    monkeypatch.setitem(worker_module.FAILURE_HANDLERS, "test", on_failure)
+    job_id = queue.enqueue("test", {"form_id": "f1"}, max_attempts=1)
+    # Leased, then the worker was killed mid-job
+    queue.dequeue(visibility_timeout=0.05)
+    time.sleep(0.1)
+
+    async def drain():
+        while (job := queue.dequeue(60)) is not None:
+            await worker._run_job(job)
+
+    asyncio.run(drain())
+    assert events == [("failed", "f1", "lease expired")]
+    assert job_row(queue, job_id)[0] == "failed"
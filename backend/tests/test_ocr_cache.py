@@ -0,0 +1,102 @@
+import itertools
+import types
+import pytest
+from app.core import ocr_cache
+from app.core.ocr_cache import OCRCache
+
+@pytest.fixture
+def cache(tmp_path, monkeypatch):
+    # A clock that always moves on, so access order never ties
+    clock = itertools.count(1)
+    monkeypatch.setattr(ocr_cache, "time", types.SimpleNamespace(time=lambda: float(next(clock))))
+    cache = OCRCache(str(tmp_path / "ocr" / "cache.db"), max_bytes=30)
+    yield cache
+    cache.close()
+
+def test_get_returns_what_was_put(cache):
+    cache.put("a", "hello")
+
+    assert cache.get("a") == "hello"
+    assert cache.get("b") is None
+
+def test_key_depends_on_image_and_params():
+    key = OCRCache.make_key("img", {"model": "m", "temperature": 0})
+
+    assert key == OCRCache.make_key("img", {"temperature": 0, "model": "m"})
+    assert key != OCRCache.make_key("img2", {"model": "m", "temperature": 0})
+    assert key != OCRCache.make_key("img", {"model": "m", "temperature": 1})
+
+def test_least_recently_used_entry_is_evicted(cache):
+    cache.put("a", "x" * 10)
+    cache.put("b", "x" * 10)
+    cache.put("c", "x" * 10)
+    # Reading 'a' makes 'b' the oldest
+    cache.get("a")
+
+    cache.put("d", "x" * 10)
+
+    assert cache.get("b") is None
+    assert cache.get("a") is not None
+    assert cache.get("c") is not None
+    assert cache.get("d") is not None
+    assert cache.evictions == 1
+
+def test_size_stays_under_the_cap(cache):
+    for i in range(10):
+        cache.put(str(i), "x" * 12)
+
+        assert cache.stats()["bytes"] <= cache.max_bytes
+
+    stats = cache.stats()
+    assert stats["entries"] == 2
+    assert stats["evictions"] == 8
+    assert cache.get("9") is not None
+
+def test_value_larger_than_the_cap_is_not_stored(cache):
+    cache.put("a", "x" * 10)
+    cache.put("big", "x" * 31)
+
+    assert cache.get("big") is None
+    assert cache.get("a") is not None
+    assert cache.evictions == 0
+
+def test_size_counts_bytes_not_characters(cache):
+    cache.put("a", "é" * 10)
+
+    assert cache.stats()["bytes"] == 20
+
+def test_replacing_a_key_does_not_double_count(cache):
+    cache.put("a", "x" * 10)
+    cache.put("a", "y" * 20)
+
+    assert cache.stats()["bytes"] == 20
+    assert cache.get("a") == "y" * 20
+
+def test_stats_count_hits_and_misses(cache):
+    assert cache.stats()["hit_rate"] == 0.0
+
+    cache.put("a", "value")
+    cache.get("a")
+    cache.get("a")
+    cache.get("a")
+    cache.get("missing")
+
+    stats = cache.stats()
+    assert stats["hits"] == 3
+    assert stats["misses"] == 1
+    assert stats["hit_rate"] == 0.75
+    assert stats["entries"] == 1
+    assert stats["bytes"] == 5
+    assert stats["max_bytes"] == 30
+
+def test_entries_survive_reopening(tmp_path):
+    path = str(tmp_path / "cache.db")
+    cache = OCRCache(path, max_bytes=100)
+    cache.put("a", "kept")
+    cache.close()
+
+    reopened = OCRCache(path, max_bytes=100)
+    try:
+        assert reopened.get("a") == "kept"
+    finally:
+        reopened.close()
@@ -0,0 +1,36 @@
+import asyncio
+import os
+from concurrent.futures.process import BrokenProcessPool
+import pytest
+from app.core import pools
+
+def crash_once(marker: str) -> int:
+    # Kill the worker the first time, like a MuPDF segfault would
+    if not os.path.exists(marker):
+        open(marker, "w").close()
+        os._exit(1)
+    return os.getpid()
+
+@pytest.fixture(autouse=True)
+def fresh_pools():
+    pools.shutdown_pools()
+    yield
+    pools.shutdown_pools()
+
+def test_run_process_rebuilds_the_pool_and_retries(tmp_path):
+    marker = str(tmp_path / "crashed")
+    pid = asyncio.run(pools.run_process(crash_once, marker))
+
+    assert pid != os.getpid()
+    assert os.path.exists(marker)
+
+def test_call_process_rebuilds_the_pool_and_retries(tmp_path):
+    marker = str(tmp_path / "crashed")
+
+    assert pools.call_process(crash_once, marker) != os.getpid()
+
+def test_a_call_that_always_crashes_fails_but_leaves_a_working_pool():
+    with pytest.raises(BrokenProcessPool):
+        asyncio.run(pools.run_process(os._exit, 1))
+
+    assert asyncio.run(pools.run_process(os.getpid)) != os.getpid()
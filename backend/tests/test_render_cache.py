@@ -0,0 +1,77 @@
+import asyncio
+import os
+import fitz
+import pytest
+from app.core import pools, render_cache
+from app.core.render_cache import PageRenderCache, page_variant, prerender_form
+
+@pytest.fixture(autouse=True)
+def fresh_pools():
+    pools.shutdown_pools()
+    yield
+    pools.shutdown_pools()
+
+def make_pdf(pages: int) -> bytes:
+    doc = fitz.open()
+    for i in range(pages):
+        page = doc.new_page(width=200, height=200)
+        page.insert_text((20, 50), f"Page {i + 1}", fontsize=14)
+    return doc.tobytes()
+
+def disk_bytes(directory: str) -> int:
+    return sum(
+        os.path.getsize(os.path.join(root, name))
+        for root, _, names in os.walk(directory) for name in names
+    )
+
+def test_prerendered_pages_are_counted_by_this_process(tmp_path, monkeypatch):
+    cache = PageRenderCache(str(tmp_path / "pages"), max_bytes=10 ** 9)
+    monkeypatch.setattr(render_cache, "_render_cache", cache)
+
+    asyncio.run(prerender_form("form1", make_pdf(10), "application/pdf"))
+
+    names = sorted(os.listdir(tmp_path / "pages" / "form1"))
+    assert names == sorted(f"{page_variant(i, zoom=2.0)}.png" for i in range(1, 11))
+    assert cache.stats()["bytes"] == disk_bytes(str(tmp_path / "pages"))
+
+def test_prerendering_stays_within_the_byte_budget(tmp_path, monkeypatch):
+    directory = str(tmp_path / "pages")
+    probe = PageRenderCache(directory, max_bytes=10 ** 9)
+    monkeypatch.setattr(render_cache, "_render_cache", probe)
+    asyncio.run(prerender_form("probe", make_pdf(1), "application/pdf"))
+    page_size = probe.stats()["bytes"]
+
+    cache = PageRenderCache(str(tmp_path / "budget"), max_bytes=page_size * 4)
+    monkeypatch.setattr(render_cache, "_render_cache", cache)
+    asyncio.run(prerender_form("form1", make_pdf(12), "application/pdf"))
+
+    assert disk_bytes(str(tmp_path / "budget")) <= cache.max_bytes
+    assert cache.evictions > 0
+
+def test_only_missing_pages_are_rendered(tmp_path, monkeypatch):
+    cache = PageRenderCache(str(tmp_path / "pages"), max_bytes=10 ** 9)
+    monkeypatch.setattr(render_cache, "_render_cache", cache)
+    existing = cache.key("form1", page_variant(2, zoom=2.0), "png")
+    cache.put(existing, b"already there")
+
+    asyncio.run(prerender_form("form1", make_pdf(3), "application/pdf"))
+
+    assert cache.get(existing) == b"already there"
+    assert len(os.listdir(tmp_path / "pages" / "form1")) == 3
+
+def test_writes_from_another_process_are_picked_up(tmp_path, monkeypatch):
+    directory = str(tmp_path / "pages")
+    cache = PageRenderCache(directory, max_bytes=100)
+    other = PageRenderCache(directory, max_bytes=100)
+    for i in range(3):
+        other.put(other.key("form1", f"p{i}", "png"), b"x" * 30)
+
+    # Until it re-reads the directory, this process only sees its own writes
+    cache.put(cache.key("form2", "p0", "png"), b"x" * 30)
+    assert disk_bytes(directory) > cache.max_bytes
+
+    monkeypatch.setattr(render_cache, "SIZE_RESYNC_INTERVAL", 0)
+    cache.put(cache.key("form2", "p1", "png"), b"x" * 30)
+
+    assert disk_bytes(directory) <= cache.max_bytes
+    assert cache.stats()["bytes"] == disk_bytes(directory)
@@ -0,0 +1,134 @@
+import asyncio
+import httpx
+import pytest
+from app.core.resilience import CircuitBreaker, CircuitOpenError, TokenBucket, Upstream
+
+def http_error(status: int, headers=None) -> httpx.HTTPStatusError:
+    request = httpx.Request("POST", "http://upstream.test")
+    response = httpx.Response(status, request=request, headers=headers or {})
+    return httpx.HTTPStatusError(f"HTTP {status}", request=request, response=response)
+
+def flaky(*errors, result="ok"):
+    """
+    Coroutine factory raising `errors` in turn, then returning `result`.
+    """
+    remaining = list(errors)
+    calls = []
+
+    async def fn():
+        calls.append(1)
+        if remaining:
+            raise remaining.pop(0)
+        return result
+
+    fn.calls = calls
+    return fn
+
+def test_retries_transient_errors_then_succeeds():
+    upstream = Upstream("test", max_retries=3, base_delay=0)
+    fn = flaky(http_error(503), httpx.ConnectError("reset"))
+
+    assert asyncio.run(upstream.call(fn)) == "ok"
+    assert len(fn.calls) == 3
+    assert upstream.metrics["retries"] == 2
+    assert upstream.metrics["successes"] == 1
+    assert upstream.breaker.state == "closed"
+
+def test_client_errors_are_not_retried():
+    upstream = Upstream("test", max_retries=3, base_delay=0, failure_threshold=1)
+    fn = flaky(http_error(400))
+
+    with pytest.raises(httpx.HTTPStatusError):
+        asyncio.run(upstream.call(fn))
+    assert len(fn.calls) == 1
+    # A bad request says nothing about upstream health
+    assert upstream.breaker.state == "closed"
+
+def test_gives_up_after_max_retries():
+    upstream = Upstream("test", max_retries=2, base_delay=0, failure_threshold=10)
+    fn = flaky(*[http_error(429)] * 5)
+
+    with pytest.raises(httpx.HTTPStatusError):
+        asyncio.run(upstream.call(fn))
+    assert len(fn.calls) == 3
+    assert upstream.metrics["throttled"] == 3
+    assert upstream.metrics["failures"] == 1
+
+def test_backoff_honours_retry_after_and_caps_it():
+    upstream = Upstream("test", base_delay=1.0, max_delay=5.0)
+
+    assert upstream._backoff(0, http_error(429, {"Retry-After": "2"})) == 2.0
+    assert upstream._backoff(0, http_error(429, {"Retry-After": "120"})) == 5.0
+    # Full jitter: anywhere up to base * 2^attempt, capped at max_delay
+    for attempt in range(6):
+        delay = upstream._backoff(attempt, http_error(503))
+        assert 0 <= delay <= min(5.0, 2 ** attempt)
+
+def test_breaker_opens_and_sheds_calls():
+    upstream = Upstream("test", max_retries=0, failure_threshold=2, reset_timeout=60)
+    failing = flaky(*[http_error(503)] * 2)
+
+    for _ in range(2):
+        with pytest.raises(httpx.HTTPStatusError):
+            asyncio.run(upstream.call(failing))
+    assert upstream.breaker.state == "open"
+
+    never = flaky()
+    with pytest.raises(CircuitOpenError):
+        asyncio.run(upstream.call(never))
+    assert not never.calls
+    assert upstream.metrics["circuit_rejections"] == 1
+
+def test_half_open_lets_one_probe_through():
+    breaker = CircuitBreaker(failure_threshold=1, reset_timeout=0)
+    breaker.record_failure()
+    assert breaker.state == "open"
+
+    breaker.before_call("test")
+    assert breaker.state == "half_open"
+    with pytest.raises(CircuitOpenError):
+        breaker.before_call("test")
+
+    # A failed probe reopens the circuit, a successful one closes it
+    breaker.record_failure()
+    assert breaker.state == "open"
+    breaker.before_call("test")
+    breaker.record_success()
+    assert breaker.state == "closed"
+    breaker.before_call("test")
+    breaker.before_call("test")
+
+def test_cancelled_probe_frees_the_slot():
+    upstream = Upstream("test", max_retries=0, failure_threshold=1, reset_timeout=0.01)
+
+    async def scenario():
+        with pytest.raises(httpx.HTTPStatusError):
+            await upstream.call(flaky(http_error(503)))
+        await asyncio.sleep(0.02)
+
+        async def hang():
+            await asyncio.sleep(60)
+
+        probe = asyncio.create_task(upstream.call(hang))
+        await asyncio.sleep(0.01)
+        probe.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await probe
+        # Cancellation is not a verdict: still half-open, and the next call may probe
+        assert upstream.breaker.state == "half_open"
+        return await upstream.call(flaky())
+
+    assert asyncio.run(scenario()) == "ok"
+    assert upstream.breaker.state == "closed"
+
+def test_token_bucket_waits_for_tokens():
+    bucket = TokenBucket(rate=50, capacity=1)
+
+    async def scenario():
+        first = await bucket.acquire()
+        second = await bucket.acquire()
+        return first, second
+
+    first, second = asyncio.run(scenario())
+    assert first == 0
+    assert second > 0
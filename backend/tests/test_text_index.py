@@ -0,0 +1,108 @@
+import fitz
+import pytest
+from app.core.text_index import TextIndex
+
+def make_pdf(rotation: int = 0) -> fitz.Document:
+    doc = fitz.open()
+    page = doc.new_page(width=400, height=600)
+    page.insert_text((50, 100), "Date of Birth: ________", fontsize=12)
+    page.insert_text((50, 140), "Full Name of the", fontsize=12)
+    page.insert_text((50, 160), "Applicant", fontsize=12)
+    page.insert_text((250, 300), "Signature", fontsize=12)
+    page = doc.new_page(width=400, height=600)
+    page.insert_text((50, 100), "date of birth", fontsize=12)
+    page.insert_text((50, 200), "Signed by", fontsize=12)
+    if rotation:
+        for page in doc:
+            page.set_rotation(rotation)
+    return fitz.open(stream=doc.tobytes(), filetype="pdf")
+
+def search_for_rects(doc: fitz.Document, query: str):
+    # How search rects were normalized before the index: page.search_for, then
+    # the rect mapped into the rotated cropbox the page image is rendered from
+    results = []
+    for page_idx, page in enumerate(doc):
+        mat = page.rotation_matrix
+        rot_box = fitz.Rect(page.cropbox * mat)
+        for rect in page.search_for(query):
+            r = rect * mat
+            x0 = (r.x0 - rot_box.x0) / rot_box.width
+            y0 = (r.y0 - rot_box.y0) / rot_box.height
+            x1 = (r.x1 - rot_box.x0) / rot_box.width
+            y1 = (r.y1 - rot_box.y0) / rot_box.height
+            if x0 > x1: x0, x1 = x1, x0
+            if y0 > y1: y0, y1 = y1, y0
+            results.append({"page": page_idx + 1, "rect": [x0, y0, x1, y1]})
+    return results
+
+def texts(index: TextIndex, runs):
+    return [" ".join(index.words[pos][5] for pos in run) for run in runs]
+
+def test_phrase_mode_ignores_case_and_punctuation():
+    index = TextIndex.from_document(make_pdf())
+
+    runs = index.find_phrase("date of birth")
+
+    assert texts(index, runs) == ["Date of Birth:", "date of birth"]
+    assert [index.words[run[0]][0] for run in runs] == [0, 1]
+
+def test_exact_mode_is_case_sensitive():
+    index = TextIndex.from_document(make_pdf())
+
+    assert texts(index, index.find_phrase("Date of Birth", mode="exact")) == ["Date of Birth:"]
+    assert texts(index, index.find_phrase("date of birth", mode="exact")) == ["date of birth"]
+    assert index.find_phrase("DATE", mode="exact") == []
+
+def test_prefix_mode_completes_the_last_word():
+    index = TextIndex.from_document(make_pdf())
+
+    assert texts(index, index.find_phrase("sign", mode="prefix")) == ["Signature", "Signed"]
+    assert texts(index, index.find_phrase("date of bi", mode="prefix")) == ["Date of Birth:", "date of birth"]
+    # Only the last word is a prefix
+    assert index.find_phrase("da of birth", mode="prefix") == []
+
+def test_pages_filter_limits_matches():
+    index = TextIndex.from_document(make_pdf())
+
+    assert texts(index, index.find_phrase("date of birth", pages={1})) == ["date of birth"]
+
+def test_phrase_across_lines_gives_one_rect_per_line():
+    index = TextIndex.from_document(make_pdf())
+
+    [run] = index.find_phrase("of the applicant")
+    hits = index.rects_for(run)
+
+    assert [hit["page"] for hit in hits] == [1, 1]
+    first, second = (hit["rect"] for hit in hits)
+    assert first[3] <= second[1]
+    # 'of the' is merged into one rect spanning both words
+    of_word, the_word = index.words[run[0]], index.words[run[1]]
+    assert first == [of_word[1], min(of_word[2], the_word[2]), the_word[3], max(of_word[4], the_word[4])]
+
+def test_json_round_trip():
+    index = TextIndex.from_document(make_pdf())
+
+    restored = TextIndex.from_json(index.to_json())
+
+    assert restored.words == index.words
+    assert restored.page_count == index.page_count
+    assert restored.find_phrase("signature") == index.find_phrase("signature")
+
+def test_json_from_another_version_is_rejected():
+    data = TextIndex.from_document(make_pdf()).to_json().replace(b'"version":1', b'"version":0')
+
+    with pytest.raises(ValueError):
+        TextIndex.from_json(data)
+
+@pytest.mark.parametrize("rotation", [0, 90, 180, 270])
+@pytest.mark.parametrize("query", ["Signature", "Date of Birth", "Applicant"])
+def test_rects_match_normalized_search_for(rotation, query):
+    doc = make_pdf(rotation)
+    index = TextIndex.from_document(doc)
+
+    expected = search_for_rects(doc, query)
+    hits = [hit for run in index.find_phrase(query) for hit in index.rects_for(run)]
+
+    assert [hit["page"] for hit in hits] == [hit["page"] for hit in expected]
+    for hit, old in zip(hits, expected):
+        assert hit["rect"] == pytest.approx(old["rect"], abs=0.01)
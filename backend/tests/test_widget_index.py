@@ -0,0 +1,65 @@
+import random
+import fitz
+import pytest
+from app.core.pdf.mapper import WidgetNameIndex, mapper
+
+def random_word(rng: random.Random) -> str:
+    # A tiny alphabet so words often contain one another
+    return "".join(rng.choice("abcd") for _ in range(rng.randint(1, 6)))
+
+@pytest.mark.parametrize("seed", range(30))
+def test_candidates_cover_every_widget_the_old_scorer_matched(seed):
+    rng = random.Random(seed)
+    words = [[random_word(rng) for _ in range(rng.randint(1, 3))] for _ in range(40)]
+    index = WidgetNameIndex([f"w{i}" for i in range(len(words))], words)
+
+    for _ in range(20):
+        label_words = [random_word(rng) for _ in range(rng.randint(1, 3))]
+        # The old scorer compared every widget; any non-zero score must stay reachable
+        scored = {
+            idx for idx, widget_words in enumerate(words)
+            if mapper._calculate_match_score(label_words, widget_words) > 0
+        }
+        assert scored <= set(index.candidates(label_words))
+
+def form_with_widgets(*names):
+    doc = fitz.open()
+    page = doc.new_page()
+    for i, name in enumerate(names):
+        widget = fitz.Widget()
+        widget.field_type = fitz.PDF_WIDGET_TYPE_TEXT
+        widget.field_name = name
+        widget.rect = fitz.Rect(50, 50 + i * 30, 250, 70 + i * 30)
+        page.add_widget(widget)
+    return fitz.open(stream=doc.tobytes(), filetype="pdf")
+
+def test_short_label_matches_inside_a_longer_widget_name():
+    doc = form_with_widgets("userid", "Address")
+    schema = {"fields": [{"id": "f1", "label": "ID"}]}
+
+    assert mapper.map_acroform_fields(doc, schema) == {"f1": "userid"}
+
+def test_fields_and_widgets_are_paired_one_to_one():
+    doc = form_with_widgets("First Name", "Last Name")
+    schema = {"fields": [
+        {"id": "first", "label": "First Name"},
+        {"id": "last", "label": "Last Name"},
+        {"id": "name", "label": "Name"},
+    ]}
+
+    mapping = mapper.map_acroform_fields(doc, schema)
+    assert mapping["first"] == "First Name"
+    assert mapping["last"] == "Last Name"
+    assert "name" not in mapping
+
+def test_exact_match_is_not_traded_for_more_matches():
+    doc = form_with_widgets("Date of Birth", "Date")
+    schema = {"fields": [
+        {"id": "dob", "label": "Date of Birth"},
+        {"id": "bp", "label": "Birth Place"},
+    ]}
+
+    mapping = mapper.map_acroform_fields(doc, schema)
+    # Giving "bp" a weak match must not push "dob" off its exact one
+    assert mapping["dob"] == "Date of Birth"
+    assert mapping.get("bp") != "Date of Birth"
@@ -5,7 +5,7 @@ import { ChatSection } from './components/ChatSection';
 import { DocumentViewer } from './components/DocumentViewer';
 import { HistorySection } from './components/HistorySection';
 import { FloatingToolbar } from './components/FloatingToolbar';
-import { uploadForm, getFormStatus } from './lib/api';
+import { uploadForm, watchFormStatus } from './lib/api';
 
 type ProcessStatus = 'idle' | 'uploading' | 'processing' | 'completed' | 'error';
 
@@ -50,7 +50,7 @@ function App() {
       addLog('Upload complete. Analyzing document...');
       setStatus('processing');
       setProgress(30);
-      pollForStatus(res.form.id);
+      watchStatus(res.form.id);
     } catch (err: any) {
       console.error(err);
       setError('Upload failed. Please try again.');
@@ -58,45 +58,39 @@ function App() {
     }
   };
 
-  const pollForStatus = async (formId: string) => {
-    let attempts = 0;
-    const maxAttempts = 60; // 2 minutes approx
-
-    const interval = setInterval(async () => {
-      attempts++;
-      if (attempts > maxAttempts) {
-        clearInterval(interval);
-        setError('Processing timed out.');
-        setStatus('error');
-        return;
-      }
+  const watchStatus = (formId: string) => {
+    const source = watchFormStatus(formId);
 
-      try {
-        const res = await getFormStatus(formId);
-
-        // Artificial progress increment
-        setProgress(prev => Math.min(prev + 2, 90));
-
-        if (res.status === 'ready') {
-          clearInterval(interval);
-          setProgress(100);
-          setStatus('completed');
-          addLog('Analysis complete! Starting Assistant...');
-        } else if (res.status === 'error') {
-          clearInterval(interval);
-          setError(JSON.stringify(res.ocr_data));
-          setStatus('error');
-        } else {
-          // Still processing
-          if (attempts % 5 === 0) {
-            addLog('Identifying text and structures...');
-          }
-        }
-      } catch (e) {
-        console.error(e);
-        // Don't stop polling on transient errors
+    source.addEventListener('status', (event) => {
+      const data = JSON.parse((event as MessageEvent).data);
+      const pages = data.progress;
+      if (pages && pages.pages_total) {
+        setProgress(30 + Math.round((60 * pages.pages_done) / pages.pages_total));
+        addLog(`Read page ${pages.pages_done} of ${pages.pages_total}...`);
       }
-    }, 2000);
+    });
+
+    // A failed attempt the server will retry; keep listening
+    source.addEventListener('retrying', (event) => {
+      const data = JSON.parse((event as MessageEvent).data);
+      addLog(`Attempt ${data.attempt} of ${data.max_attempts} failed, retrying...`);
+    });
+
+    source.addEventListener('ready', () => {
+      source.close();
+      setProgress(100);
+      setStatus('completed');
+      addLog('Analysis complete! Starting Assistant...');
+    });
+
+    source.addEventListener('failed', (event) => {
+      source.close();
+      const data = JSON.parse((event as MessageEvent).data);
+      setError(data.error || 'Processing failed.');
+      setStatus('error');
+    });
+
+    // Connection errors: EventSource reconnects on its own, nothing to do
   };
 
   return (
@@ -1,6 +1,7 @@
 import { useState, useEffect } from 'react';
 import { Search, ChevronLeft, ChevronRight, Loader2 } from 'lucide-react';
-import { api } from '../lib/api';
+import { api, searchFormBatch, getThumbnails } from '../lib/api';
+import type { ThumbnailTile } from '../lib/api';
 
 interface DocumentViewerProps {
     formId: string;
@@ -19,6 +20,8 @@ export function DocumentViewer({ formId, highlightTerm }: DocumentViewerProps) {
     const [isLoading, setIsLoading] = useState(false);
     const [highlights, setHighlights] = useState<HighlightRect[]>([]);
     const [isSearching, setIsSearching] = useState(false);
+    // Highlights for every schema label, fetched once per form
+    const [labelHighlights, setLabelHighlights] = useState<Record<string, HighlightRect[]>>({});
 
     // Fetch Page Image
     useEffect(() => {
@@ -47,6 +50,39 @@ export function DocumentViewer({ formId, highlightTerm }: DocumentViewerProps) {
         };
     }, [formId, pageIdx]);
 
+    // Page thumbnails: one sprite sheet for the whole document
+    const [thumbnails, setThumbnails] = useState<{ url: string; tiles: ThumbnailTile[] } | null>(null);
+
+    useEffect(() => {
+        setThumbnails(null);
+        if (!formId) return;
+
+        let url: string | null = null;
+        let cancelled = false;
+        getThumbnails(formId)
+            .then(({ tiles, sprite }) => {
+                if (cancelled) return;
+                url = URL.createObjectURL(sprite);
+                setThumbnails({ url, tiles });
+            })
+            .catch(err => console.error("Failed to load thumbnails", err));
+
+        return () => {
+            cancelled = true;
+            if (url) URL.revokeObjectURL(url);
+        };
+    }, [formId]);
+
+    // Prefetch highlights for all field labels in one request
+    useEffect(() => {
+        setLabelHighlights({});
+        if (!formId) return;
+
+        searchFormBatch(formId, [], true)
+            .then(data => setLabelHighlights(data.results || {}))
+            .catch(err => console.error("Batch search failed", err));
+    }, [formId]);
+
     // Search for Highlights
     useEffect(() => {
         if (!formId || !highlightTerm) {
@@ -54,20 +90,29 @@ export function DocumentViewer({ formId, highlightTerm }: DocumentViewerProps) {
             return;
         }
 
+        const showHighlights = (results: HighlightRect[]) => {
+            setHighlights(results);
+
+            // Auto-switch page if highlight is on another page
+            const firstMatch = results[0];
+            if (firstMatch && firstMatch.page !== pageIdx) {
+                setPageIdx(firstMatch.page);
+            }
+        };
+
+        const prefetched = labelHighlights[highlightTerm];
+        if (prefetched) {
+            showHighlights(prefetched);
+            return;
+        }
+
         const fetchHighlights = async () => {
             setIsSearching(true);
             try {
                 const response = await api.get(`/forms/${formId}/search`, {
                     params: { q: highlightTerm }
                 });
-                console.log("Search Results:", response.data);
-                setHighlights(response.data.results || []);
-
-                // Auto-switch page if highlight is on another page
-                const firstMatch = response.data.results[0];
-                if (firstMatch && firstMatch.page !== pageIdx) {
-                    setPageIdx(firstMatch.page);
-                }
+                showHighlights(response.data.results || []);
             } catch (err) {
                 console.error("Search failed", err);
             } finally {
@@ -79,7 +124,7 @@ export function DocumentViewer({ formId, highlightTerm }: DocumentViewerProps) {
         const timer = setTimeout(fetchHighlights, 300);
         return () => clearTimeout(timer);
 
-    }, [formId, highlightTerm]);
+    }, [formId, highlightTerm, labelHighlights]);
 
     // We need to scale highlights to the displayed image size.
     // However, the backend returns PDF coordinates (72 DPI usually).
@@ -126,7 +171,8 @@ export function DocumentViewer({ formId, highlightTerm }: DocumentViewerProps) {
                     <span className="text-xs font-bold text-[#181710] px-2 uppercase">Page {pageIdx}</span>
                     <button
                         onClick={() => setPageIdx(p => p + 1)}
-                        className="p-1 hover:bg-[#181710] hover:text-white rounded text-[#181710] font-bold transition-colors"
+                        className="p-1 hover:bg-[#181710] hover:text-white rounded text-[#181710] font-bold transition-colors disabled:opacity-50 disabled:hover:bg-transparent disabled:hover:text-[#181710]"
+                        disabled={!!thumbnails && pageIdx >= thumbnails.tiles.length}
                     >
                         <ChevronRight size={20} strokeWidth={3} />
                     </button>
@@ -182,6 +228,27 @@ export function DocumentViewer({ formId, highlightTerm }: DocumentViewerProps) {
                 )}
             </div>
 
+            {/* Thumbnail Strip */}
+            {thumbnails && thumbnails.tiles.length > 1 && (
+                <div className="flex gap-2 overflow-x-auto bg-white px-4 py-2 border-t-3 border-[#181710] z-20 relative">
+                    {thumbnails.tiles.map(tile => (
+                        <button
+                            key={tile.page}
+                            onClick={() => setPageIdx(tile.page)}
+                            title={`Page ${tile.page}`}
+                            className={`shrink-0 border-2 rounded ${tile.page === pageIdx ? 'border-[#181710] shadow-neo-sm' : 'border-transparent opacity-70 hover:opacity-100'}`}
+                            style={{
+                                width: tile.width / 2,
+                                height: tile.height / 2,
+                                backgroundImage: `url(${thumbnails.url})`,
+                                backgroundPosition: `-${tile.x / 2}px -${tile.y / 2}px`,
+                                backgroundSize: `${Math.max(...thumbnails.tiles.map(t => t.x + t.width)) / 2}px auto`,
+                            }}
+                        />
+                    ))}
+                </div>
+            )}
+
             {/* Status Bar / Bottom Toolbar */}
             {highlightTerm ? (
                 <div className="bg-white px-4 py-3 border-t-3 border-[#181710] flex justify-between items-center z-20 relative">
@@ -37,6 +37,33 @@ export const getFormStatus = async (formId: string) => {
     return response.data;
 };
 
+// Highlight rects for many queries at once; `schemaLabels` adds every field label of the form
+export const searchFormBatch = async (formId: string, queries: string[], schemaLabels = false) => {
+    const response = await api.post(`/forms/${formId}/search`, { queries, schema_labels: schemaLabels });
+    return response.data;
+};
+
+export interface ThumbnailTile {
+    page: number;
+    x: number;
+    y: number;
+    width: number;
+    height: number;
+}
+
+// Every page as one sprite sheet, plus each page's tile within it.
+// The layout request renders and caches both, so the sheet is fetched after it.
+export const getThumbnails = async (formId: string) => {
+    const layout = await api.get(`/forms/${formId}/thumbnails/layout`);
+    const sprite = await api.get(`/forms/${formId}/thumbnails`, { responseType: 'blob' });
+    return { tiles: layout.data as ThumbnailTile[], sprite: sprite.data as Blob };
+};
+
+// Server-Sent Events: 'status' deltas and 'retrying' notices while processing, then a single 'ready' or 'failed' event
+export const watchFormStatus = (formId: string) => {
+    return new EventSource(`${API_URL}/forms/${formId}/events`);
+};
+
 export const getForms = async () => {
     const response = await api.get('/forms/');
     return response.data;
@@ -0,0 +1,81 @@
+import sys
+import os
+import time
+import argparse
+import statistics
+
+# Add backend directory to path
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..', 'backend')))
+
+import fitz
+from app.core.pdf.filler import fill_document, OUTPUT_MODES
+from app.core.pdf.placement import build_form_template
+
+# Compares filled-PDF output modes: fill+write time and output bytes (what gets uploaded
+# and stored), with and without NeedAppearances. Every AcroForm field of the PDF is
+# filled; --synthetic builds a form with N text fields instead.
+#
+#   python scripts/benchmark_pdf_output.py form.pdf
+#   python scripts/benchmark_pdf_output.py --synthetic 1000 --repeat 5
+
+def synthetic_form(count: int) -> bytes:
+    doc = fitz.open()
+    per_page = 120
+    for start in range(0, count, per_page):
+        page = doc.new_page()
+        page.insert_text((20, 15), f"Synthetic form, fields {start + 1}-{min(count, start + per_page)}")
+        for i in range(min(per_page, count - start)):
+            widget = fitz.Widget()
+            widget.field_type = fitz.PDF_WIDGET_TYPE_TEXT
+            widget.field_name = f"field_{start + i}"
+            widget.rect = fitz.Rect(20 + (i % 4) * 140, 25 + (i // 4) * 25, 150 + (i % 4) * 140, 45 + (i // 4) * 25)
+            page.add_widget(widget)
+    return doc.tobytes()
+
+def form_fields(pdf_bytes: bytes):
+    doc = fitz.open(stream=pdf_bytes, filetype="pdf")
+    names = list(dict.fromkeys(widget.field_name for page in doc for widget in page.widgets() if widget.field_name))
+    doc.close()
+    return names
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("pdf", nargs="?", help="Fillable PDF to benchmark")
+    parser.add_argument("--synthetic", type=int, help="Use a generated form with this many text fields")
+    parser.add_argument("--repeat", type=int, default=3, help="Fills per mode (median is reported)")
+    args = parser.parse_args()
+
+    if args.synthetic:
+        pdf_bytes = synthetic_form(args.synthetic)
+    elif args.pdf:
+        with open(args.pdf, "rb") as f:
+            pdf_bytes = f.read()
+    else:
+        parser.error("pass a PDF or --synthetic N")
+
+    names = form_fields(pdf_bytes)
+    if not names:
+        print("No AcroForm fields found; try --synthetic N")
+        sys.exit(1)
+    schema = {"fields": [{"id": f"f{i}", "label": name} for i, name in enumerate(names)]}
+    form_data = {field['id']: f"Sample value {i}" for i, field in enumerate(schema['fields'])}
+
+    start = time.perf_counter()
+    placements, template_bytes = build_form_template(pdf_bytes, "application/pdf", schema)
+    mapped = sum(1 for p in placements['fields'] if p.get('xrefs'))
+    print(f"{len(names)} fields ({mapped} mapped), template {len(template_bytes):,} bytes, "
+          f"compiled in {(time.perf_counter() - start) * 1000:.0f} ms\n")
+
+    print(f"{'mode':<14} {'appearances':<12} {'ms (median)':>12} {'bytes':>12}")
+    for need_appearances in (False, True):
+        for mode in OUTPUT_MODES:
+            timings = []
+            for _ in range(args.repeat):
+                started = time.perf_counter()
+                output = fill_document(template_bytes, schema, placements, form_data, need_appearances, mode)
+                timings.append((time.perf_counter() - started) * 1000)
+            label = "viewer" if need_appearances else "rendered"
+            print(f"{mode:<14} {label:<12} {statistics.median(timings):>12.1f} {len(output):>12,}")
+
+if __name__ == "__main__":
+    main()
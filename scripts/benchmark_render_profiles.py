@@ -0,0 +1,69 @@
+import sys
+import os
+import time
+import base64
+import asyncio
+import difflib
+import argparse
+
+# Add backend directory to path
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..', 'backend')))
+
+import fitz
+from app.core.ocr import OCRService, RenderProfile
+
+# Compares OCR render profiles on a PDF: payload bytes, render+encode time and,
+# with --ocr, text similarity against the page's own text layer (use a born-digital PDF).
+#
+#   python scripts/benchmark_render_profiles.py form.pdf
+#   NVIDIA_API_KEY=... python scripts/benchmark_render_profiles.py form.pdf --ocr
+
+PROFILES = {
+    "png-144dpi (baseline)": RenderProfile(dpi=144, image_format="png"),
+    "png-gray-144dpi": RenderProfile(dpi=144, grayscale=True, image_format="png"),
+    "jpeg-q85-144dpi": RenderProfile(dpi=144, image_format="jpeg", quality=85),
+    "jpeg-gray-q75-120dpi": RenderProfile(dpi=120, grayscale=True, image_format="jpeg", quality=75),
+    "jpeg-gray-q75-max1600": RenderProfile(dpi=200, grayscale=True, image_format="jpeg", quality=75, max_dimension=1600),
+    "webp-gray-q75-144dpi": RenderProfile(dpi=144, grayscale=True, image_format="webp", quality=75),
+}
+
+def similarity(a: str, b: str) -> float:
+    return difflib.SequenceMatcher(None, " ".join(a.split()), " ".join(b.split())).ratio()
+
+async def run(pdf_path: str, max_pages: int, with_ocr: bool):
+    doc = fitz.open(pdf_path)
+    pages = list(range(min(len(doc), max_pages)))
+    reference = {i: doc[i].get_text() for i in pages}
+    service = OCRService() if with_ocr else None
+    if service:
+        service.cache = None  # Measure the upstream, not the cache
+
+    print(f"{'profile':<26} {'bytes sent':>12} {'encode ms':>10} {'quality':>8}")
+    for name, profile in PROFILES.items():
+        sent = 0
+        encode_time = 0.0
+        scores = []
+        for i in pages:
+            start = time.perf_counter()
+            image_bytes, mime_type = profile.render(doc[i])
+            b64_img = base64.b64encode(image_bytes).decode("utf-8")
+            encode_time += time.perf_counter() - start
+            sent += len(b64_img)
+
+            if service and reference[i].strip():
+                text = await service._perform_ocr_request(b64_img, mime_type)
+                scores.append(similarity(text, reference[i]))
+
+        quality = f"{sum(scores) / len(scores):.3f}" if scores else "-"
+        print(f"{name:<26} {sent:>12,} {encode_time * 1000:>10.1f} {quality:>8}")
+
+    if service:
+        await service.aclose()
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark OCR render profiles")
+    parser.add_argument("pdf")
+    parser.add_argument("--pages", type=int, default=5, help="Max pages to benchmark")
+    parser.add_argument("--ocr", action="store_true", help="Also send pages to the OCR endpoint and score quality")
+    args = parser.parse_args()
+    asyncio.run(run(args.pdf, args.pages, args.ocr))
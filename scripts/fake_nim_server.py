@@ -0,0 +1,82 @@
+import json
+import random
+import argparse
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# Minimal local stand-in for the NVIDIA NIM chat-completions endpoint.
+# Usage:
+#   python scripts/fake_nim_server.py 8765
+#   NVIDIA_INVOKE_URL=http://127.0.0.1:8765/v1/chat/completions NVIDIA_API_KEY=fake uvicorn app.main:app
+#
+# Fault injection, to exercise retries/backoff/circuit breaking:
+#   python scripts/fake_nim_server.py 8765 --throttle-rate 0.3 --retry-after 1 --fail-rate 0.1
+
+class FakeChatCompletionsHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"  # keep-alive, so connection reuse is observable
+    request_count = 0
+    fail_rate = 0.0
+    throttle_rate = 0.0
+    retry_after = None
+
+    def _send_error(self, status, message, headers=None):
+        payload = json.dumps({"error": message}).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(payload)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def do_POST(self):
+        length = int(self.headers.get("Content-Length", 0))
+        body = json.loads(self.rfile.read(length) or b"{}")
+        FakeChatCompletionsHandler.request_count += 1
+
+        roll = random.random()
+        if roll < self.throttle_rate:
+            headers = {"Retry-After": str(self.retry_after)} if self.retry_after is not None else None
+            return self._send_error(429, "Too Many Requests", headers)
+        if roll < self.throttle_rate + self.fail_rate:
+            return self._send_error(503, "Service Unavailable")
+
+        image_chars = 0
+        for message in body.get("messages", []):
+            for block in message.get("content", []):
+                if block.get("type") == "image_url":
+                    image_chars += len(block["image_url"]["url"])
+
+        payload = json.dumps({
+            "choices": [{
+                "message": {
+                    "role": "assistant",
+                    "content": f"Fake OCR text #{FakeChatCompletionsHandler.request_count} ({image_chars} image chars)"
+                }
+            }]
+        }).encode()
+
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def log_message(self, format, *args):
+        print(f"[fake-nim] {self.client_address[1]} {format % args}")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Fake NVIDIA NIM chat-completions server")
+    parser.add_argument("port", type=int, nargs="?", default=8765)
+    parser.add_argument("--fail-rate", type=float, default=0.0, help="Fraction of requests answered with 503")
+    parser.add_argument("--throttle-rate", type=float, default=0.0, help="Fraction of requests answered with 429")
+    parser.add_argument("--retry-after", type=int, default=None, help="Retry-After seconds sent with 429s")
+    args = parser.parse_args()
+
+    FakeChatCompletionsHandler.fail_rate = args.fail_rate
+    FakeChatCompletionsHandler.throttle_rate = args.throttle_rate
+    FakeChatCompletionsHandler.retry_after = args.retry_after
+
+    port = args.port
+    server = ThreadingHTTPServer(("127.0.0.1", port), FakeChatCompletionsHandler)
+    print(f"Fake NIM server listening on http://127.0.0.1:{port}/v1/chat/completions")
+    server.serve_forever()
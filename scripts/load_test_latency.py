@@ -0,0 +1,60 @@
+import time
+import random
+import asyncio
+import argparse
+import statistics
+import httpx
+
+# Measures latency of a light request while heavy page renders run concurrently.
+# Renders use random zoom levels so each one misses the render cache.
+# With blocking calls kept off the event loop, probe p99 should barely move.
+#
+#   uvicorn app.main:app --port 8000   (from backend/)
+#   python scripts/load_test_latency.py FORM_ID --renders 8 --duration 20
+
+def percentile(samples, pct):
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * pct / 100))]
+
+async def probe(client: httpx.AsyncClient, path: str, stop_at: float, samples: list):
+    while time.monotonic() < stop_at:
+        started = time.perf_counter()
+        response = await client.get(path)
+        response.raise_for_status()
+        samples.append((time.perf_counter() - started) * 1000)
+        await asyncio.sleep(0.05)
+
+async def render(client: httpx.AsyncClient, form_id: str, pages: int, stop_at: float, counter: list):
+    while time.monotonic() < stop_at:
+        page = random.randint(1, pages)
+        zoom = round(random.uniform(1.0, 4.0), 3)
+        await client.get(f"/forms/{form_id}/pages/{page}", params={"zoom": zoom})
+        counter[0] += 1
+
+async def phase(base_url: str, form_id: str, probe_path: str, renders: int, pages: int, duration: float):
+    samples, counter = [], [0]
+    stop_at = time.monotonic() + duration
+    async with httpx.AsyncClient(base_url=base_url, timeout=120) as client:
+        tasks = [probe(client, probe_path, stop_at, samples)]
+        tasks += [render(client, form_id, pages, stop_at, counter) for _ in range(renders)]
+        await asyncio.gather(*tasks)
+    return samples, counter[0]
+
+async def run(args):
+    probe_path = args.probe or f"/forms/{args.form_id}/progress?include_text=false"
+    print(f"Probe: GET {probe_path}")
+    print(f"{'phase':<22} {'probes':>7} {'p50 ms':>8} {'p99 ms':>8} {'renders':>8}")
+    for label, renders in (("idle", 0), (f"{args.renders} parallel renders", args.renders)):
+        samples, rendered = await phase(args.base_url, args.form_id, probe_path, renders, args.pages, args.duration)
+        print(f"{label:<22} {len(samples):>7} {statistics.median(samples):>8.1f} "
+              f"{percentile(samples, 99):>8.1f} {rendered:>8}")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("form_id")
+    parser.add_argument("--base-url", default="http://localhost:8000/api/v1")
+    parser.add_argument("--probe", help="Path of the light request to time (default: form progress)")
+    parser.add_argument("--renders", type=int, default=8, help="Concurrent render loops")
+    parser.add_argument("--pages", type=int, default=1, help="Pages in the form")
+    parser.add_argument("--duration", type=float, default=20.0, help="Seconds per phase")
+    asyncio.run(run(parser.parse_args()))
@@ -8,8 +8,8 @@ try:
     from app.core.ocr import OCRService
     print("OCRService imported successfully.")
     
-    import requests
-    print("Requests imported successfully.")
+    import httpx
+    print("httpx imported successfully.")
     
 except ImportError as e:
     print(f"Import Error: {e}")